@@ -5,6 +5,7 @@ from dataclasses import dataclass, asdict
 from typing import Optional, List
 import requests
 
+from . import metrics
 from .config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, DEEPSEEK_MODEL, VISION_MODEL, CATEGORY_KEYWORDS
 from .ocr import file_to_image_content
 
@@ -101,6 +102,21 @@ def _extract_json_from_response(content: str) -> dict:
     raise ValueError(f"无法从响应中提取JSON: {content[:200]}...")
 
 
+def _post_chat_completion(url: str, headers: dict, data: dict, timeout: int, model_kind: str) -> str:
+    """发送 chat/completions 请求，返回模型输出的文本内容（记录网络耗时和状态码）"""
+    try:
+        with metrics.timer(f"analyzer.network.{model_kind}"):
+            response = requests.post(url, headers=headers, json=data, timeout=timeout)
+    except requests.RequestException:
+        metrics.inc("api_requests", model=model_kind, status="error")
+        raise
+    metrics.inc("api_requests", model=model_kind, status=response.status_code)
+    response.raise_for_status()
+
+    result = response.json()
+    return result["choices"][0]["message"]["content"]
+
+
 class InvoiceAnalyzer:
     """发票分析器"""
 
@@ -179,31 +195,29 @@ is_invoice 说明：
 
     def _call_api(self, ocr_text: str) -> dict:
         """调用 DeepSeek API"""
-        url = f"{self.base_url}/v1/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        data = {
-            "model": DEEPSEEK_MODEL,
-            "messages": [
-                {"role": "system", "content": self.SYSTEM_PROMPT},
-                {"role": "user", "content": f"请分析以下发票内容：\n\n{ocr_text}"}
-            ],
-            "temperature": 0.1,  # 低温度，更确定性的输出
-            "max_tokens": 1000
-        }
-
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
+        with metrics.timer("analyzer.build_request"):
+            url = f"{self.base_url}/v1/chat/completions"
+
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+
+            data = {
+                "model": DEEPSEEK_MODEL,
+                "messages": [
+                    {"role": "system", "content": self.SYSTEM_PROMPT},
+                    {"role": "user", "content": f"请分析以下发票内容：\n\n{ocr_text}"}
+                ],
+                "temperature": 0.1,  # 低温度，更确定性的输出
+                "max_tokens": 1000
+            }
+
+        content = _post_chat_completion(url, headers, data, timeout=30, model_kind="text")
 
         # 使用安全的 JSON 提取
-        return _extract_json_from_response(content)
+        with metrics.timer("analyzer.parse_json"):
+            return _extract_json_from_response(content)
 
     def _parse_result(self, result: dict, ocr_text: str, file_path: str) -> InvoiceInfo:
         """解析 API 返回结果"""
@@ -308,6 +322,14 @@ is_invoice 说明：
         try:
             # 将文件转换为图片内容
             image_contents = file_to_image_content(file_path)
+        except Exception as e:
+            print(f"  [警告] 视觉模型分析失败: {e}")
+            return self._create_empty_info(file_path, f"视觉分析失败: {str(e)}")
+        return self.analyze_images(image_contents, file_path)
+
+    def analyze_images(self, image_contents: List[dict], file_path: str) -> InvoiceInfo:
+        """分析已转换好的图片内容（file_to_image_content 的结果），调用方可以分别控制渲染和 API 调用的并发"""
+        try:
             result = self._call_vision_api(image_contents)
             return self._parse_result(result, file_path)
         except Exception as e:
@@ -316,35 +338,33 @@ is_invoice 说明：
 
     def _call_vision_api(self, image_contents: List[dict]) -> dict:
         """调用视觉模型 API"""
-        url = f"{self.base_url}/v1/chat/completions"
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        # 构建消息内容：系统提示 + 图片
-        user_content = [{"type": "text", "text": "请分析这张发票/凭证图片："}]
-        user_content.extend(image_contents)
-
-        data = {
-            "model": VISION_MODEL,
-            "messages": [
-                {"role": "system", "content": self.SYSTEM_PROMPT},
-                {"role": "user", "content": user_content}
-            ],
-            "temperature": 0.1,
-            "max_tokens": 2000
-        }
-
-        response = requests.post(url, headers=headers, json=data, timeout=60)
-        response.raise_for_status()
-
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
+        with metrics.timer("analyzer.build_request"):
+            url = f"{self.base_url}/v1/chat/completions"
+
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+
+            # 构建消息内容：系统提示 + 图片
+            user_content = [{"type": "text", "text": "请分析这张发票/凭证图片："}]
+            user_content.extend(image_contents)
+
+            data = {
+                "model": VISION_MODEL,
+                "messages": [
+                    {"role": "system", "content": self.SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content}
+                ],
+                "temperature": 0.1,
+                "max_tokens": 2000
+            }
+
+        content = _post_chat_completion(url, headers, data, timeout=60, model_kind="vision")
 
         # 使用安全的 JSON 提取
-        return _extract_json_from_response(content)
+        with metrics.timer("analyzer.parse_json"):
+            return _extract_json_from_response(content)
 
     def _parse_result(self, result: dict, file_path: str) -> InvoiceInfo:
         """解析 API 返回结果"""
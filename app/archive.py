@@ -0,0 +1,199 @@
+"""结果打包模块 - 边读文件边生成 ZIP，不写临时压缩包
+
+按内容选择压缩方式: PDF、JPEG/PNG、xlsx 等本身已压缩的格式直接存储（STORED），
+再压缩一遍几乎不减小体积只浪费 CPU；CSV、文本、BMP/TIFF 等才用 DEFLATE 压缩，
+较大的条目在线程池中并行压缩（zlib 压缩时释放 GIL）。压缩后没有变小的条目改回存储。
+
+存储的条目边读边发送，CRC 在读取时计算，写在条目数据之后的数据描述符（data descriptor）中。
+压缩的条目在开始发送前已压缩完成，所以整个 ZIP 的字节数可以事先算出（用作 HTTP Content-Length）。
+"""
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+from . import metrics
+from .config import ARCHIVE_WORKERS
+
+CHUNK_SIZE = 256 * 1024
+ZIP_LIMIT = 0xFFFFFFFF  # 不写 ZIP64，单个条目和整个压缩包都不能超过 4GB
+COMPRESS_LEVEL = 6
+PARALLEL_MIN_SIZE = 256 * 1024  # 小于该大小的条目直接在当前线程压缩
+
+# 本身已压缩的格式（xlsx、parquet 内部已经是压缩的）
+STORED_SUFFIXES = frozenset({
+    ".pdf", ".jpg", ".jpeg", ".png", ".webp", ".gif",
+    ".xlsx", ".parquet", ".zip", ".gz",
+})
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_DATA_DESCRIPTOR = struct.Struct("<IIII")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_RECORD = struct.Struct("<IHHHHIIH")
+_FLAGS = 0x0008 | 0x0800  # 使用数据描述符 | 文件名为 UTF-8
+_VERSION = 20
+_MADE_BY = (3 << 8) | _VERSION  # Unix，外部属性中是文件权限
+
+
+class ArchiveError(Exception):
+    """打包失败（文件在打包过程中被修改、超过 ZIP 大小限制等）"""
+
+
+@dataclass
+class ArchiveEntry:
+    """压缩包中的一个文件"""
+    path: Path
+    arcname: str  # 压缩包内的路径，使用 / 分隔
+    size: int
+    mtime: float
+    method: int = ZIP_STORED
+    compressed_size: int = 0
+    crc: int = 0
+    data: Optional[bytes] = None  # 压缩后的数据（仅 DEFLATED）
+    seconds: float = 0.0  # 压缩和读取耗时
+
+    def __post_init__(self):
+        self.compressed_size = self.compressed_size or self.size
+
+    @property
+    def dos_time(self):
+        """(DOS 时间, DOS 日期)"""
+        t = time.localtime(self.mtime)
+        if t.tm_year < 1980:
+            return 0, (1 << 5) | 1
+        return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+                ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def should_deflate(path) -> bool:
+    """按扩展名判断是否值得压缩"""
+    return Path(path).suffix.lower() not in STORED_SUFFIXES
+
+
+def collect_entries(root: str) -> List[ArchiveEntry]:
+    """输出目录下要打包的文件（跳过 .index.jsonl、.store 等以 . 开头的内部文件）"""
+    root = Path(root)
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.startswith("."):
+                continue
+            path = Path(dirpath) / name
+            stat = path.stat()
+            entries.append(ArchiveEntry(path, path.relative_to(root).as_posix(), stat.st_size, stat.st_mtime))
+    return entries
+
+
+def _deflate(entry: ArchiveEntry):
+    """压缩一个条目；压缩后没有变小则保持存储"""
+    start = time.perf_counter()
+    data = entry.path.read_bytes()
+    if len(data) != entry.size:
+        raise ArchiveError(f"打包过程中文件被修改: {entry.arcname}")
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(data) + compressor.flush()
+    if len(compressed) < entry.size:
+        entry.method = ZIP_DEFLATED
+        entry.data = compressed
+        entry.compressed_size = len(compressed)
+        entry.crc = zlib.crc32(data)
+    entry.seconds += time.perf_counter() - start
+
+
+class ZipStream:
+    """
+    流式 ZIP：迭代得到压缩包的字节块
+
+        stream = ZipStream(output_dir)  # 需要压缩的条目在这里压缩
+        Response(stream, headers={"Content-Length": str(len(stream))})
+    """
+
+    def __init__(self, root: str, workers: int = ARCHIVE_WORKERS):
+        self.entries = collect_entries(root)
+        self._compress(workers)
+        if len(self) > ZIP_LIMIT or len(self.entries) > 0xFFFF \
+                or any(e.size > ZIP_LIMIT for e in self.entries):
+            raise ArchiveError("结果过大，超过 ZIP 格式限制（4GB / 65535 个文件）")
+
+    def _compress(self, workers: int):
+        candidates = [e for e in self.entries if e.size and should_deflate(e.path)]
+        large = [e for e in candidates if e.size >= PARALLEL_MIN_SIZE]
+        with metrics.timer("archive.deflate"):
+            if large:
+                with ThreadPoolExecutor(max_workers=max(1, min(workers, len(large)))) as pool:
+                    list(pool.map(_deflate, large))
+            for entry in candidates:
+                if entry.size < PARALLEL_MIN_SIZE:
+                    _deflate(entry)
+
+    def __len__(self) -> int:
+        """整个压缩包的字节数"""
+        total = _END_RECORD.size
+        for entry in self.entries:
+            name_len = len(entry.arcname.encode("utf-8"))
+            total += _LOCAL_HEADER.size + name_len + entry.compressed_size + _DATA_DESCRIPTOR.size
+            total += _CENTRAL_HEADER.size + name_len
+        return total
+
+    def __iter__(self) -> Iterator[bytes]:
+        offset = 0
+        central = []
+        for entry in self.entries:
+            name = entry.arcname.encode("utf-8")
+            mod_time, mod_date = entry.dos_time
+            header = _LOCAL_HEADER.pack(0x04034B50, _VERSION, _FLAGS, entry.method, mod_time, mod_date,
+                                        0, 0, 0, len(name), 0) + name
+            yield header
+
+            if entry.method == ZIP_DEFLATED:
+                yield entry.data
+            else:
+                yield from self._read_stored(entry)
+            yield _DATA_DESCRIPTOR.pack(0x08074B50, entry.crc, entry.compressed_size, entry.size)
+
+            central.append(_CENTRAL_HEADER.pack(
+                0x02014B50, _MADE_BY, _VERSION, _FLAGS, entry.method, mod_time, mod_date,
+                entry.crc, entry.compressed_size, entry.size, len(name), 0, 0, 0, 0, 0o100644 << 16, offset)
+                + name)
+            offset += len(header) + entry.compressed_size + _DATA_DESCRIPTOR.size
+
+        directory = b"".join(central)
+        yield directory
+        yield _END_RECORD.pack(0x06054B50, 0, 0, len(central), len(central), len(directory), offset, 0)
+
+    @staticmethod
+    def _read_stored(entry: ArchiveEntry) -> Iterator[bytes]:
+        crc, size = 0, 0
+        with open(entry.path, "rb") as f:
+            # 只读事先统计的大小，保证总字节数与 Content-Length 一致
+            while size < entry.size:
+                start = time.perf_counter()
+                chunk = f.read(min(CHUNK_SIZE, entry.size - size))
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                entry.seconds += time.perf_counter() - start
+                yield chunk
+            if size != entry.size or f.read(1):
+                raise ArchiveError(f"打包过程中文件被修改: {entry.arcname}")
+        entry.crc = crc
+
+
+def write_archive(root: str, dest: str, workers: int = ARCHIVE_WORKERS) -> List[ArchiveEntry]:
+    """把 root 打包到 dest（先写临时文件再替换），返回各条目（含压缩方式和耗时）"""
+    dest = Path(dest)
+    tmp = dest.with_name(dest.name + ".tmp")
+    stream = ZipStream(root, workers=workers)
+    with metrics.timer("archive.write"):
+        with open(tmp, "wb") as f:
+            for chunk in stream:
+                f.write(chunk)
+    os.replace(tmp, dest)
+    return stream.entries
@@ -147,6 +147,36 @@ INVOICE_CATEGORIES = {
 # 特殊分类
 PENDING_CATEGORY = "待确认"  # 无法确定消费日期的发票
 
+# 整理文件时并行复制/移动的线程数
+PLACEMENT_WORKERS = int(os.getenv("PLACEMENT_WORKERS", "8"))
+
+# 打包结果时并行压缩的线程数
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", str(os.cpu_count() or 4)))
+
+# Web 版任务调度：工作线程数、排队上限，以及各阶段同时进行的数量
+# CPU 阶段（PDF 渲染、本地 OCR）默认只允许 1 个：PaddleOCR 不是线程安全的；I/O 阶段是 API 调用
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "4"))
+WEB_QUEUE_SIZE = int(os.getenv("WEB_QUEUE_SIZE", "50"))
+WEB_CPU_CONCURRENCY = int(os.getenv("WEB_CPU_CONCURRENCY", "1"))
+WEB_IO_CONCURRENCY = int(os.getenv("WEB_IO_CONCURRENCY", "4"))
+# 多用户公平调度：每个用户（按客户端地址）同时执行的上限；文件数不超过该值的任务优先处理
+WEB_CLIENT_CONCURRENCY = int(os.getenv("WEB_CLIENT_CONCURRENCY", "2"))
+WEB_SMALL_TASK_FILES = int(os.getenv("WEB_SMALL_TASK_FILES", "10"))
+
+# Web 版任务存储：sqlite（默认，重启后任务仍在，多个 Web 进程共用同一个数据库）或 memory
+# 多台机器共用时，TASK_DB 和上传/输出的临时目录都需要放在共享存储上
+TASK_STORE = os.getenv("TASK_STORE", "sqlite")
+TASK_DB = os.getenv("TASK_DB", str(CONFIG_DIR / "tasks.db"))
+# 处理中任务的租约秒数：进程退出后超过该时间没有续租，任务由其他进程接管
+TASK_LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", "60"))
+# 谁处理 Web 版的任务：embedded（Web 进程内的工作线程）或 external（独立的 worker.py 进程，
+# Web 进程只负责上传、查询状态和下载；需要 sqlite 任务存储）。worker 每隔 WORKER_POLL_SECONDS 秒领取新任务
+TASK_WORKER = os.getenv("TASK_WORKER", "embedded")
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1"))
+# worker 进程的 Prometheus 指标地址（/metrics）；识别相关的指标只在处理任务的进程中产生。端口为 0 时不提供
+WORKER_METRICS_HOST = os.getenv("WORKER_METRICS_HOST", "127.0.0.1")
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+
 # 分类关键词（用于辅助识别）
 CATEGORY_KEYWORDS = {
     "taxi": ["滴滴", "高德", "美团打车", "曹操", "首汽", "出租车", "网约车", "快车", "专车", "打车"],
@@ -0,0 +1,231 @@
+"""输出目录索引 - 记录已整理的每个文件，支持增量整理
+
+索引是输出目录下的 .index.jsonl，每行一个文件:
+    {"hash": 内容 sha256, "size": 字节数, "mtime_ns": 修改时间, "path": 相对输出目录的路径,
+     "group": 配对组 id, "category": 分类, "info": InvoiceInfo（不含 raw_text）}
+每次整理后整体重写（先写临时文件再替换），中途崩溃不会留下半个索引。
+
+条目按路径区分，内容相同的文件各占一条；另有 hash -> 路径的映射用于查找移动过的文件和过滤已整理的文件。
+
+重新生成报表（--report）时用 sync() 对照实际文件：路径、大小、修改时间都没变的直接用索引，
+其余文件才计算 hash——索引中同内容的文件原位置已不存在，说明是被手动移动过，否则是索引不认识的新文件。
+"""
+import hashlib
+import json
+import os
+import shutil
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .analyzer import InvoiceInfo
+
+INDEX_NAME = ".index.jsonl"
+HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    """文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class IndexEntry:
+    """索引中的一个文件"""
+    hash: str
+    size: int
+    mtime_ns: int
+    path: str  # 相对输出目录，使用 / 分隔
+    group: str
+    category: str
+    info: dict
+
+    def to_info(self, output_dir: Path) -> InvoiceInfo:
+        data = dict(self.info)
+        data["raw_text"] = ""
+        data["file_path"] = str(output_dir / self.path)
+        return InvoiceInfo(**data)
+
+
+@dataclass
+class SyncResult:
+    """sync() 的结果"""
+    entries: List[IndexEntry]  # 索引认识的文件（按传入顺序）
+    unknown: List[Tuple[Path, str, str]]  # 索引不认识的文件 [(路径, 分类, hash)]
+    moved: int = 0  # 被手动移动（或改名）的文件数
+    removed: int = 0  # 索引中已不存在的文件数
+
+
+class OutputIndex:
+    """输出目录索引（按相对路径记录，可按内容 hash 查找）"""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / INDEX_NAME
+        self.entries: Dict[str, IndexEntry] = {}  # 相对路径 -> 条目
+        self.by_hash: Dict[str, Set[str]] = {}  # hash -> 相对路径
+        self.load()
+
+    def load(self):
+        self.entries, self.by_hash = {}, {}
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    self._add(IndexEntry(**json.loads(line)))
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in sorted(self.entries.values(), key=lambda e: e.path):
+                f.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    @property
+    def backup_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".prev")
+
+    def backup(self):
+        """保存当前索引，整理回滚时用 restore_backup() 恢复"""
+        tmp = self.backup_path.with_name(self.backup_path.name + ".tmp")
+        if self.path.exists():
+            shutil.copyfile(self.path, tmp)
+        else:
+            tmp.write_bytes(b"")
+        os.replace(tmp, self.backup_path)
+
+    def restore_backup(self) -> bool:
+        if not self.backup_path.exists():
+            return False
+        os.replace(self.backup_path, self.path)
+        self.load()
+        return True
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, file_hash: str) -> bool:
+        return file_hash in self.by_hash
+
+    def relpath(self, path) -> str:
+        """相对输出目录的路径（索引中的写法）"""
+        return Path(os.path.relpath(path, self.output_dir)).as_posix()
+
+    def _add(self, entry: IndexEntry):
+        self.remove(entry.path)
+        self.entries[entry.path] = entry
+        self.by_hash.setdefault(entry.hash, set()).add(entry.path)
+
+    def remove(self, rel: str) -> Optional[IndexEntry]:
+        """删除一个条目（rel 为相对路径），返回被删除的条目"""
+        entry = self.entries.pop(rel, None)
+        if entry is not None:
+            paths = self.by_hash[entry.hash]
+            paths.discard(rel)
+            if not paths:
+                del self.by_hash[entry.hash]
+        return entry
+
+    def record(self, info: InvoiceInfo, file_hash: str, group: str, category: str):
+        """记录（或更新）一个已放置的文件，info.file_path 为放置后的位置"""
+        stat = os.stat(info.file_path)
+        data = asdict(info)
+        data.pop("raw_text")
+        data.pop("file_path")
+        self._add(IndexEntry(
+            hash=file_hash,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            path=self.relpath(info.file_path),
+            group=group,
+            category=category,
+            info=data,
+        ))
+
+    def groups(self) -> Dict[str, List[IndexEntry]]:
+        result = defaultdict(list)
+        for entry in self.entries.values():
+            result[entry.group].append(entry)
+        return dict(result)
+
+    def open_entries(self) -> List[IndexEntry]:
+        """还没有配对的文件（单独成组的凭证和发票），增量整理时和新文件一起重新配对"""
+        return [members[0] for members in self.groups().values() if len(members) == 1]
+
+    def categorized(self) -> Dict[str, List[InvoiceInfo]]:
+        """按分类返回所有文件，用于生成报表"""
+        result = defaultdict(list)
+        for entry in sorted(self.entries.values(), key=lambda e: e.path):
+            result[entry.category].append(entry.to_info(self.output_dir))
+        return dict(result)
+
+    def invoice_totals(self) -> Dict[str, Tuple[int, float]]:
+        """各分类的发票张数和金额（直接读索引条目，不构造 InvoiceInfo）"""
+        totals = {}
+        for entry in self.entries.values():
+            count, amount = totals.get(entry.category, (0, 0.0))
+            if entry.info.get("is_invoice", True):
+                count, amount = count + 1, amount + entry.info.get("amount", 0.0)
+            totals[entry.category] = (count, amount)
+        return totals
+
+    def sync(self, files: Iterable[Tuple[Path, str]]) -> SyncResult:
+        """
+        对照实际文件更新索引（不保存）
+
+        Args:
+            files: [(文件路径, 所在目录对应的分类)]
+        """
+        files = [(Path(file_path), category, self.relpath(file_path)) for file_path, category in files]
+        present = {rel for _, _, rel in files}
+        result = SyncResult(entries=[], unknown=[])
+        for file_path, category, rel in files:
+            stat = os.stat(file_path)
+            entry = self.entries.get(rel)
+            if entry is None or entry.size != stat.st_size or entry.mtime_ns != stat.st_mtime_ns:
+                file_hash = hash_file(str(file_path))
+                if entry is None or entry.hash != file_hash:
+                    if entry is not None:
+                        # 原位置的文件换成了其他内容
+                        self.remove(rel)
+                        result.removed += 1
+                    # 同内容的条目原位置已不存在：文件被手动移动（或改名）过
+                    old = next((p for p in sorted(self.by_hash.get(file_hash, ())) if p not in present), None)
+                    if old is None:
+                        result.unknown.append((file_path, category, file_hash))
+                        continue
+                    entry = self.remove(old)
+                    entry.path = rel
+                    self._add(entry)
+                    result.moved += 1
+                entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+            entry.category = category
+            result.entries.append(entry)
+
+        for rel in [p for p in self.entries if p not in present]:
+            self.remove(rel)
+            result.removed += 1
+        return result
+
+    def filter_new(self, files: Iterable[str], hashes: Optional[Dict[str, str]] = None) -> List[str]:
+        """过滤掉内容已在索引中的文件；hashes 不为 None 时填入 {文件: hash}"""
+        new_files = []
+        seen = set()
+        for file_path in files:
+            file_hash = hash_file(file_path)
+            if file_hash in self.by_hash or file_hash in seen:
+                continue
+            seen.add(file_hash)
+            new_files.append(file_path)
+            if hashes is not None:
+                hashes[file_path] = file_hash
+        return new_files
@@ -0,0 +1,123 @@
+"""整理日志模块 - 记录一次整理的计划和进度，中途崩溃后可继续或回滚
+
+日志是输出目录下的 .organize_journal.jsonl，每行一条 JSON 记录，只追加不修改:
+    {"type": "plan", "copy_mode": false, "layout": "files", "folders": [...],
+     "moves": [{"src": 源文件, "dst": 目标路径, "copy": 是否复制, ...}, ...]}
+    {"type": "done", "index": 3, "dst": "实际目标路径"}
+    {"type": "commit"}      全部完成
+    {"type": "rollback"}    已回滚
+plan 和 commit 写入后 fsync；done 每条 flush，进程崩溃不会丢失。
+写到一半的最后一行（断电）读取时忽略。
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+JOURNAL_NAME = ".organize_journal.jsonl"
+
+
+class JournalError(Exception):
+    """日志状态不允许当前操作（例如上次整理未完成）"""
+
+
+@dataclass
+class JournalState:
+    """从日志读出的整理状态"""
+    copy_mode: bool
+    folders: List[str]
+    moves: List[dict]  # 至少含 src / dst / copy，其余字段原样保存
+    done: Dict[int, str] = field(default_factory=dict)  # 序号 -> 实际目标路径
+    layout: str = "files"
+    committed: bool = False
+    rolled_back: bool = False
+
+    @property
+    def finished(self) -> bool:
+        return self.committed or self.rolled_back
+
+    def pending(self) -> List[int]:
+        return [idx for idx in range(len(self.moves)) if idx not in self.done]
+
+
+class OrganizeJournal:
+    """输出目录的整理日志"""
+
+    def __init__(self, output_dir: str):
+        self.path = Path(output_dir) / JOURNAL_NAME
+        self._file = None
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self) -> Optional[JournalState]:
+        """读取日志，没有日志时返回 None"""
+        if not self.path.exists():
+            return None
+        state = None
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # 写到一半的行
+                kind = record.get("type")
+                if kind == "plan":
+                    state = JournalState(
+                        copy_mode=record["copy_mode"],
+                        folders=record["folders"],
+                        moves=record["moves"],
+                        layout=record.get("layout", "files"),
+                    )
+                elif state is None:
+                    continue
+                elif kind == "done":
+                    state.done[record["index"]] = record["dst"]
+                elif kind == "commit":
+                    state.committed = True
+                elif kind == "rollback":
+                    state.rolled_back = True
+        return state
+
+    def begin(self, moves: List[dict], folders: List[str], copy_mode: bool, layout: str = "files"):
+        """开始新的整理（覆盖已结束的旧日志）"""
+        state = self.load()
+        if state is not None and not state.finished:
+            raise JournalError(f"上次整理未完成，请先继续（--resume）或回滚（--rollback）: {self.path}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.close()
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._write({"type": "plan", "copy_mode": copy_mode, "layout": layout, "folders": folders,
+                     "moves": moves}, sync=True)
+
+    def reopen(self):
+        """继续写已有的日志（先去掉写到一半的最后一行）"""
+        self.close()
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def record_done(self, index: int, dst: str):
+        self._write({"type": "done", "index": index, "dst": str(dst)})
+
+    def commit(self):
+        self._write({"type": "commit"}, sync=True)
+        self.close()
+
+    def mark_rolled_back(self):
+        self._write({"type": "rollback"}, sync=True)
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record: dict, sync: bool = False):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
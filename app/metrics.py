@@ -0,0 +1,372 @@
+"""性能指标模块 - 轻量的计时、计数器和直方图
+
+默认关闭，关闭时 timer() 返回共享的空上下文管理器，inc()/observe() 直接返回，开销接近于零。
+通过环境变量 EXPENSE_METRICS=1 或调用 enable() 开启。
+
+用法:
+    from app import metrics
+
+    with metrics.timer("ocr.render"):
+        pix = page.get_pixmap(dpi=150)
+    metrics.inc("api_requests", model="vision", status=200)
+
+    print(metrics.format_summary())
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+# 直方图默认分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 阶段耗时统一记录到这个直方图，用 stage 标签区分
+STAGE_HISTOGRAM = "stage_seconds"
+
+_enabled = os.getenv("EXPENSE_METRICS", "").lower() not in ("", "0", "false", "no")
+
+
+def _label_key(labels: dict) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """固定分桶直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, pct: float) -> float:
+        """根据分桶线性插值估算百分位数"""
+        if not self.count:
+            return 0.0
+        rank = self.count * pct / 100
+        cumulative = 0
+        for idx, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                upper = self.buckets[idx] if idx < len(self.buckets) else self.max
+                lower = max(lower, self.min)
+                upper = min(upper, self.max)
+                fraction = (rank - cumulative) / bucket_count
+                return lower + (upper - lower) * fraction
+            cumulative += bucket_count
+        return self.max
+
+    def to_dict(self) -> dict:
+        cumulative = 0
+        buckets = []
+        for upper, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            buckets.append([upper, cumulative])
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": buckets,
+        }
+
+
+class MetricsRegistry:
+    """指标注册表（线程安全）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[Tuple, float]] = {}
+        self.gauges: Dict[str, Dict[Tuple, float]] = {}
+        self.histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def add_gauge(self, name: str, delta: float, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + delta
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self) -> dict:
+        """导出当前所有指标"""
+        with self.lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+                "gauges": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self.gauges.items()
+                },
+                "histograms": {
+                    name: [dict(labels=dict(key), **h.to_dict()) for key, h in series.items()]
+                    for name, series in self.histograms.items()
+                },
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+
+class _Timer:
+    """计时上下文管理器，退出时记录到阶段直方图"""
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry.observe(STAGE_HISTOGRAM, time.perf_counter() - self.started, stage=self.stage)
+        return False
+
+
+class _NullTimer:
+    """关闭时使用的空计时器"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+# 全局注册表
+registry = MetricsRegistry()
+
+
+def enable():
+    """开启指标收集"""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """关闭指标收集"""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def timer(stage: str):
+    """阶段计时：with metrics.timer("ocr.render"): ..."""
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(stage)
+
+
+def inc(name: str, value: float = 1, **labels):
+    """计数器加值"""
+    if _enabled:
+        registry.inc(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels):
+    """设置瞬时值"""
+    if _enabled:
+        registry.set_gauge(name, value, **labels)
+
+
+def add_gauge(name: str, delta: float, **labels):
+    """瞬时值增减（如进行中的任务数）"""
+    if _enabled:
+        registry.add_gauge(name, delta, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    """记录一个直方图样本"""
+    if _enabled:
+        registry.observe(name, value, **labels)
+
+
+def snapshot() -> dict:
+    """导出当前所有指标"""
+    return registry.snapshot()
+
+
+def reset():
+    """清空所有指标"""
+    registry.reset()
+
+
+def format_summary() -> str:
+    """格式化为终端可读的表格"""
+    data = snapshot()
+    lines = []
+    stages = sorted(data["histograms"].get(STAGE_HISTOGRAM, []), key=lambda h: h["labels"].get("stage", ""))
+    if stages:
+        lines.append(f"{'阶段':<26}{'次数':>8}{'总计(s)':>10}{'平均(ms)':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+        for h in stages:
+            mean = h["sum"] / h["count"] if h["count"] else 0.0
+            lines.append(
+                f"{h['labels'].get('stage', ''):<26}{h['count']:>8}{h['sum']:>10.3f}{mean * 1000:>10.2f}"
+                f"{h['p50'] * 1000:>10.2f}{h['p95'] * 1000:>10.2f}{h['p99'] * 1000:>10.2f}"
+            )
+    for name, series in sorted(data["counters"].items()):
+        for item in sorted(series, key=lambda s: sorted(s["labels"].items())):
+            labels = ",".join(f"{k}={v}" for k, v in sorted(item["labels"].items()))
+            title = f"{name}{{{labels}}}" if labels else name
+            lines.append(f"{title:<44}{item['value']:>10g}")
+    return "\n".join(lines) if lines else "（没有收集到指标）"
+
+
+# Prometheus 文本格式的说明文字
+_HELP = {
+    "api_requests": "API 请求次数（按模型类型和状态码）",
+    "api_errors": "API 失败次数（非 2xx 或网络错误）",
+    "files_placed": "整理时放置的文件数",
+    "files_processed": "识别处理的文件数",
+    "tasks_finished": "结束的任务数（按结果）",
+    "tasks": "当前任务数（按状态）",
+    "tasks_active": "处理中的任务数",
+    "queue_depth": "排队等待处理的任务数",
+    "workers_busy": "正在执行任务的工作线程数",
+    "ocr_inflight": "正在进行的 OCR/渲染调用数",
+    "ocr_pool_size": "OCR 处理器数量",
+    "ocr_pool_utilisation": "OCR 处理器（渲染和 OCR 共用的 CPU 阶段名额）占用率",
+    "temp_disk_bytes": "任务临时文件占用的磁盘空间（字节）",
+    "stage_seconds": "各阶段耗时（秒）",
+    "cache_requests": "缓存查询次数（按命中结果）",
+    "cache_hit_ratio": "缓存命中率",
+}
+
+
+def _prom_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "_:" else "_" for c in name)
+
+
+def _prom_labels(labels: dict, extra: dict = None) -> str:
+    items = dict(labels)
+    if extra:
+        items.update(extra)
+    if not items:
+        return ""
+    escaped = []
+    for key, value in sorted(items.items()):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        escaped.append(f'{_prom_name(key)}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _prom_value(value) -> str:
+    if value is None:
+        return "NaN"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(extra_gauges: dict = None, prefix: str = "reimbursement") -> str:
+    """
+    导出为 Prometheus 文本格式（text/plain; version=0.0.4）
+
+    Args:
+        extra_gauges: 调用方在抓取时计算的瞬时值，{名称: 数值} 或 {名称: [(标签dict, 数值), ...]}
+        prefix: 指标名前缀
+    """
+    data = snapshot()
+    lines = []
+
+    def header(name: str, base: str, kind: str):
+        lines.append(f"# HELP {name} {_HELP.get(base, base)}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for base, series in sorted(data["counters"].items()):
+        name = f"{prefix}_{_prom_name(base)}_total"
+        header(name, base, "counter")
+        for item in series:
+            lines.append(f"{name}{_prom_labels(item['labels'])} {_prom_value(item['value'])}")
+
+    # API 错误按状态码单独导出，方便告警
+    errors = [
+        item for item in data["counters"].get("api_requests", [])
+        if not str(item["labels"].get("status", "")).startswith("2")
+    ]
+    if errors:
+        name = f"{prefix}_api_errors_total"
+        header(name, "api_errors", "counter")
+        for item in errors:
+            lines.append(f"{name}{_prom_labels(item['labels'])} {_prom_value(item['value'])}")
+
+    # 缓存命中率由 cache_requests{cache, result=hit|miss} 推导
+    cache_totals = {}
+    for item in data["counters"].get("cache_requests", []):
+        cache = item["labels"].get("cache", "")
+        hits, total = cache_totals.get(cache, (0, 0))
+        if item["labels"].get("result") == "hit":
+            hits += item["value"]
+        cache_totals[cache] = (hits, total + item["value"])
+    if cache_totals:
+        name = f"{prefix}_cache_hit_ratio"
+        header(name, "cache_hit_ratio", "gauge")
+        for cache, (hits, total) in sorted(cache_totals.items()):
+            lines.append(f"{name}{_prom_labels({'cache': cache})} {_prom_value(hits / total if total else 0.0)}")
+
+    gauges = {base: [(item["labels"], item["value"]) for item in series]
+              for base, series in data["gauges"].items()}
+    for base, value in (extra_gauges or {}).items():
+        gauges[base] = value if isinstance(value, list) else [({}, value)]
+    for base, series in sorted(gauges.items()):
+        name = f"{prefix}_{_prom_name(base)}"
+        header(name, base, "gauge")
+        for labels, value in series:
+            lines.append(f"{name}{_prom_labels(labels)} {_prom_value(value)}")
+
+    for base, series in sorted(data["histograms"].items()):
+        name = f"{prefix}_{_prom_name(base)}"
+        header(name, base, "histogram")
+        for item in series:
+            for upper, cumulative in item["buckets"]:
+                lines.append(f"{name}_bucket{_prom_labels(item['labels'], {'le': _prom_value(float(upper))})} {cumulative}")
+            lines.append(f"{name}_bucket{_prom_labels(item['labels'], {'le': '+Inf'})} {item['count']}")
+            lines.append(f"{name}_sum{_prom_labels(item['labels'])} {_prom_value(item['sum'])}")
+            lines.append(f"{name}_count{_prom_labels(item['labels'])} {item['count']}")
+
+    return "\n".join(lines) + "\n"
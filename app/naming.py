@@ -0,0 +1,54 @@
+"""文件名分配模块 - 为整理后的文件分配不重名的目标路径
+
+开始时扫描一次输出目录，之后全部在内存中判断是否重名，不再逐个 exists()。
+重名时加序号（_1, _2...），每个文件名记住下一个可用序号，分配一次是 O(1)。
+不区分大小写（macOS/Windows 默认的文件系统不区分）。
+"""
+import os
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+
+def _key(path) -> str:
+    return os.path.normpath(str(path)).casefold()
+
+
+class NameAllocator:
+    """目标路径分配器（单线程使用）"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._taken: Set[str] = set()
+        self._next: Dict[Tuple[str, str, str], int] = {}
+        self._scan()
+
+    def _scan(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for name in filenames + dirnames:
+                self._taken.add(_key(os.path.join(dirpath, name)))
+
+    def is_taken(self, path) -> bool:
+        return _key(path) in self._taken
+
+    def reserve(self, path):
+        """标记路径已占用（例如外部放置的文件）"""
+        self._taken.add(_key(path))
+
+    def allocate(self, folder: Path, filename: str) -> Path:
+        """返回 folder 下不重名的路径并占用它"""
+        path = Path(folder) / filename
+        if _key(path) not in self._taken:
+            self._taken.add(_key(path))
+            return path
+
+        stem, suffix = path.stem, path.suffix
+        counter_key = (_key(folder), stem.casefold(), suffix.casefold())
+        counter = self._next.get(counter_key, 1)
+        while True:
+            candidate = path.parent / f"{stem}_{counter}{suffix}"
+            counter += 1
+            if _key(candidate) not in self._taken:
+                break
+        self._next[counter_key] = counter
+        self._taken.add(_key(candidate))
+        return candidate
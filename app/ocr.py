@@ -8,13 +8,15 @@ import fitz  # PyMuPDF
 from PIL import Image
 import io
 
+from . import metrics
 from .config import SUPPORTED_IMAGE_FORMATS, SUPPORTED_PDF_FORMAT
 
 
 def image_to_base64(image_path: str) -> str:
     """将图片转换为 base64 编码"""
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+    with metrics.timer("ocr.encode"):
+        with open(image_path, "rb") as f:
+            return base64.b64encode(f.read()).decode("utf-8")
 
 
 def get_image_mime_type(file_path: str) -> str:
@@ -68,12 +70,16 @@ class OCRHandler:
         file_path = Path(file_path)
         suffix = file_path.suffix.lower()
 
-        if suffix in SUPPORTED_IMAGE_FORMATS:
-            return self._extract_from_image(str(file_path))
-        elif suffix == SUPPORTED_PDF_FORMAT:
-            return self._extract_from_pdf(str(file_path))
-        else:
-            raise ValueError(f"不支持的文件格式: {suffix}")
+        metrics.add_gauge("ocr_inflight", 1, kind="ocr")
+        try:
+            if suffix in SUPPORTED_IMAGE_FORMATS:
+                return self._extract_from_image(str(file_path))
+            elif suffix == SUPPORTED_PDF_FORMAT:
+                return self._extract_from_pdf(str(file_path))
+            else:
+                raise ValueError(f"不支持的文件格式: {suffix}")
+        finally:
+            metrics.add_gauge("ocr_inflight", -1, kind="ocr")
 
     def _extract_from_image(self, image_path: str) -> str:
         """从图片提取文字"""
@@ -81,7 +87,8 @@ class OCRHandler:
             # PaddleOCR 不可用，返回空字符串（后续会用视觉模型）
             return ""
 
-        result = self.ocr.ocr(image_path, cls=True)
+        with metrics.timer("ocr.recognize"):
+            result = self.ocr.ocr(image_path, cls=True)
 
         if not result or not result[0]:
             return ""
@@ -106,15 +113,17 @@ class OCRHandler:
             page = doc[page_num]
 
             # 首先尝试直接提取文字（电子 PDF）
-            text = page.get_text()
+            with metrics.timer("ocr.text_layer"):
+                text = page.get_text()
 
             if text.strip():
                 texts.append(text)
             elif self.ocr is not None:
                 # 如果没有文字且有 OCR，说明是扫描件，用 OCR
                 # 将页面转为图片
-                pix = page.get_pixmap(dpi=200)
-                img_data = pix.tobytes("png")
+                with metrics.timer("ocr.render"):
+                    pix = page.get_pixmap(dpi=200)
+                    img_data = pix.tobytes("png")
 
                 # 使用 OCR 识别
                 img = Image.open(io.BytesIO(img_data))
@@ -155,11 +164,13 @@ def pdf_to_images(pdf_path: str) -> list:
 
     for page_num in range(len(doc)):
         page = doc[page_num]
-        pix = page.get_pixmap(dpi=150)  # 150 DPI 足够识别且不会太大
-        img_data = pix.tobytes("png")
+        with metrics.timer("ocr.render"):
+            pix = page.get_pixmap(dpi=150)  # 150 DPI 足够识别且不会太大
+            img_data = pix.tobytes("png")
 
         # 转换为 base64
-        img_base64 = base64.b64encode(img_data).decode("utf-8")
+        with metrics.timer("ocr.encode"):
+            img_base64 = base64.b64encode(img_data).decode("utf-8")
         images.append({
             "type": "image_url",
             "image_url": {
@@ -176,19 +187,23 @@ def file_to_image_content(file_path: str) -> list:
     file_path = Path(file_path)
     suffix = file_path.suffix.lower()
 
-    if suffix == ".pdf":
-        return pdf_to_images(str(file_path))
-    elif suffix in SUPPORTED_IMAGE_FORMATS:
-        img_base64 = image_to_base64(str(file_path))
-        mime_type = get_image_mime_type(str(file_path))
-        return [{
-            "type": "image_url",
-            "image_url": {
-                "url": f"data:{mime_type};base64,{img_base64}"
-            }
-        }]
-    else:
-        raise ValueError(f"不支持的文件格式: {suffix}")
+    metrics.add_gauge("ocr_inflight", 1, kind="render")
+    try:
+        if suffix == ".pdf":
+            return pdf_to_images(str(file_path))
+        elif suffix in SUPPORTED_IMAGE_FORMATS:
+            img_base64 = image_to_base64(str(file_path))
+            mime_type = get_image_mime_type(str(file_path))
+            return [{
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:{mime_type};base64,{img_base64}"
+                }
+            }]
+        else:
+            raise ValueError(f"不支持的文件格式: {suffix}")
+    finally:
+        metrics.add_gauge("ocr_inflight", -1, kind="render")
 
 
 # 全局实例
@@ -1,22 +1,75 @@
 """文件分类和配对模块"""
 import os
-import shutil
 import re
+import shutil
+import uuid
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Sequence, Tuple
 from datetime import datetime, timedelta
 from collections import defaultdict
+from dataclasses import asdict, dataclass
 
-from .config import INVOICE_CATEGORIES, PENDING_CATEGORY
+from . import metrics
+from .config import INVOICE_CATEGORIES, PENDING_CATEGORY, PLACEMENT_WORKERS
 from .analyzer import InvoiceInfo
+from .index import IndexEntry, OutputIndex, hash_file
+from .journal import JournalError, OrganizeJournal
+from .naming import NameAllocator
+from .placement import PlacementEngine, PlacementResult, ProgressCallback
+from .store import LAYOUTS, ContentStore, LinkPlacementEngine
+from .pairing import PAIRING_MODES, pair_documents
+
+
+@dataclass
+class PlannedMove:
+    """整理计划中的一个文件"""
+    info: InvoiceInfo
+    category: str
+    src: str
+    dst: Path
+    group: str = ""  # 配对组 id
+    copy: bool = False  # True=复制, False=移动（输出目录中已有的文件换组时总是移动）
+    hash: str = ""  # 内容 sha256，未知时放置后计算
+    replaces: str = ""  # 放置后不再有效的索引条目（相对路径），输出目录中已有的文件换位置时为原位置
+
+    def to_record(self) -> dict:
+        """写入整理日志的记录"""
+        info = asdict(self.info)
+        info.pop("raw_text")
+        info.pop("file_path")
+        return {"src": self.src, "dst": str(self.dst), "copy": self.copy, "group": self.group,
+                "category": self.category, "hash": self.hash, "replaces": self.replaces, "info": info}
+
+
+@dataclass
+class OrganizePlan:
+    """整理计划：所有文件的源路径和目标路径"""
+    moves: List[PlannedMove]
+
+    @property
+    def folders(self) -> List[Path]:
+        return sorted({m.dst.parent for m in self.moves})
 
 
 class FileOrganizer:
     """文件组织器 - 负责分类、配对、移动/复制文件"""
 
-    def __init__(self, output_dir: str, copy_mode: bool = False):
+    def __init__(self, output_dir: str, copy_mode: bool = False, pairing: str = "greedy",
+                 group_multi: bool = False, workers: int = PLACEMENT_WORKERS, hardlink: bool = False,
+                 layout: str = "files"):
+        if pairing not in PAIRING_MODES:
+            raise ValueError(f"未知的配对模式: {pairing}（可选 {', '.join(PAIRING_MODES)}）")
+        if layout not in LAYOUTS:
+            raise ValueError(f"未知的输出布局: {layout}（可选 {', '.join(LAYOUTS)}）")
         self.output_dir = Path(output_dir)
         self.copy_mode = copy_mode  # True=复制, False=移动
+        self.pairing = pairing  # greedy=按文件顺序逐个配对, optimal=全局最优配对
+        self.group_multi = group_multi  # 多张凭证按金额之和归到一张发票
+        # 并行复制/移动；hardlink=True 时同一文件系统上的复制用硬链接代替
+        # layout=symlink/hardlink 时原始文件放入 .store，分类目录中只放链接
+        self.layout = layout
+        self._hashes = {}  # 链接布局放置时算出的 {源文件: hash}
+        self.placement = self._make_engine(copy_mode, workers, hardlink)
         self._ensure_category_dirs()
 
     def _ensure_category_dirs(self):
@@ -26,23 +79,51 @@ class FileOrganizer:
         # 待确认目录
         (self.output_dir / PENDING_CATEGORY).mkdir(parents=True, exist_ok=True)
 
-    def organize(self, invoice_infos: List[InvoiceInfo]) -> Dict[str, List[InvoiceInfo]]:
+    def organize(self, invoice_infos: List[InvoiceInfo],
+                 progress: Optional[ProgressCallback] = None,
+                 existing: Sequence[IndexEntry] = (),
+                 hashes: Optional[Dict[str, str]] = None) -> Dict[str, List[InvoiceInfo]]:
         """
-        组织所有发票文件
+        组织所有发票文件（plan + execute）
 
         Args:
             invoice_infos: 发票信息列表
+            progress: 每放置完一个文件调用 progress(已完成数, 总数, PlacementResult)，默认打印一行
+            existing: 输出目录中尚未配对的文件（增量整理时和新文件一起配对，见 plan）
+            hashes: 已知的 {源文件: 内容 hash}，省去放置后再读一遍文件
 
         Returns:
-            分类后的字典 {类别: [发票信息列表]}
+            分类后的字典 {类别: [发票信息列表]}（只含本次放置的文件）
+        """
+        return self.execute(self.plan(invoice_infos, existing=existing, hashes=hashes), progress)
+
+    def plan(self, invoice_infos: List[InvoiceInfo], existing: Sequence[IndexEntry] = (),
+             hashes: Optional[Dict[str, str]] = None) -> OrganizePlan:
+        """
+        计算整理计划：配对、分类、目标文件名，不做任何文件操作
+
+        existing 是输出目录中已整理但尚未配对的文件（OutputIndex.open_entries()），和新文件一起配对；
+        和新文件配上对的移到新的组目录，仍然单独的留在原处。
+        目标文件名由 NameAllocator 分配：与输出目录中已有的文件、计划内的其他文件都不重名
         """
+        hashes = hashes or {}
+        existing_infos = [entry.to_info(self.output_dir) for entry in existing]
+        existing_hashes = {id(info): entry.hash for info, entry in zip(existing_infos, existing)}
+        existing_paths = {id(info): entry.path for info, entry in zip(existing_infos, existing)}
+
         # 1. 配对凭证和发票
-        paired_groups = self._pair_vouchers_and_invoices(invoice_infos)
+        with metrics.timer("organizer.pairing"):
+            paired_groups = self._pair_vouchers_and_invoices(existing_infos + list(invoice_infos))
 
-        # 2. 移动文件到对应目录
-        categorized = defaultdict(list)
+        # 2. 计算每个文件的目标位置
+        moves = []
+        names = NameAllocator(self.output_dir)
 
         for group in paired_groups:
+            if len(group) == 1 and id(group[0]) in existing_hashes:
+                continue  # 仍然没有配对，留在原处
+            group_id = uuid.uuid4().hex[:12]
+
             # 获取配对组的实际消费日期（优先从凭证/行程单获取）
             group_date = ""
             has_voucher = False
@@ -77,129 +158,286 @@ class FileOrganizer:
             folder_name = self._generate_folder_name(group)
             target_folder = self.output_dir / category_name / folder_name
 
-            # 确保文件夹存在
-            target_folder.mkdir(parents=True, exist_ok=True)
-
-            # 移动文件
             for idx, info in enumerate(group, 1):
                 new_filename = self._generate_filename(info, idx, len(group), group_date)
-                target_path = target_folder / new_filename
+                target_path = names.allocate(target_folder, new_filename)
+                if id(info) in existing_hashes:
+                    moves.append(PlannedMove(info, category_name, info.file_path, target_path,
+                                             group_id, copy=False, hash=existing_hashes[id(info)],
+                                             replaces=existing_paths[id(info)]))
+                else:
+                    moves.append(PlannedMove(info, category_name, info.file_path, target_path,
+                                             group_id, copy=self.copy_mode, hash=hashes.get(info.file_path, "")))
+
+        return OrganizePlan(moves)
+
+    def execute(self, plan: OrganizePlan,
+                progress: Optional[ProgressCallback] = None) -> Dict[str, List[InvoiceInfo]]:
+        """
+        执行整理计划，进度写入输出目录的整理日志（崩溃后可 resume / rollback），完成后更新输出目录索引
 
-                # 移动文件
-                self._move_file(info.file_path, target_path)
+        Raises:
+            JournalError: 上次整理未完成
+        """
+        progress = progress or self._print_progress
+        journal = OrganizeJournal(self.output_dir)
+        journal.begin([m.to_record() for m in plan.moves], [str(f) for f in plan.folders], self.copy_mode,
+                      self.layout)
 
-                # 更新文件路径
-                info.file_path = str(target_path)
-                categorized[category_name].append(info)
+        try:
+            OutputIndex(self.output_dir).backup()
+            # 批量创建目录
+            for folder in plan.folders:
+                folder.mkdir(parents=True, exist_ok=True)
+
+            results = self._place([(idx, m.src, m.dst, m.copy) for idx, m in enumerate(plan.moves)],
+                                  journal, progress)
+            for idx, move in enumerate(plan.moves):
+                # 更新文件路径（计划之后目标又被占用时会再加序号）
+                move.info.file_path = str(results[idx].dst)
+                move.hash = move.hash or self._hashes.get(move.src, "")
+
+            self._update_index([(m.info, m.hash, m.group, m.category) for m in plan.moves],
+                               [m.replaces for m in plan.moves if m.replaces])
+            journal.commit()
+        finally:
+            journal.close()
+        self._remove_emptied_folders(m.src for m in plan.moves if not m.copy)
+
+        categorized = defaultdict(list)
+        for move in plan.moves:
+            categorized[move.category].append(move.info)
 
         return dict(categorized)
 
-    def _pair_vouchers_and_invoices(self, invoice_infos: List[InvoiceInfo]) -> List[List[InvoiceInfo]]:
+    def _place(self, jobs: List[Tuple[int, str, Path, bool]], journal: OrganizeJournal,
+               progress: ProgressCallback) -> Dict[int, PlacementResult]:
+        """放置文件（先移动再复制），每完成一个记一条日志；jobs 为 [(序号, 源, 目标, 是否复制)]"""
+        results = {}
+        total = len(jobs)
+        for copy in (False, True):
+            batch = [(idx, src, Path(dst)) for idx, src, dst, job_copy in jobs if job_copy == copy]
+            if not batch:
+                continue
+            while batch:
+                # 同一个源文件（重建视图时内容相同的文件）分几轮放置，结果按源文件对应到序号
+                index_of, rest = {}, []
+                for idx, src, dst in batch:
+                    if src in index_of:
+                        rest.append((idx, src, dst))
+                    else:
+                        index_of[src] = (idx, dst)
+
+                def on_placed(done: int, batch_total: int, result: PlacementResult):
+                    idx = index_of[result.src][0]
+                    results[idx] = result
+                    journal.record_done(idx, result.dst)
+                    progress(len(results), total, result)
+
+                self._engine(copy).place_all([(src, dst) for src, (_, dst) in index_of.items()], on_placed)
+                batch = rest
+        return results
+
+    def _engine(self, copy: bool) -> PlacementEngine:
+        if copy == self.copy_mode:
+            return self.placement
+        return self._make_engine(copy, self.placement.workers, self.placement.hardlink)
+
+    def _make_engine(self, copy: bool, workers: int, hardlink: bool) -> PlacementEngine:
+        if self.layout == "files":
+            return PlacementEngine(copy_mode=copy, workers=workers, hardlink=hardlink)
+        return LinkPlacementEngine(ContentStore(self.output_dir), self.layout, copy_mode=copy,
+                                   workers=workers, hardlink=hardlink, hashes=self._hashes)
+
+    def _update_index(self, placed, replaced: Sequence[str] = ()):
         """
-        配对凭证和发票
+        把放置好的文件写入输出目录索引
 
-        规则：
-        1. 同一平台/商家
-        2. 日期相同或相近（±1天）
-        3. 金额相同或相近（±1%）
+        placed 为 [(InvoiceInfo, hash, 组 id, 分类)]，replaced 为先从索引中删除的条目（相对路径）
         """
-        # 分离发票和凭证，保留索引用于追踪
-        invoices = [(idx, i) for idx, i in enumerate(invoice_infos) if i.is_invoice]
-        vouchers = [(idx, i) for idx, i in enumerate(invoice_infos) if not i.is_invoice]
-
-        paired_groups = []
-        used_invoice_indices = set()
-
-        # 尝试配对
-        for voucher_idx, voucher in vouchers:
-            best_match = None
-            best_match_idx = None
-            best_score = 0
-
-            for invoice_idx, invoice in invoices:
-                if invoice_idx in used_invoice_indices:
-                    continue
-
-                score = self._calculate_match_score(voucher, invoice)
-                if score > best_score and score >= 2:  # 至少匹配2个条件
-                    best_score = score
-                    best_match = invoice
-                    best_match_idx = invoice_idx
-
-            if best_match:
-                # 找到配对
-                paired_groups.append([voucher, best_match])
-                used_invoice_indices.add(best_match_idx)
-            else:
-                # 未配对的凭证单独一组
-                paired_groups.append([voucher])
+        index = OutputIndex(self.output_dir)
+        for rel in replaced:
+            index.remove(rel)
+        for info, file_hash, group, category in placed:
+            index.record(info, file_hash or hash_file(info.file_path), group, category)
+        index.save()
+
+    def _remove_emptied_folders(self, sources):
+        """删除输出目录中因文件换组而变空的组目录"""
+        for src in sources:
+            folder = Path(src).parent
+            if folder.parent.parent != self.output_dir:
+                continue  # 只处理 <输出目录>/<分类>/<组> 这一层
+            try:
+                folder.rmdir()
+            except OSError:
+                pass
 
-        # 未配对的发票单独一组
-        for invoice_idx, invoice in invoices:
-            if invoice_idx not in used_invoice_indices:
-                paired_groups.append([invoice])
+    def rebuild_view(self, progress: Optional[ProgressCallback] = None) -> Dict[str, List[InvoiceInfo]]:
+        """
+        按当前的配对和命名规则重建分类目录中的链接（只用于 symlink/hardlink 布局）
 
-        return paired_groups
+        文件信息来自输出目录索引，内容已在 .store 中，不复制任何数据
+        """
+        if self.layout == "files":
+            raise ValueError("只有 symlink / hardlink 布局可以重建视图")
+        store = ContentStore(self.output_dir)
+        index = OutputIndex(self.output_dir)
+
+        infos, hashes, paths = [], {}, {}
+        for entry in index.entries.values():
+            obj = store.path_for(entry.hash, Path(entry.path).suffix)
+            if not obj.exists():
+                print(f"  ⚠ 存储中没有该文件，跳过: {entry.path}")
+                continue
+            view = self.output_dir / entry.path
+            if view.is_symlink() or (view.exists() and os.path.samefile(view, obj)):
+                view.unlink()
+                self._remove_emptied_folders([view])
+            info = entry.to_info(self.output_dir)
+            info.file_path = str(obj)
+            infos.append(info)
+            hashes[str(obj)] = entry.hash
+            paths[id(info)] = entry.path
+
+        plan = self.plan(infos, hashes=hashes)
+        for move in plan.moves:
+            move.copy = True  # 源文件就是存储中的对象，只创建链接
+            move.replaces = paths[id(move.info)]
+        categorized = self.execute(plan, progress)
+
+        store.collect_garbage(store.path_for(e.hash, Path(e.path).suffix)
+                              for e in OutputIndex(self.output_dir).entries.values())
+        return categorized
+
+    def resume(self, progress: Optional[ProgressCallback] = None) -> int:
+        """
+        继续上次中断的整理，返回本次放置的文件数
 
-    def _calculate_match_score(self, voucher: InvoiceInfo, invoice: InvoiceInfo) -> int:
+        Raises:
+            JournalError: 没有未完成的整理
+        """
+        progress = progress or self._print_progress
+        journal = OrganizeJournal(self.output_dir)
+        state = journal.load()
+        if state is None or state.finished:
+            raise JournalError(f"没有未完成的整理: {journal.path}")
+        if state.layout != self.layout:
+            # 按中断的那次整理的布局继续
+            self.layout = state.layout
+            self.placement = self._make_engine(self.copy_mode, self.placement.workers, self.placement.hardlink)
+
+        journal.reopen()
+        try:
+            for folder in state.folders:
+                Path(folder).mkdir(parents=True, exist_ok=True)
+
+            jobs = []
+            for idx in state.pending():
+                move = state.moves[idx]
+                src, dst = move["src"], move["dst"]
+                if not os.path.exists(src):
+                    # 已移动但没来得及记日志；找不到目标时只能跳过
+                    if not os.path.exists(dst):
+                        print(f"  ⚠ 源文件不存在，跳过: {src}")
+                        dst = ""
+                    journal.record_done(idx, dst)
+                    state.done[idx] = dst
+                elif move["copy"] and os.path.exists(dst) and os.path.getsize(dst) == os.path.getsize(src):
+                    journal.record_done(idx, dst)
+                    state.done[idx] = dst
+                else:
+                    jobs.append((idx, src, Path(dst), move["copy"]))
+
+            for idx, result in self._place(jobs, journal, progress).items():
+                state.done[idx] = str(result.dst)
+
+            placed, replaced = [], [m["replaces"] for m in state.moves if m.get("replaces")]
+            for idx, dst in state.done.items():
+                if dst:
+                    move = state.moves[idx]
+                    info = InvoiceInfo(raw_text="", file_path=dst, **move["info"])
+                    placed.append((info, move["hash"], move["group"], move["category"]))
+            self._update_index(placed, replaced)
+            journal.commit()
+        finally:
+            journal.close()
+        self._remove_emptied_folders(m["src"] for m in state.moves if not m["copy"])
+        return len(jobs)
+
+    def rollback(self) -> int:
         """
-        计算凭证和发票的匹配分数
+        撤销最近一次整理（无论是否完成）：移动的文件移回原处，复制的文件删除，返回撤销的文件数
 
-        配对逻辑：以凭证/行程单的实际消费日期为准（因为发票可能是后补开的）
+        Raises:
+            JournalError: 没有整理日志
         """
-        score = 0
-
-        # 0. 订单号匹配（最高优先级）- 用于配对发票和水单
-        if voucher.order_number and invoice.order_number:
-            if voucher.order_number == invoice.order_number:
-                score += 10  # 订单号完全匹配，直接配对
-
-        # 1. 平台/商家匹配（最重要）
-        if self._normalize_merchant(voucher.subtype) == self._normalize_merchant(invoice.subtype):
-            score += 3
-        elif self._normalize_merchant(voucher.merchant) == self._normalize_merchant(invoice.merchant):
-            score += 2
-
-        # 2. 日期匹配 - 以凭证的实际消费日期为准
-        # 凭证的 service_date 应该和发票的 service_date 匹配
-        # 发票的开票日期(date)可能晚于实际消费日期
-        voucher_date = voucher.get_actual_date()
-        invoice_service_date = invoice.service_date or invoice.date
-
-        if voucher_date and invoice_service_date:
+        journal = OrganizeJournal(self.output_dir)
+        state = journal.load()
+        if state is None:
+            raise JournalError(f"没有可回滚的整理记录: {journal.path}")
+        if state.rolled_back:
+            return 0
+
+        placed = dict(state.done)
+        for idx in state.pending():
+            # 已放置但没来得及记日志的文件
+            src, dst = state.moves[idx]["src"], state.moves[idx]["dst"]
+            if os.path.exists(dst) and (state.moves[idx]["copy"] or not os.path.exists(src)):
+                placed[idx] = dst
+
+        undone = 0
+        for idx in sorted(placed, reverse=True):
+            src, dst = state.moves[idx]["src"], placed[idx]
+            if not dst or not os.path.exists(dst):
+                continue
+            if state.moves[idx]["copy"]:
+                os.unlink(dst)
+            elif os.path.islink(dst) and not os.path.exists(src):
+                # 链接布局：内容在 .store 中，复制回原处后删除链接
+                Path(src).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(dst, src)
+                os.unlink(dst)
+            elif os.path.exists(src):
+                print(f"  ⚠ 原位置已有文件，保留: {dst}")
+                continue
+            else:
+                Path(src).parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(dst, src)
+            undone += 1
+
+        # 删除整理时创建、现在为空的目录
+        for folder in sorted(state.folders, key=len, reverse=True):
             try:
-                v_date = datetime.strptime(voucher_date, "%Y-%m-%d")
-                i_date = datetime.strptime(invoice_service_date, "%Y-%m-%d")
-                days_diff = abs((v_date - i_date).days)
-                if days_diff == 0:
-                    score += 2  # 日期完全匹配
-                elif days_diff <= 1:
-                    score += 1  # 相差1天也可接受
-            except ValueError:
+                os.rmdir(folder)
+            except OSError:
                 pass
 
-        # 3. 金额匹配
-        if voucher.amount > 0 and invoice.amount > 0:
-            diff = abs(voucher.amount - invoice.amount)
-            max_amount = max(voucher.amount, invoice.amount)
-            if diff <= max_amount * 0.01:  # 1% 误差范围内
-                score += 3  # 金额完全匹配很重要
-            elif diff <= max_amount * 0.05:  # 5% 误差范围内
-                score += 1
+        # 换组前的目录结构已恢复，索引也恢复到整理前
+        OutputIndex(self.output_dir).restore_backup()
+        journal.reopen()
+        journal.mark_rolled_back()
+        return undone
 
-        # 4. 类型匹配
-        if voucher.type == invoice.type:
-            score += 1
+    def _print_progress(self, done: int, total: int, result: PlacementResult):
+        action = "复制" if self.copy_mode else "移动"
+        print(f"  [{done}/{total}] {action}: {Path(result.src).name} -> {result.dst.relative_to(self.output_dir)}")
 
-        return score
+    def _pair_vouchers_and_invoices(self, invoice_infos: List[InvoiceInfo]) -> List[List[InvoiceInfo]]:
+        """
+        配对凭证和发票
 
-    def _normalize_merchant(self, name: str) -> str:
-        """标准化商家名称"""
-        if not name:
-            return ""
-        # 移除常见后缀和特殊字符
-        name = re.sub(r'[（）()【】\[\]有限公司科技股份]', '', name)
-        return name.strip().lower()
+        规则：
+        1. 同一平台/商家
+        2. 日期相同或相近（±1天）
+        3. 金额相同或相近（±1%）
+        4. 订单号相同直接配对
+
+        得分规则见 pairing.match_score，候选由 pairing 模块的分块索引生成；
+        pairing="optimal" 时求全局最大权匹配，结果与文件顺序无关；
+        group_multi=True 时再把金额之和等于发票金额的多张凭证（酒店水单、打车行程单）归到同一组
+        """
+        return pair_documents(invoice_infos, mode=self.pairing, group_multi=self.group_multi)
 
     def _get_category(self, group: List[InvoiceInfo]) -> str:
         """获取组的分类"""
@@ -225,7 +463,7 @@ class FileOrganizer:
         for info in group:
             if info.is_invoice:
                 invoice_info = info
-            else:
+            elif voucher_info is None:
                 voucher_info = info
 
         # 日期优先用凭证的实际消费日期
@@ -340,31 +578,3 @@ class FileOrganizer:
         # 移除多余空格
         name = re.sub(r'\s+', ' ', name).strip()
         return name
-
-    def _move_file(self, src: str, dst: Path):
-        """移动或复制文件"""
-        src_path = Path(src)
-        # 使用 try/except 而不是预检查（避免 TOCTOU 竞态）
-        try:
-            # 尝试直接操作
-            if self.copy_mode:
-                shutil.copy2(str(src_path), str(dst))
-                action = "复制"
-            else:
-                shutil.move(str(src_path), str(dst))
-                action = "移动"
-        except FileExistsError:
-            # 目标已存在，添加序号
-            stem = dst.stem
-            suffix = dst.suffix
-            counter = 1
-            while dst.exists():
-                dst = dst.parent / f"{stem}_{counter}{suffix}"
-                counter += 1
-            if self.copy_mode:
-                shutil.copy2(str(src_path), str(dst))
-                action = "复制"
-            else:
-                shutil.move(str(src_path), str(dst))
-                action = "移动"
-        print(f"  {action}: {src_path.name} -> {dst.relative_to(self.output_dir)}")
@@ -0,0 +1,699 @@
+"""凭证-发票配对引擎
+
+配对规则（得分见 match_score）：按凭证顺序，每个凭证取得分最高
+（且至少 2 分）的未使用发票，同分取排在前面的发票。
+
+逐一比较所有凭证和发票是 O(V×I) 的，每次比较还要重新标准化商家名、解析日期。
+这里每个文档只计算一次标准化的键（商家、日期序号、金额、订单号），按
+"商家 × 日期 × 类型"分桶，桶内按金额排序建线段树：
+    订单号相同的发票得分 ≥10，一定最优，直接在订单号索引中找
+    其余发票的得分只由"哪些键相等、金额落在哪个误差带"决定，
+    同一类（如"同商家、同一天、同类型、金额在 1% 内"）中排在最前的未使用发票就是该类的最优候选
+每个凭证只需查询少量分类（按得分下界从高到低，低于当前最优即停止），结果与逐一比较完全一致。
+"""
+import bisect
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .analyzer import InvoiceInfo
+
+_INF = float("inf")
+_MERCHANT_STRIP_RE = re.compile(r'[（）()【】\[\]有限公司科技股份]')
+
+# 配对所需的最低分数
+MIN_SCORE = 2
+# 配对模式
+PAIRING_MODES = ("greedy", "optimal")
+# 多对一分组：凭证与发票的最大日期间隔（天）
+GROUP_WINDOW_DAYS = 7
+# 多对一分组：每张发票最多考虑的候选凭证数（按日期接近程度选取）
+GROUP_MAX_CANDIDATES = 16
+# 多对一分组：金额之和允许的误差（分）。候选多时宽松的误差很容易凑出巧合的组合，
+# 而按晚出具的水单、多张行程单的金额之和通常与发票分毫不差
+GROUP_TOLERANCE_CENTS = 5
+# 多对一分组：发票金额上限（分），限制位图大小
+GROUP_MAX_CENTS = 10_000_000
+# 最优配对时单个连通分量的规模上限（凭证数 × 发票数），超过后按边权贪心
+MAX_COMPONENT_CELLS = 40000
+
+
+@lru_cache(maxsize=65536)
+def normalize_merchant(name: str) -> str:
+    """标准化商家名称"""
+    if not name:
+        return ""
+    # 移除常见后缀和特殊字符
+    return _MERCHANT_STRIP_RE.sub('', name).strip().lower()
+
+
+@lru_cache(maxsize=65536)
+def _parse_day(value: str) -> Optional[int]:
+    """日期字符串转换为序号（无法解析返回 None）"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").toordinal()
+    except ValueError:
+        return None
+
+
+@dataclass
+class DocKey:
+    """预先计算好的配对键"""
+    # dataclass 的 slots 参数需要 Python 3.10
+    __slots__ = ("order", "subtype_key", "merchant_key", "day", "amount", "type")
+
+    order: str
+    subtype_key: str
+    merchant_key: str
+    day: Optional[int]
+    amount: float
+    type: str
+
+    @classmethod
+    def from_info(cls, info: InvoiceInfo) -> "DocKey":
+        return cls(
+            order=info.order_number or "",
+            subtype_key=normalize_merchant(info.subtype),
+            merchant_key=normalize_merchant(info.merchant),
+            day=_parse_day(info.get_actual_date()),
+            amount=info.amount,
+            type=info.type,
+        )
+
+
+def _amount_points(a: float, b: float) -> int:
+    """金额得分：1% 内 3 分，5% 内 1 分"""
+    if a > 0 and b > 0:
+        diff = abs(a - b)
+        max_amount = max(a, b)
+        if diff <= max_amount * 0.01:
+            return 3
+        if diff <= max_amount * 0.05:
+            return 1
+    return 0
+
+
+def match_score(voucher: DocKey, invoice: DocKey) -> int:
+    """
+    凭证和发票的匹配分数
+
+    订单号相同 10 分；子类型（平台）相同 3 分，否则商家相同 2 分；
+    实际消费日期相同 2 分、相差 1 天 1 分（发票可能是后补开的）；金额见 _amount_points；类型相同 1 分
+    """
+    score = 0
+    if voucher.order and voucher.order == invoice.order:
+        score += 10
+    if voucher.subtype_key == invoice.subtype_key:
+        score += 3
+    elif voucher.merchant_key == invoice.merchant_key:
+        score += 2
+    if voucher.day is not None and invoice.day is not None:
+        days_diff = abs(voucher.day - invoice.day)
+        if days_diff == 0:
+            score += 2
+        elif days_diff <= 1:
+            score += 1
+    score += _amount_points(voucher.amount, invoice.amount)
+    if voucher.type == invoice.type:
+        score += 1
+    return score
+
+
+class _MinTree:
+    """线段树：查询区间内未使用发票的最小序号"""
+
+    def __init__(self, values: List[int]):
+        size = 1
+        while size < len(values):
+            size <<= 1
+        self.size = size
+        tree = [_INF] * (2 * size)
+        tree[size:size + len(values)] = values
+        for pos in range(size - 1, 0, -1):
+            tree[pos] = min(tree[2 * pos], tree[2 * pos + 1])
+        self.tree = tree
+
+    def remove(self, pos: int):
+        tree = self.tree
+        pos += self.size
+        tree[pos] = _INF
+        pos >>= 1
+        while pos:
+            value = min(tree[2 * pos], tree[2 * pos + 1])
+            if tree[pos] == value:
+                break
+            tree[pos] = value
+            pos >>= 1
+
+    def query(self, lo: int, hi: int) -> float:
+        """[lo, hi) 内的最小值"""
+        tree = self.tree
+        result = _INF
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                result = min(result, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                result = min(result, tree[hi])
+            lo >>= 1
+            hi >>= 1
+        return result
+
+
+class _Bucket:
+    """一类发票：按序号排列（惰性指针取最前的未使用发票），正金额的按金额排序建线段树"""
+
+    __slots__ = ("indices", "pointer", "amounts", "tree")
+
+    def __init__(self):
+        self.indices: List[int] = []
+        self.pointer = 0
+        self.amounts: Optional[List[float]] = None
+        self.tree: Optional[_MinTree] = None
+
+    def first_unused(self, used: List[bool]) -> Optional[int]:
+        indices = self.indices
+        pointer = self.pointer
+        while pointer < len(indices) and used[indices[pointer]]:
+            pointer += 1
+        self.pointer = pointer
+        return indices[pointer] if pointer < len(indices) else None
+
+    def amount_range(self, amount: float, pct: float) -> Tuple[int, int]:
+        """金额误差在 pct 以内的发票在 amounts 中的区间"""
+        return _amount_range(self.amounts, amount, pct)
+
+
+def _within(a: float, b: float, pct: float) -> bool:
+    return abs(a - b) <= max(a, b) * pct
+
+
+def _amount_range(amounts: List[float], amount: float, pct: float) -> Tuple[int, int]:
+    """有序金额列表中误差在 pct 以内的区间（边界按实际判断条件修正）"""
+    lo = bisect.bisect_left(amounts, amount * (1 - pct) * (1 - 1e-9))
+    hi = bisect.bisect_right(amounts, amount / (1 - pct) * (1 + 1e-9))
+    while lo < hi and not _within(amount, amounts[lo], pct):
+        lo += 1
+    while hi > lo and not _within(amount, amounts[hi - 1], pct):
+        hi -= 1
+    return lo, hi
+
+
+def _class_templates() -> List[Tuple[int, Optional[str], Optional[int], bool, Optional[float]]]:
+    """
+    候选分类模板：(得分下界, 商家键, 日期偏移, 是否同类型, 金额误差)
+
+    同一类中每张发票的各项得分都不低于模板对应的分数，所以得分不低于下界；
+    不属于更高下界分类的发票，得分正好等于下界。
+    """
+    merchant_points = {"sk": 3, "mk": 2, None: 0}
+    day_points = {None: 0, 0: 2, -1: 1, 1: 1}
+    amount_points = {None: 0, 0.05: 1, 0.01: 3}
+    templates = []
+    for merchant in merchant_points:
+        for offset in day_points:
+            for same_type in (True, False):
+                for pct in amount_points:
+                    lower_bound = (merchant_points[merchant] + day_points[offset]
+                                   + int(same_type) + amount_points[pct])
+                    if lower_bound >= MIN_SCORE:
+                        templates.append((lower_bound, merchant, offset, same_type, pct))
+    templates.sort(key=lambda item: -item[0])
+    return templates
+
+
+_TEMPLATES = _class_templates()
+
+
+class PairingEngine:
+    """凭证-发票配对引擎"""
+
+    def __init__(self, invoices: List[DocKey]):
+        self.invoices = invoices
+        self.used = [False] * len(invoices)
+        self._trees_of: List[List[Tuple[_MinTree, int]]] = [[] for _ in invoices]
+        self._by_order: Dict[str, List[int]] = {}
+        # 分类桶：(商家键类型, 商家键, 日期, 类型)，不区分的维度为 None
+        self._buckets: Dict[tuple, _Bucket] = {}
+
+        for pos, doc in enumerate(invoices):
+            if doc.order:
+                self._by_order.setdefault(doc.order, []).append(pos)
+            days = (None, doc.day) if doc.day is not None else (None,)
+            for merchant, value in (("sk", doc.subtype_key), ("mk", doc.merchant_key), (None, None)):
+                for day in days:
+                    for inv_type in (doc.type, None):
+                        key = (merchant, value, day, inv_type)
+                        bucket = self._buckets.get(key)
+                        if bucket is None:
+                            bucket = self._buckets[key] = _Bucket()
+                        bucket.indices.append(pos)
+
+    def _tree(self, bucket: _Bucket) -> Optional[_MinTree]:
+        """按需为分类桶建立金额线段树（大部分桶从不需要按金额查询）"""
+        if bucket.amounts is None:
+            invoices, used = self.invoices, self.used
+            members = sorted((invoices[pos].amount, pos) for pos in bucket.indices
+                             if invoices[pos].amount > 0)
+            bucket.amounts = [m[0] for m in members]
+            if members:
+                bucket.tree = _MinTree([_INF if used[m[1]] else m[1] for m in members])
+                for tree_pos, (_, pos) in enumerate(members):
+                    self._trees_of[pos].append((bucket.tree, tree_pos))
+        return bucket.tree
+
+    def take(self, pos: int):
+        """标记发票已被使用"""
+        self.used[pos] = True
+        for tree, tree_pos in self._trees_of[pos]:
+            tree.remove(tree_pos)
+
+    def best_match(self, voucher: DocKey) -> Optional[int]:
+        """返回凭证的最优发票位置（没有达到最低分数返回 None）"""
+        invoices = self.invoices
+        used = self.used
+        best_score = 0
+        best_pos = _INF
+
+        def consider(pos):
+            nonlocal best_score, best_pos
+            if used[pos]:
+                return
+            score = match_score(voucher, invoices[pos])
+            if score >= MIN_SCORE and (score > best_score or (score == best_score and pos < best_pos)):
+                best_score = score
+                best_pos = pos
+
+        # 订单号相同的发票得分至少 10，高于其他任何发票（最多 9 分）
+        if voucher.order:
+            for pos in self._by_order.get(voucher.order, ()):
+                consider(pos)
+            if best_score:
+                return best_pos
+
+        # 按下界从高到低查询各分类中最前的未使用发票；
+        # 最优发票所在分类的下界等于它的得分，下界更低的分类不可能超过当前最优
+        merchant_values = {"sk": voucher.subtype_key, "mk": voucher.merchant_key, None: None}
+        for lower_bound, merchant, offset, same_type, pct in _TEMPLATES:
+            if lower_bound < best_score:
+                break
+            if offset is not None and voucher.day is None:
+                continue
+            if pct is not None and voucher.amount <= 0:
+                continue
+            key = (merchant, merchant_values[merchant],
+                   voucher.day + offset if offset is not None else None,
+                   voucher.type if same_type else None)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            if pct is None:
+                pos = bucket.first_unused(used)
+                if pos is not None:
+                    consider(pos)
+            else:
+                tree = bucket.tree if bucket.amounts is not None else self._tree(bucket)
+                if tree is None:
+                    continue
+                lo, hi = bucket.amount_range(voucher.amount, pct)
+                if lo < hi:
+                    pos = tree.query(lo, hi)
+                    if pos != _INF:
+                        consider(pos)
+
+        return best_pos if best_score else None
+
+    def candidates(self, voucher: DocKey) -> List[int]:
+        """可信的候选发票：订单号相同，或商家相同且日期±1天、金额误差 5% 以内"""
+        found = list(self._by_order.get(voucher.order, ())) if voucher.order else []
+        if voucher.day is not None and voucher.amount > 0:
+            invoices = self.invoices
+            for merchant, value in (("sk", voucher.subtype_key), ("mk", voucher.merchant_key)):
+                for offset in (-1, 0, 1):
+                    bucket = self._buckets.get((merchant, value, voucher.day + offset, None))
+                    if bucket is None:
+                        continue
+                    for pos in bucket.indices:
+                        if invoices[pos].amount > 0 and _within(voucher.amount, invoices[pos].amount, 0.05):
+                            found.append(pos)
+        return list(dict.fromkeys(found))
+
+
+def _content_key(info: InvoiceInfo) -> tuple:
+    """与输入顺序无关的排序键"""
+    return (info.get_actual_date(), info.amount, info.order_number or "", info.subtype or "",
+            info.merchant or "", info.type or "", info.file_path or "")
+
+
+def _hungarian(weights: List[List[int]]) -> List[int]:
+    """
+    最大权匹配（行数不多于列数），返回每行匹配的列
+
+    权重为 0 的位置表示没有边，匹配到这样的列等于不配对。
+    """
+    rows, cols = len(weights), len(weights[0])
+    u = [0] * (rows + 1)
+    v = [0] * (cols + 1)
+    match = [0] * (cols + 1)  # 列 → 行（1 开始，0 表示空）
+    way = [0] * (cols + 1)
+    for row in range(1, rows + 1):
+        match[0] = row
+        col0 = 0
+        minv = [_INF] * (cols + 1)
+        used = [False] * (cols + 1)
+        while True:
+            used[col0] = True
+            row0 = match[col0]
+            delta = _INF
+            col1 = 0
+            cost_row = weights[row0 - 1]
+            for col in range(1, cols + 1):
+                if not used[col]:
+                    cur = -cost_row[col - 1] - u[row0] - v[col]
+                    if cur < minv[col]:
+                        minv[col] = cur
+                        way[col] = col0
+                    if minv[col] < delta:
+                        delta = minv[col]
+                        col1 = col
+            for col in range(cols + 1):
+                if used[col]:
+                    u[match[col]] += delta
+                    v[col] -= delta
+                else:
+                    minv[col] -= delta
+            col0 = col1
+            if match[col0] == 0:
+                break
+        while col0:
+            col1 = way[col0]
+            match[col0] = match[col1]
+            col0 = col1
+
+    assignment = [-1] * rows
+    for col in range(1, cols + 1):
+        if match[col]:
+            assignment[match[col] - 1] = col - 1
+    return assignment
+
+
+def _solve_component(v_nodes: List[int], i_nodes: List[int], edges: Dict[Tuple[int, int], int]) -> Dict[int, int]:
+    """一个连通分量内的最大权匹配，返回 {凭证位置: 发票位置}"""
+    if len(v_nodes) * len(i_nodes) > MAX_COMPONENT_CELLS:
+        # 分量过大时按边权从高到低贪心（同样与输入顺序无关）
+        result, taken = {}, set()
+        for (v, i), _ in sorted(edges.items(), key=lambda e: (-e[1], e[0])):
+            if v not in result and i not in taken:
+                result[v] = i
+                taken.add(i)
+        return result
+
+    transpose = len(v_nodes) > len(i_nodes)
+    rows, cols = (i_nodes, v_nodes) if transpose else (v_nodes, i_nodes)
+    weights = [[edges.get((c, r) if transpose else (r, c), 0) for c in cols] for r in rows]
+    result = {}
+    for row, col in enumerate(_hungarian(weights)):
+        if col >= 0 and weights[row][col] > 0:
+            v, i = (cols[col], rows[row]) if transpose else (rows[row], cols[col])
+            result[v] = i
+    return result
+
+
+def _greedy_assign(vouchers: List[DocKey], invoices: List[DocKey]) -> Dict[int, int]:
+    """按凭证顺序逐个取最优发票，返回 {凭证位置: 发票位置}"""
+    engine = PairingEngine(invoices)
+    result = {}
+    for v_pos, voucher in enumerate(vouchers):
+        pos = engine.best_match(voucher)
+        if pos is not None:
+            engine.take(pos)
+            result[v_pos] = pos
+    return result
+
+
+def _optimal_assign(vouchers: List[InvoiceInfo], invoices: List[InvoiceInfo]) -> Dict[int, int]:
+    """
+    全局最优配对，返回 {凭证位置: 发票位置}
+
+    1. 候选边：订单号相同，或商家相同且日期±1天、金额误差 5% 以内（权重为匹配分数）
+    2. 按连通分量分别求最大权匹配，分量内按内容排序，结果与文件顺序无关
+    3. 剩下的凭证和发票按内容顺序用贪心规则配对
+    """
+    v_order = sorted(range(len(vouchers)), key=lambda pos: _content_key(vouchers[pos]))
+    i_order = sorted(range(len(invoices)), key=lambda pos: _content_key(invoices[pos]))
+    v_keys = [DocKey.from_info(vouchers[pos]) for pos in v_order]
+    i_keys = [DocKey.from_info(invoices[pos]) for pos in i_order]
+
+    engine = PairingEngine(i_keys)
+    edges: Dict[Tuple[int, int], int] = {}
+    for v_pos, voucher in enumerate(v_keys):
+        for i_pos in engine.candidates(voucher):
+            edges[(v_pos, i_pos)] = match_score(voucher, i_keys[i_pos])
+
+    # 并查集求连通分量（凭证节点 v，发票节点 V+i）
+    offset = len(v_keys)
+    parent = list(range(offset + len(i_keys)))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for v_pos, i_pos in edges:
+        root_v, root_i = find(v_pos), find(offset + i_pos)
+        if root_v != root_i:
+            parent[root_v] = root_i
+
+    component_edges: Dict[int, Dict[Tuple[int, int], int]] = {}
+    for (v_pos, i_pos), weight in edges.items():
+        component_edges.setdefault(find(v_pos), {})[(v_pos, i_pos)] = weight
+
+    matched: Dict[int, int] = {}
+    for component in component_edges.values():
+        v_nodes = sorted({v for v, _ in component})
+        i_nodes = sorted({i for _, i in component})
+        matched.update(_solve_component(v_nodes, i_nodes, component))
+
+    # 剩余部分按贪心规则配对
+    taken = set(matched.values())
+    rest_v = [v for v in range(len(v_keys)) if v not in matched]
+    rest_i = [i for i in range(len(i_keys)) if i not in taken]
+    rest = _greedy_assign([v_keys[v] for v in rest_v], [i_keys[i] for i in rest_i])
+    for v_idx, i_idx in rest.items():
+        matched[rest_v[v_idx]] = rest_i[i_idx]
+
+    return {v_order[v]: i_order[i] for v, i in matched.items()}
+
+
+def pair_documents(invoice_infos: List[InvoiceInfo], mode: str = "greedy",
+                   group_multi: bool = False) -> List[List[InvoiceInfo]]:
+    """
+    配对凭证和发票
+
+    Args:
+        invoice_infos: 发票信息列表
+        mode: greedy=按凭证顺序逐个取最优发票（默认）；optimal=全局最大权匹配，与文件顺序无关
+        group_multi: 配对后再按金额之和把多张凭证归到一张发票（见 group_many_to_one）
+
+    Returns:
+        分组列表：按凭证顺序的 [凭证, 发票] 或 [凭证]，然后是未配对的发票 [发票]
+    """
+    if mode not in PAIRING_MODES:
+        raise ValueError(f"未知的配对模式: {mode}（可选 {', '.join(PAIRING_MODES)}）")
+
+    invoices = [info for info in invoice_infos if info.is_invoice]
+    vouchers = [info for info in invoice_infos if not info.is_invoice]
+
+    if mode == "optimal":
+        assignment = _optimal_assign(vouchers, invoices)
+    else:
+        assignment = _greedy_assign([DocKey.from_info(info) for info in vouchers],
+                                    [DocKey.from_info(info) for info in invoices])
+
+    paired_groups = []
+    for v_pos, voucher in enumerate(vouchers):
+        if v_pos in assignment:
+            paired_groups.append([voucher, invoices[assignment[v_pos]]])
+        else:
+            paired_groups.append([voucher])
+
+    used = set(assignment.values())
+    for pos, invoice in enumerate(invoices):
+        if pos not in used:
+            paired_groups.append([invoice])
+
+    if group_multi:
+        paired_groups = group_many_to_one(paired_groups)
+    return paired_groups
+
+
+def _subset_sum(amounts: List[int], low: int, high: int) -> Optional[List[int]]:
+    """
+    在 amounts（分）中找和落在 [low, high] 内、至少两项的子集，返回下标列表
+
+    用整数位图做动态规划：any_bits 记录用至少 1 项能凑出的和，multi_bits 记录至少 2 项能凑出的和。
+    """
+    # 取最接近区间中点（发票金额）的和；金额很小的发票区间下界为负，从 1 分算起
+    target = (low + high) // 2
+    low = max(low, 1)
+    if high < low:
+        return None
+    limit_mask = (1 << (high + 1)) - 1
+    any_bits, multi_bits = 0, 0
+    history = []
+    for amount in amounts:
+        history.append((any_bits, multi_bits))
+        multi_bits = (multi_bits | (any_bits << amount)) & limit_mask
+        any_bits = (any_bits | (1 << amount) | (any_bits << amount)) & limit_mask
+
+    window = multi_bits >> low
+    if not window:
+        return None
+    total = min((low + bit for bit in range(high - low + 1) if window >> bit & 1),
+                key=lambda value: (abs(value - target), value))
+
+    chosen = []
+    need_multi = True
+    for idx in range(len(amounts) - 1, -1, -1):
+        prev_any, prev_multi = history[idx]
+        amount = amounts[idx]
+        if need_multi:
+            if prev_multi >> total & 1:
+                continue
+            chosen.append(idx)
+            total -= amount
+            need_multi = False
+        else:
+            if prev_any >> total & 1:
+                continue
+            chosen.append(idx)
+            total -= amount
+            if total == 0:
+                break
+    chosen.reverse()
+    return chosen
+
+
+def _is_firm_pair(voucher: DocKey, invoice: DocKey) -> bool:
+    """金额误差 1% 以内，且订单号相同或日期相差不超过 1 天的配对不再拆开"""
+    if _amount_points(voucher.amount, invoice.amount) < 3:
+        return False
+    if voucher.order and voucher.order == invoice.order:
+        return True
+    return voucher.day is not None and invoice.day is not None and abs(voucher.day - invoice.day) <= 1
+
+
+def group_many_to_one(groups: List[List[InvoiceInfo]], window_days: int = GROUP_WINDOW_DAYS) -> List[List[InvoiceInfo]]:
+    """
+    多对一分组：一张发票对应多张凭证（如按晚出具的酒店水单、多张打车行程单）
+
+    在配对结果中，未配对的发票以及不可靠的配对（订单号不同，且金额或日期对不上）会被重新考虑：
+    在同一商家、日期相差不超过 window_days 天的未配对凭证中，找金额之和等于发票金额的至少两张凭证。
+    发票按金额从大到小处理。
+
+    Returns:
+        新的分组列表，多对一分组为 [凭证..., 发票]，放在其成员原来最靠前的位置
+    """
+    # 可重新分组的发票及其当前配对凭证；可用的凭证
+    open_invoices = []
+    free_vouchers = []
+    for group_idx, group in enumerate(groups):
+        invoices = [info for info in group if info.is_invoice]
+        vouchers = [info for info in group if not info.is_invoice]
+        if len(group) == 1:
+            (open_invoices if invoices else free_vouchers).append((group_idx, group[0], None))
+        elif len(invoices) == 1 and len(vouchers) == 1:
+            invoice, voucher = invoices[0], vouchers[0]
+            if not _is_firm_pair(DocKey.from_info(voucher), DocKey.from_info(invoice)):
+                open_invoices.append((group_idx, invoice, voucher))
+                free_vouchers.append((group_idx, voucher, invoice))
+    if not open_invoices or len(free_vouchers) < 2:
+        return groups
+
+    by_merchant_day: Dict[Tuple[str, int], List[Tuple[int, InvoiceInfo, DocKey]]] = {}
+    for group_idx, voucher, _ in free_vouchers:
+        key = DocKey.from_info(voucher)
+        if key.day is None or key.amount <= 0:
+            continue
+        for merchant in {key.subtype_key, key.merchant_key} - {""}:
+            by_merchant_day.setdefault((merchant, key.day), []).append((group_idx, voucher, key))
+
+    taken = set()  # 已进入多对一分组的凭证 id
+    new_groups: Dict[int, List[List[InvoiceInfo]]] = {}  # 放置位置 → 分组
+    consumed = set()  # 被拆散的原分组位置
+
+    open_invoices.sort(key=lambda item: (-item[1].amount, _content_key(item[1])))
+    for group_idx, invoice, current_voucher in open_invoices:
+        inv_key = DocKey.from_info(invoice)
+        if inv_key.day is None or inv_key.amount <= 0:
+            continue
+        target = round(inv_key.amount * 100)
+        low, high = target - GROUP_TOLERANCE_CENTS, target + GROUP_TOLERANCE_CENTS
+        if high > GROUP_MAX_CENTS:
+            continue
+
+        seen = set()
+        candidates = []
+        # 凭证日期不早于发票消费日期前一天（水单、行程单在入住/乘车之后）
+        window = [(merchant, inv_key.day + offset)
+                  for merchant in {inv_key.subtype_key, inv_key.merchant_key} - {""}
+                  for offset in range(-1, window_days + 1)]
+        for bucket_key in window:
+            for v_group_idx, voucher, key in by_merchant_day.get(bucket_key, ()):
+                if id(voucher) in taken or id(voucher) in seen:
+                    continue
+                # 订单号都有但不同，说明不是同一笔消费
+                if key.order and inv_key.order and key.order != inv_key.order:
+                    continue
+                cents = round(key.amount * 100)
+                if cents > high:
+                    continue
+                seen.add(id(voucher))
+                candidates.append((key.order != inv_key.order, abs(key.day - inv_key.day),
+                                   _content_key(voucher), cents, v_group_idx, voucher))
+        if len(candidates) < 2:
+            continue
+        # 订单号相同的优先，其次日期最接近的
+        candidates.sort(key=lambda item: item[:3])
+        same_order = [item for item in candidates if not item[0]] if inv_key.order else []
+        chosen = None
+        for pool in (same_order, candidates[:GROUP_MAX_CANDIDATES]):
+            if len(pool) < 2 or sum(item[3] for item in pool) < low:
+                continue
+            picked = _subset_sum([item[3] for item in pool], low, high)
+            if picked:
+                chosen = [pool[idx] for idx in picked]
+                break
+        if not chosen:
+            continue
+
+        members = sorted(chosen, key=lambda item: item[2])
+        vouchers = [item[5] for item in members]
+        taken.update(id(voucher) for voucher in vouchers)
+        positions = [group_idx] + [item[4] for item in members]
+        consumed.update(positions)
+        new_groups.setdefault(min(positions), []).append(vouchers + [invoice])
+
+    if not new_groups:
+        return groups
+
+    grouped = taken | {id(group[-1]) for placed in new_groups.values() for group in placed}
+    result = []
+    for group_idx, group in enumerate(groups):
+        result.extend(new_groups.get(group_idx, ()))
+        if group_idx in consumed:
+            # 原分组中没有进入多对一分组的成员单独成组
+            for info in group:
+                if id(info) not in grouped:
+                    result.append([info])
+            continue
+        result.append(group)
+    return result
@@ -0,0 +1,253 @@
+"""文件放置模块 - 并行复制/移动文件到整理目录
+
+复制时按以下顺序选择最快的方式（同一文件系统优先共享数据块）:
+    reflink         写时复制克隆（Linux FICLONE，btrfs/xfs 等支持），几乎不占时间和空间
+    hardlink        硬链接（需显式开启：两个路径指向同一文件，修改一处另一处也会变）
+    copy_file_range 内核态复制（Linux），不经过用户态缓冲区，网络文件系统可在服务端完成
+    sendfile        内核态复制（copy_file_range 不可用时）
+    copyfile        普通读写复制
+移动时同一文件系统直接 link+unlink（目标已存在时不会覆盖），跨文件系统复制后删除源文件。
+
+目标文件一律以独占方式创建，已存在时自动加序号（_1, _2...），不会覆盖已有文件。
+"""
+import errno
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from . import metrics
+
+# Linux ioctl: FICLONE = _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# 每次 copy_file_range/sendfile 复制的最大字节数
+COPY_CHUNK = 64 * 1024 * 1024
+# 默认并发数（文件放置以 I/O 为主，网络共享目录上并发收益明显）
+DEFAULT_WORKERS = 8
+
+# 出现这些错误说明该方式不可用（文件系统或平台不支持），换下一种方式
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EPERM, errno.EBADF,
+    getattr(errno, "ENOTSUP", errno.EINVAL), getattr(errno, "EOPNOTSUPP", errno.EINVAL),
+    getattr(errno, "ETXTBSY", errno.EINVAL), errno.EMLINK,
+}
+
+
+@dataclass
+class PlacementResult:
+    """单个文件的放置结果"""
+    src: str
+    dst: Path  # 实际写入的路径（可能加了序号）
+    method: str  # reflink / hardlink / copy_file_range / sendfile / copyfile / rename / move
+    bytes: int = 0
+
+
+ProgressCallback = Callable[[int, int, PlacementResult], None]
+
+
+def _next_candidate(dst: Path, counter: int) -> Path:
+    return dst.parent / f"{dst.stem}_{counter}{dst.suffix}"
+
+
+class PlacementEngine:
+    """并行放置文件（线程安全）"""
+
+    def __init__(self, copy_mode: bool = True, workers: int = DEFAULT_WORKERS, hardlink: bool = False):
+        self.copy_mode = copy_mode
+        self.workers = max(1, workers)
+        self.hardlink = hardlink
+        # 记录不支持的方式，避免每个文件都重试一次失败的系统调用
+        self._disabled = set()
+        self._disabled_lock = threading.Lock()
+
+    def place_all(self, jobs: List[Tuple[str, Path]],
+                  progress: Optional[ProgressCallback] = None) -> List[PlacementResult]:
+        """
+        放置一批文件
+
+        Args:
+            jobs: [(源文件, 目标路径)]
+            progress: 每完成一个文件调用 progress(已完成数, 总数, 结果)（在调用线程中执行）
+
+        Returns:
+            与 jobs 顺序一致的结果列表
+        """
+        results: List[Optional[PlacementResult]] = [None] * len(jobs)
+        if self.workers == 1 or len(jobs) <= 1:
+            for idx, (src, dst) in enumerate(jobs):
+                results[idx] = self.place(src, dst)
+                if progress:
+                    progress(idx + 1, len(jobs), results[idx])
+            return results
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="placement") as pool:
+            futures = {pool.submit(self.place, src, dst): idx for idx, (src, dst) in enumerate(jobs)}
+            error = None
+            done = 0
+            try:
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # 取消未开始的任务，已开始的仍然报告进度，调用方据此记录哪些文件已放置
+                        if error is None:
+                            error = e
+                            for pending in futures:
+                                pending.cancel()
+                        continue
+                    done += 1
+                    results[futures[future]] = result
+                    if progress:
+                        progress(done, len(jobs), result)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            if error is not None:
+                raise error
+        return results
+
+    def place(self, src: str, dst: Path) -> PlacementResult:
+        """复制或移动一个文件，目标已存在时加序号"""
+        dst = Path(dst)
+        candidate = dst
+        counter = 1
+        with metrics.timer("organizer.file_io"):
+            while True:
+                try:
+                    result = self._copy(src, candidate) if self.copy_mode else self._move(src, candidate)
+                    break
+                except FileExistsError:
+                    candidate = _next_candidate(dst, counter)
+                    counter += 1
+        metrics.inc("files_placed", mode="copy" if self.copy_mode else "move", method=result.method)
+        return result
+
+    # ---------- 复制 ----------
+
+    def _enabled(self, method: str) -> bool:
+        return method not in self._disabled
+
+    def _disable(self, method: str):
+        with self._disabled_lock:
+            self._disabled.add(method)
+
+    def _copy(self, src: str, dst: Path) -> PlacementResult:
+        src_stat = os.stat(src)
+        same_fs = self._same_filesystem(src_stat, dst)
+
+        if same_fs and self.hardlink and self._enabled("hardlink"):
+            try:
+                os.link(src, dst)
+                return PlacementResult(src, dst, "hardlink", 0)
+            except FileExistsError:
+                raise
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                self._disable("hardlink")
+
+        with open(src, "rb") as fsrc:
+            fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0),
+                         src_stat.st_mode & 0o777)
+            try:
+                with os.fdopen(fd, "wb") as fdst:
+                    method = self._copy_data(fsrc, fdst, src_stat.st_size, same_fs)
+            except BaseException:
+                try:
+                    os.unlink(dst)
+                except OSError:
+                    pass
+                raise
+        shutil.copystat(src, dst)
+        return PlacementResult(src, dst, method, src_stat.st_size)
+
+    def _copy_data(self, fsrc, fdst, size: int, same_fs: bool) -> str:
+        """复制文件内容，返回使用的方式"""
+        if same_fs and sys.platform.startswith("linux") and self._enabled("reflink"):
+            try:
+                import fcntl
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return "reflink"
+            except (ImportError, OSError) as e:
+                if isinstance(e, OSError) and e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                self._disable("reflink")
+
+        if size and hasattr(os, "copy_file_range") and self._enabled("copy_file_range"):
+            try:
+                self._kernel_copy(os.copy_file_range, fsrc, fdst, size)
+                return "copy_file_range"
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                if e.errno != errno.EXDEV:  # 跨文件系统不支持不代表同一文件系统也不支持
+                    self._disable("copy_file_range")
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+
+        if size and hasattr(os, "sendfile") and sys.platform.startswith("linux") and self._enabled("sendfile"):
+            try:
+                self._kernel_copy(lambda src, dst, count: os.sendfile(dst, src, None, count), fsrc, fdst, size)
+                return "sendfile"
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                self._disable("sendfile")
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+        return "copyfile"
+
+    @staticmethod
+    def _kernel_copy(copy_fn, fsrc, fdst, size: int):
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        remaining = size
+        while remaining > 0:
+            sent = copy_fn(src_fd, dst_fd, min(remaining, COPY_CHUNK))
+            if sent == 0:
+                break
+            remaining -= sent
+
+    @staticmethod
+    def _same_filesystem(src_stat: os.stat_result, dst: Path) -> bool:
+        try:
+            return os.stat(dst.parent).st_dev == src_stat.st_dev
+        except OSError:
+            return False
+
+    # ---------- 移动 ----------
+
+    def _move(self, src: str, dst: Path) -> PlacementResult:
+        src_stat = os.stat(src)
+        if self._same_filesystem(src_stat, dst):
+            if self._enabled("hardlink_move"):
+                try:
+                    # link 在目标已存在时失败，不会像 rename 那样覆盖
+                    os.link(src, dst)
+                    os.unlink(src)
+                    return PlacementResult(src, dst, "rename", 0)
+                except FileExistsError:
+                    raise
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS:
+                        raise
+                    self._disable("hardlink_move")
+            if dst.exists():
+                raise FileExistsError(errno.EEXIST, "目标已存在", str(dst))
+            os.rename(src, dst)
+            return PlacementResult(src, dst, "rename", 0)
+
+        # 跨文件系统：复制后删除源文件
+        result = self._copy(src, dst)
+        os.unlink(src)
+        return PlacementResult(src, dst, "move", result.bytes)
@@ -0,0 +1,232 @@
+"""性能剖析模块 - 为命令行的每个处理阶段生成可离线分析的剖析文件
+
+开启 --profile 后，每个阶段结束时在剖析目录写出:
+    NN_<阶段>.prof             cProfile 数据（pstats / snakeviz 打开）
+    NN_<阶段>.folded           采样线程收集的折叠栈（flamegraph.pl / speedscope 打开）
+    NN_<阶段>.tracemalloc.txt  该阶段新增内存最多的代码行
+运行结束时再写出 all.folded（所有阶段合并）和 summary.txt（各阶段耗时和热点函数）。
+
+cProfile 只覆盖调用阶段的线程，其他线程的耗时由采样栈体现。
+
+用法:
+    from app import profiling
+
+    profiling.start(profiling.profile_dir_for(output_dir))
+    with profiling.stage("analyze"):
+        infos = process_files(files)
+    print(profiling.stop())
+"""
+import atexit
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional
+
+# 采样间隔（秒）
+DEFAULT_INTERVAL = 0.005
+# tracemalloc 记录的调用栈深度
+TRACEMALLOC_FRAMES = 5
+# 文本报告中列出的条目数
+TOP_N = 25
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def profile_dir_for(output_dir: str) -> str:
+    """剖析文件目录：输出目录旁边的 <输出目录>_profile/"""
+    return os.path.abspath(output_dir).rstrip(os.sep) + "_profile"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _collapse(frame) -> List[str]:
+    """把调用栈转换成从最外层到最内层的函数列表"""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class _StageRecord:
+    """单个阶段的剖析结果"""
+
+    def __init__(self, index: int, name: str):
+        self.index = index
+        self.name = name
+        self.prefix = f"{index:02d}_{name}"
+        self.seconds = 0.0
+        self.samples = Counter()
+        self.peak_bytes = 0
+        self.stats_text = ""
+
+
+class ProfileSession:
+    """一次运行的剖析会话"""
+
+    def __init__(self, output_dir: str, interval: float = DEFAULT_INTERVAL,
+                 trace_memory: bool = True):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.stages: List[_StageRecord] = []
+        self._current: Optional[_StageRecord] = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._started_tracemalloc = False
+        self._closed = False
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiling-sampler", daemon=True)
+        self._sampler.start()
+
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            record = self._current
+            if record is None:
+                continue
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                thread_name = names.get(ident, str(ident)).replace(";", ",")
+                stacks.append(";".join([thread_name] + _collapse(frame)))
+            with self._lock:
+                record.samples.update(stacks)
+
+    @contextmanager
+    def stage(self, name: str):
+        """剖析一个阶段；嵌套的阶段归入外层阶段"""
+        if self._current is not None or self._closed:
+            yield
+            return
+
+        record = _StageRecord(len(self.stages) + 1, name)
+        self.stages.append(record)
+        before = None
+        if tracemalloc.is_tracing():
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+
+        profiler = cProfile.Profile()
+        self._current = record
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            record.seconds = time.perf_counter() - start
+            self._current = None
+            self._write_stage(record, profiler, before)
+
+    def _write_stage(self, record: _StageRecord, profiler: cProfile.Profile, before):
+        base = os.path.join(self.output_dir, record.prefix)
+        profiler.dump_stats(base + ".prof")
+
+        buffer = io.StringIO()
+        pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(TOP_N)
+        record.stats_text = buffer.getvalue()
+
+        with self._lock:
+            samples = dict(record.samples)
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, count in sorted(samples.items()):
+                f.write(f"{stack} {count}\n")
+
+        if before is not None:
+            record.peak_bytes = tracemalloc.get_traced_memory()[1]
+            after = tracemalloc.take_snapshot()
+            filters = (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            )
+            diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+            with open(base + ".tracemalloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"阶段: {record.name}\n")
+                f.write(f"峰值内存: {record.peak_bytes / 1024 / 1024:.1f} MB\n")
+                f.write(f"新增内存最多的 {TOP_N} 行:\n\n")
+                for stat in diff[:TOP_N]:
+                    f.write(f"{stat}\n")
+
+    def close(self) -> str:
+        """停止采样并写出汇总文件，返回剖析目录"""
+        if self._closed:
+            return self.output_dir
+        self._closed = True
+        self._stop_event.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        with open(os.path.join(self.output_dir, "all.folded"), "w", encoding="utf-8") as f:
+            for record in self.stages:
+                for stack, count in sorted(record.samples.items()):
+                    f.write(f"{record.name};{stack} {count}\n")
+
+        with open(os.path.join(self.output_dir, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(f"{'阶段':<16}{'耗时(秒)':>12}{'采样数':>10}{'峰值内存(MB)':>16}\n")
+            for record in self.stages:
+                f.write(f"{record.name:<16}{record.seconds:>12.3f}{sum(record.samples.values()):>10}"
+                        f"{record.peak_bytes / 1024 / 1024:>16.1f}\n")
+            for record in self.stages:
+                f.write(f"\n{'=' * 20} {record.prefix} {'=' * 20}\n")
+                f.write(record.stats_text)
+        return self.output_dir
+
+
+def start(output_dir: str, interval: float = DEFAULT_INTERVAL, trace_memory: bool = True) -> ProfileSession:
+    """开启剖析会话（进程退出时自动写出汇总）"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = ProfileSession(output_dir, interval=interval, trace_memory=trace_memory)
+        _session.start()
+        atexit.register(_session.close)
+        return _session
+
+
+def stop() -> Optional[str]:
+    """结束剖析会话，返回剖析目录（未开启时返回 None）"""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is None:
+        return None
+    return session.close()
+
+
+def is_active() -> bool:
+    return _session is not None
+
+
+@contextmanager
+def stage(name: str):
+    """剖析一个处理阶段；未开启剖析时什么也不做"""
+    session = _session
+    if session is None:
+        yield
+        return
+    with session.stage(name):
+        yield
@@ -1,12 +1,21 @@
-"""报表生成模块 - 生成 Excel 统计报表"""
+"""报表生成模块 - 生成 Excel 统计报表，以及供 BI 使用的 CSV / Parquet 明细"""
+import csv
+import importlib.util
+import os
+from collections import defaultdict
+from copy import copy
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
 from datetime import datetime
 
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
 
+from . import metrics
 from .analyzer import InvoiceInfo
 from .config import INVOICE_CATEGORIES
 
@@ -48,15 +57,18 @@ class ReportGenerator:
                 # 只统计发票数量
                 invoice_count = len([i for i in infos if i.is_invoice])
                 if invoice_count > 0:
-                    sheet_name = self._create_detail_sheet(wb, category_name, infos)
+                    with metrics.timer("report.sheet_build"):
+                        sheet_name = self._create_detail_sheet(wb, category_name, infos)
                     sheet_info[category_name] = (sheet_name, invoice_count)
 
         # 2. 创建汇总表（使用公式引用明细表）
-        self._create_summary_sheet_with_formulas(wb, sheet_info)
+        with metrics.timer("report.sheet_build"):
+            self._create_summary_sheet_with_formulas(wb, sheet_info)
 
         # 保存文件（固定文件名，每次覆盖）
         report_path = self.output_dir / "报销统计.xlsx"
-        wb.save(str(report_path))
+        with metrics.timer("report.save"):
+            wb.save(str(report_path))
 
         return str(report_path)
 
@@ -255,7 +267,266 @@ class ReportGenerator:
         ws.column_dimensions['D'].width = 20
 
 
+# 流式报表使用的命名样式（整个工作簿共享，每个单元格只引用样式名）
+_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'),
+                 top=Side(style='thin'), bottom=Side(style='thin'))
+_HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+_CENTER = Alignment(horizontal='center', vertical='center')
+_RIGHT = Alignment(horizontal='right', vertical='center')
+_AMOUNT_FORMAT = '#,##0.00'
+_NAMED_STYLES = [
+    NamedStyle("报表表头", font=Font(bold=True, size=11, color="FFFFFF"), fill=_HEADER_FILL,
+               border=_BORDER, alignment=_CENTER),
+    NamedStyle("报表居中", font=DEFAULT_FONT, border=_BORDER, alignment=_CENTER),
+    NamedStyle("报表文本", font=DEFAULT_FONT, border=_BORDER),
+    NamedStyle("报表换行", font=DEFAULT_FONT, border=_BORDER,
+               alignment=Alignment(horizontal='left', vertical='center', wrap_text=True)),
+    NamedStyle("报表金额", font=DEFAULT_FONT, border=_BORDER, alignment=_RIGHT, number_format=_AMOUNT_FORMAT),
+    NamedStyle("报表合计", font=Font(bold=True, size=11), border=_BORDER),
+    NamedStyle("报表合计金额", font=Font(bold=True, size=11), border=_BORDER, alignment=_RIGHT,
+               number_format=_AMOUNT_FORMAT),
+    NamedStyle("汇总标题", font=Font(bold=True, size=16), alignment=_CENTER),
+    NamedStyle("汇总表头", font=Font(bold=True, size=12, color="FFFFFF"), fill=_HEADER_FILL,
+               border=_BORDER, alignment=_CENTER),
+    NamedStyle("汇总合计", font=Font(bold=True, size=12), border=_BORDER),
+    NamedStyle("汇总合计数量", font=Font(bold=True, size=12), border=_BORDER, alignment=_CENTER),
+    NamedStyle("汇总合计金额", font=Font(bold=True, size=12), border=_BORDER, alignment=_RIGHT,
+               number_format=_AMOUNT_FORMAT),
+]
+
+_AMOUNT_STYLES = {"报表金额", "报表合计金额", "汇总合计金额"}
+
+
+class ReportRow(NamedTuple):
+    """明细中的一行（也是 CSV / Parquet 导出的列，顺序固定）"""
+    category: str
+    type: str
+    subtype: str
+    amount: float
+    date: str
+    service_date: str
+    merchant: str
+    invoice_number: str
+    order_number: str
+    is_invoice: bool
+    description: str
+    file_path: str  # 相对输出目录
+
+
+def iter_report_rows(output_dir: str, categorized: Dict[str, List[InvoiceInfo]]) -> Iterator[ReportRow]:
+    """按分类逐行产出明细（每个分类内按日期排序），Excel 明细表和导出文件都由它生成"""
+    output_dir = Path(output_dir)
+    for category_name, infos in categorized.items():
+        for info in sorted(infos, key=lambda x: x.date or ""):
+            try:
+                rel_path = Path(info.file_path).relative_to(output_dir)
+            except ValueError:
+                rel_path = info.file_path
+            yield ReportRow(category_name, info.type, info.subtype, info.amount, info.date, info.service_date,
+                            info.merchant, info.invoice_number, info.order_number, info.is_invoice,
+                            info.description, str(rel_path))
+
+
+DETAIL_HEADERS = ['序号', '日期', '商家/平台', '金额（元）', '发票号码', '描述', '文件路径']
+DETAIL_WIDTHS = [6, 12, 20, 12, 20, 25, 40]
+SUMMARY_ORDER = ['打车票', '火车飞机票', '住宿费', '餐费', '其他']
+
+
+class StreamingReportGenerator(ReportGenerator):
+    """
+    流式报表生成器 - 版式和公式与 ReportGenerator 相同
+
+    使用 openpyxl 的 write-only 模式逐行写出（写出的行不再留在内存中），
+    所有单元格共享命名样式而不是各自创建样式对象，几万行的年度报表也只占很少内存。
+    write-only 模式只能按顺序写，所以先根据各分类的发票数量写汇总表，再写明细表。
+    """
+
+    def generate(self, categorized: Dict[str, List[InvoiceInfo]]) -> str:
+        wb = Workbook(write_only=True)
+        for style in _NAMED_STYLES:
+            wb.add_named_style(copy(style))
+
+        # 各分类的发票（按日期排序）
+        details = defaultdict(list)  # {分类名: [发票行]}
+        for row in iter_report_rows(self.output_dir, categorized):
+            if row.is_invoice:
+                details[row.category].append(row)
+        sheet_info = {category_name: (self._sanitize_sheet_name(category_name), len(rows))
+                      for category_name, rows in details.items()}
+
+        with metrics.timer("report.sheet_build"):
+            self._write_summary_sheet(wb, sheet_info)
+        for category_name, rows in details.items():
+            with metrics.timer("report.sheet_build"):
+                self._write_detail_sheet(wb, sheet_info[category_name][0], rows)
+
+        report_path = self.output_dir / "报销统计.xlsx"
+        with metrics.timer("report.save"):
+            wb.save(str(report_path))
+        return str(report_path)
+
+    @staticmethod
+    def _cell(ws, value, style: str = None) -> WriteOnlyCell:
+        cell = WriteOnlyCell(ws, value=value)
+        if style:
+            cell.style = style
+            if style in _AMOUNT_STYLES:
+                # 命名样式中的自定义数字格式不一定生效，显式设置
+                cell.number_format = _AMOUNT_FORMAT
+        return cell
+
+    def _write_detail_sheet(self, wb: Workbook, sheet_name: str, invoices: List[ReportRow]):
+        ws = wb.create_sheet(sheet_name)
+        for col, width in enumerate(DETAIL_WIDTHS, 1):
+            ws.column_dimensions[get_column_letter(col)].width = width
+        # 隐藏文件路径列（第7列）
+        ws.column_dimensions['G'].hidden = True
+
+        c = self._cell
+        ws.append([c(ws, header, "报表表头") for header in DETAIL_HEADERS])
+        for idx, info in enumerate(invoices, 1):
+            ws.append([
+                c(ws, idx, "报表居中"),
+                c(ws, info.date, "报表居中"),
+                c(ws, info.subtype or info.merchant, "报表文本"),
+                c(ws, info.amount, "报表金额"),
+                c(ws, info.invoice_number, "报表文本"),
+                c(ws, info.description, "报表换行"),
+                c(ws, info.file_path, "报表文本"),
+            ])
+
+        last_data_row = len(invoices) + 1
+        ws.append([c(ws, "", "报表文本"), c(ws, "", "报表文本"), c(ws, "合计", "报表合计"),
+                   c(ws, f'=SUM(D2:D{last_data_row})', "报表合计金额")]
+                  + [c(ws, "", "报表文本") for _ in range(5, 8)])
+
+    def _write_summary_sheet(self, wb: Workbook, sheet_info: Dict[str, tuple]):
+        ws = wb.create_sheet("汇总")
+        for col, width in zip("ABCD", [15, 12, 15, 20]):
+            ws.column_dimensions[col].width = width
+
+        c = self._cell
+        ws.merged_cells.add("A1:D1")
+        ws.append([c(ws, f"报销汇总表 - {datetime.now().strftime('%Y-%m-%d')}", "汇总标题")])
+        ws.append([])
+        ws.append([c(ws, header, "汇总表头") for header in ['类别', '发票数量', '金额（元）', '备注']])
+
+        row = 4
+        count_cells, amount_cells = [], []
+        for category_name in SUMMARY_ORDER:
+            if category_name not in sheet_info:
+                continue
+            sheet_name, data_rows = sheet_info[category_name]
+            last_data_row = data_rows + 1
+            ws.append([
+                c(ws, category_name, "报表文本"),
+                c(ws, f"=COUNTA('{sheet_name}'!A2:A{last_data_row})", "报表居中"),
+                c(ws, f"='{sheet_name}'!D{last_data_row + 1}", "报表金额"),
+                c(ws, "", "报表文本"),
+            ])
+            count_cells.append(f"B{row}")
+            amount_cells.append(f"C{row}")
+            row += 1
+
+        ws.append([
+            c(ws, "合计", "汇总合计"),
+            c(ws, f"=SUM({','.join(count_cells)})" if count_cells else 0, "汇总合计数量"),
+            c(ws, f"=SUM({','.join(amount_cells)})" if amount_cells else 0, "汇总合计金额"),
+            c(ws, "", "报表文本"),
+        ])
+
+
+EXPORT_NAME = "报销明细"
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_BATCH_ROWS = 10000
+
+
+def _export_csv(rows: Iterator[ReportRow], path: Path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(ReportRow._fields)
+        writer.writerows(rows)
+
+
+def _append_csv(rows: Iterator[ReportRow], path: Path):
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def _export_parquet(rows: Iterator[ReportRow], path: Path, existing: Optional[Path] = None):
+    """existing 为已有的导出文件时先写入它的内容（Parquet 不能原地追加）"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"amount": pa.float64(), "is_invoice": pa.bool_()}
+    schema = pa.schema([(name, types.get(name, pa.string())) for name in ReportRow._fields])
+    with pq.ParquetWriter(str(path), schema) as writer:
+        if existing is not None:
+            writer.write_table(pq.read_table(str(existing)).cast(schema))
+        while True:
+            batch = list(islice(rows, EXPORT_BATCH_ROWS))
+            if not batch:
+                break
+            writer.write_table(pa.Table.from_pylist([row._asdict() for row in batch], schema=schema))
+
+
+_EXPORTERS = {"csv": _export_csv, "parquet": _export_parquet}
+
+
+def _can_export(fmt: str) -> bool:
+    if fmt == "parquet":
+        return importlib.util.find_spec("pyarrow") is not None
+    return True
+
+
+def export_report(output_dir: str, categorized: Dict[str, List[InvoiceInfo]],
+                  formats: Sequence[str] = EXPORT_FORMATS) -> Dict[str, str]:
+    """
+    导出全部明细（含凭证，is_invoice 区分）为 报销明细.csv / 报销明细.parquet
+
+    Parquet 需要安装 pyarrow，没有安装时跳过。
+
+    Returns:
+        {格式: 文件路径}
+    """
+    exported = {}
+    for fmt in formats:
+        if not _can_export(fmt):
+            continue
+        path = Path(output_dir) / f"{EXPORT_NAME}.{fmt}"
+        tmp = path.with_name(path.name + ".tmp")
+        with metrics.timer("report.export"):
+            _EXPORTERS[fmt](iter_report_rows(output_dir, categorized), tmp)
+        os.replace(tmp, path)
+        exported[fmt] = str(path)
+    return exported
+
+
+def append_export(output_dir: str, added: Dict[str, List[InvoiceInfo]],
+                  formats: Sequence[str] = EXPORT_FORMATS) -> Optional[Dict[str, str]]:
+    """
+    把新文件的明细追加到已有的导出文件（增量整理用），不重新生成已有的行
+
+    CSV 直接追加到末尾；Parquet 不能原地追加，复制已有的表再写入新行。
+    有导出文件不存在时返回 None，由调用方用 export_report() 导出全部明细。
+    """
+    paths = {fmt: Path(output_dir) / f"{EXPORT_NAME}.{fmt}" for fmt in formats if _can_export(fmt)}
+    if not all(path.exists() for path in paths.values()):
+        return None
+    for fmt, path in paths.items():
+        with metrics.timer("report.export"):
+            if fmt == "csv":
+                _append_csv(iter_report_rows(output_dir, added), path)
+            else:
+                tmp = path.with_name(path.name + ".tmp")
+                _export_parquet(iter_report_rows(output_dir, added), tmp, existing=path)
+                os.replace(tmp, path)
+    return {fmt: str(path) for fmt, path in paths.items()}
+
+
 def generate_report(output_dir: str, categorized: Dict[str, List[InvoiceInfo]]) -> str:
-    """便捷函数：生成报表"""
-    generator = ReportGenerator(output_dir)
-    return generator.generate(categorized)
+    """便捷函数：生成报表（流式写出），同时导出 CSV / Parquet 明细"""
+    generator = StreamingReportGenerator(output_dir)
+    report_path = generator.generate(categorized)
+    export_report(output_dir, categorized)
+    return report_path
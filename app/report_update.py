@@ -0,0 +1,203 @@
+"""报表增量更新 - 把新发票追加到已有的 报销统计.xlsx，不重新生成整个报表
+
+直接修改 xlsx（zip）中的工作表 XML:
+    有新发票的明细表: 按日期插入新行，重排序号，合计行的 SUM 范围随之调整
+    汇总表: 只改对应分类的 COUNTA / 合计单元格引用
+    其他文件（没有新发票的明细表、样式等）原样复制，逐字节不变
+只支持 StreamingReportGenerator 生成的报表（单元格为内联字符串）。需要新建分类工作表、
+报表不存在或格式无法识别时返回 None，由调用方重新生成完整报表。
+"""
+import os
+import posixpath
+import re
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape, unescape
+
+from . import metrics
+from .analyzer import InvoiceInfo
+from .report import ReportGenerator
+
+REPORT_NAME = "报销统计.xlsx"
+
+_ROW_RE = re.compile(r'<row r="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.S)
+_CELL_REF_RE = re.compile(r'(<c r=")([A-Z]+)\d+(")')
+_CELL_STYLE_RE = re.compile(r'<c r="([A-Z]+)\d+"(?: s="(\d+)")?')
+_DATE_RE = re.compile(r'<c r="B\d+"[^>]*?(?:/>|><is><t[^>]*>(.*?)</t></is></c>)', re.S)
+
+
+class ReportFormatError(Exception):
+    """报表不是可以增量更新的格式"""
+
+
+def _text_cell(ref: str, style: str, value) -> str:
+    text = "" if value is None else str(value)
+    if not text:
+        return f'<c r="{ref}" s="{style}" t="inlineStr" />'
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+
+
+def _number_cell(ref: str, style: str, value) -> str:
+    return f'<c r="{ref}" s="{style}" t="n"><v>{value}</v></c>'
+
+
+class ReportUpdater:
+    """已有报表的增量更新器"""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / REPORT_NAME
+        self._names = ReportGenerator(output_dir)
+
+    def append(self, added: Dict[str, List[InvoiceInfo]]) -> Optional[str]:
+        """追加新发票，返回报表路径；无法增量更新时返回 None"""
+        added = {category: sorted((i for i in infos if i.is_invoice), key=lambda x: x.date or "")
+                 for category, infos in added.items()}
+        added = {category: invoices for category, invoices in added.items() if invoices}
+        if not self.path.exists():
+            return None
+        if not added:
+            return str(self.path)
+
+        try:
+            with zipfile.ZipFile(self.path) as zin:
+                sheets = self._sheet_parts(zin)
+                summary_part = sheets.get("汇总")
+                if summary_part is None:
+                    raise ReportFormatError("没有汇总表")
+
+                changed = {}  # {part: 新 XML}
+                summary = zin.read(summary_part).decode("utf-8")
+                for category, invoices in added.items():
+                    sheet_name = self._names._sanitize_sheet_name(category)
+                    part = sheets.get(sheet_name)
+                    if part is None:
+                        raise ReportFormatError(f"没有工作表: {sheet_name}")
+                    with metrics.timer("report.sheet_build"):
+                        xml, data_rows = self._merge_rows(zin.read(part).decode("utf-8"), invoices)
+                    changed[part] = xml
+                    summary = self._update_summary(summary, sheet_name, data_rows)
+                changed[summary_part] = summary
+
+                with metrics.timer("report.save"):
+                    self._rewrite(zin, changed)
+        except (ReportFormatError, KeyError, zipfile.BadZipFile):
+            return None
+        return str(self.path)
+
+    @staticmethod
+    def _sheet_parts(zin: zipfile.ZipFile) -> Dict[str, str]:
+        """{工作表名: zip 中的 XML 路径}"""
+        workbook = zin.read("xl/workbook.xml").decode("utf-8")
+        rels = zin.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+        targets = {}
+        for rel in re.findall(r"<Relationship [^>]*>", rels):
+            rel_id = re.search(r'Id="([^"]+)"', rel).group(1)
+            target = re.search(r'Target="([^"]+)"', rel).group(1)
+            targets[rel_id] = target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+        parts = {}
+        for sheet in re.findall(r"<sheet [^>]*>", workbook):
+            name = unescape(re.search(r'name="([^"]*)"', sheet).group(1), {"&quot;": '"'})
+            rel_id = re.search(r'r:id="([^"]+)"', sheet).group(1)
+            parts[name] = targets[rel_id]
+        return parts
+
+    def _merge_rows(self, xml: str, invoices: List[InvoiceInfo]):
+        """把新发票按日期插入明细表，返回 (新 XML, 数据行数)"""
+        start, end = xml.find("<sheetData>"), xml.find("</sheetData>")
+        if start < 0 or end < 0 or ' t="s"' in xml:
+            raise ReportFormatError("无法识别的明细表")
+        rows = [m.group(0) for m in _ROW_RE.finditer(xml, start, end)]
+        if len(rows) < 3:
+            raise ReportFormatError("明细表行数不对")
+        header, existing, total = rows[0], rows[1:-1], rows[-1]
+
+        # 新行沿用已有数据行的样式
+        styles = {col: style for col, style in _CELL_STYLE_RE.findall(existing[0])}
+        total_styles = {col: style for col, style in _CELL_STYLE_RE.findall(total)}
+        if set(styles) != set("ABCDEFG") or set(total_styles) != set("ABCDEFG"):
+            raise ReportFormatError("明细表列数不对")
+
+        # 已有行已按日期排序，归并插入（同一天的新行排在已有行之后）
+        merged = []
+        new_rows = iter(invoices)
+        pending = next(new_rows, None)
+        for row in existing:
+            match = _DATE_RE.search(row)
+            row_date = unescape(match.group(1) or "") if match else ""
+            while pending is not None and (pending.date or "") < row_date:
+                merged.append(pending)
+                pending = next(new_rows, None)
+            merged.append(row)
+        while pending is not None:
+            merged.append(pending)
+            pending = next(new_rows, None)
+
+        out = [header]
+        for idx, item in enumerate(merged, 1):
+            r = idx + 1
+            if isinstance(item, str):
+                row = re.sub(r'^<row r="\d+"', f'<row r="{r}"', item)
+                row = _CELL_REF_RE.sub(lambda m: f"{m.group(1)}{m.group(2)}{r}{m.group(3)}", row)
+                row = re.sub(r'(<c r="A\d+"[^>]*><v>)\d+(</v>)', rf"\g<1>{idx}\g<2>", row)
+                out.append(row)
+            else:
+                out.append(self._new_row(item, r, idx, styles))
+
+        last = len(merged) + 1
+        s = total_styles
+        out.append(
+            f'<row r="{last + 1}">'
+            + _text_cell(f"A{last + 1}", s["A"], "") + _text_cell(f"B{last + 1}", s["B"], "")
+            + _text_cell(f"C{last + 1}", s["C"], "合计")
+            + f'<c r="D{last + 1}" s="{s["D"]}"><f>SUM(D2:D{last})</f><v /></c>'
+            + "".join(_text_cell(f"{col}{last + 1}", s[col], "") for col in "EFG")
+            + "</row>"
+        )
+
+        new_xml = xml[:start] + "<sheetData>" + "".join(out) + xml[end:]
+        new_xml = re.sub(r'<dimension ref="A1:G\d+"', f'<dimension ref="A1:G{last + 1}"', new_xml)
+        return new_xml, len(merged)
+
+    def _new_row(self, info: InvoiceInfo, r: int, idx: int, styles: Dict[str, str]) -> str:
+        try:
+            rel_path = Path(info.file_path).relative_to(self.output_dir)
+        except ValueError:
+            rel_path = info.file_path
+        return (
+            f'<row r="{r}">'
+            + _number_cell(f"A{r}", styles["A"], idx)
+            + _text_cell(f"B{r}", styles["B"], info.date)
+            + _text_cell(f"C{r}", styles["C"], info.subtype or info.merchant)
+            + _number_cell(f"D{r}", styles["D"], info.amount)
+            + _text_cell(f"E{r}", styles["E"], info.invoice_number)
+            + _text_cell(f"F{r}", styles["F"], info.description)
+            + _text_cell(f"G{r}", styles["G"], str(rel_path))
+            + "</row>"
+        )
+
+    @staticmethod
+    def _update_summary(xml: str, sheet_name: str, data_rows: int) -> str:
+        name = re.escape(escape(f"'{sheet_name}'"))
+        last = data_rows + 1
+        xml, count = re.subn(rf"(<f>COUNTA\({name}!A2:A)\d+(\)</f>)", rf"\g<1>{last}\g<2>", xml)
+        xml = re.sub(rf"(<f>{name}!D)\d+(</f>)", rf"\g<1>{last + 1}\g<2>", xml)
+        if not count:
+            raise ReportFormatError(f"汇总表中没有 {sheet_name}")
+        return xml
+
+    def _rewrite(self, zin: zipfile.ZipFile, changed: Dict[str, str]):
+        """写出新报表：修改过的部分用新内容，其余原样复制，最后原子替换"""
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with zipfile.ZipFile(tmp, "w") as zout:
+            for item in zin.infolist():
+                data = changed[item.filename].encode("utf-8") if item.filename in changed else zin.read(item)
+                zout.writestr(item, data, compress_type=item.compress_type)
+        os.replace(tmp, self.path)
+
+
+def update_report(output_dir: str, added: Dict[str, List[InvoiceInfo]]) -> Optional[str]:
+    """便捷函数：把新发票追加到已有报表，无法增量更新时返回 None"""
+    return ReportUpdater(output_dir).append(added)
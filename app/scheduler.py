@@ -0,0 +1,279 @@
+"""任务调度模块 - 固定数量的工作线程 + 有界排队，多个用户之间公平分配
+
+    scheduler = JobScheduler()
+    position = scheduler.submit(task_id, process_task, task_id,   # 队列满时抛出 QueueFullError
+                                client=request.remote_addr, cost=文件数)
+    scheduler.position(task_id)                                   # 排队位置（1 起），已开始则为 None
+
+任务函数可以是生成器：每 yield 一次（处理完一个文件）就把工作线程让出来，由调度器重新挑选下一步，
+这样调度以文件为单位，而不是整个任务占住一个工作线程直到结束。挑选规则:
+    1. 小任务优先（SJF）：剩余文件数不超过 small_task 的任务先执行，交互用户几秒内就能看到结果；
+       优先执行的步骤同样扣该用户的额度，透支超过 small_task 后改为参加轮转
+    2. 其余按用户做差额轮转（DRR）：每轮每个用户获得 quantum 个文件的额度，一个用户上传 500 张
+       也只是和其他用户轮流处理，不会让别人的 5 张一直排队
+    3. 每个用户同时执行的步骤数不超过 client_limit
+任务内部按阶段限制并发：CPU 阶段（渲染、OCR）用 cpu_slot()，I/O 阶段（API 调用）用 io_slot()。
+"""
+import inspect
+import itertools
+import math
+import threading
+import time
+import traceback
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .config import (WEB_CLIENT_CONCURRENCY, WEB_CPU_CONCURRENCY, WEB_IO_CONCURRENCY, WEB_QUEUE_SIZE,
+                     WEB_SMALL_TASK_FILES, WEB_WORKERS)
+
+DEFAULT_JOB_SECONDS = 30  # 还没有完成过任务时估计的单个任务耗时
+
+
+class QueueFullError(Exception):
+    """排队的任务已达上限"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"当前排队任务已满，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Job:
+    job_id: str
+    client: str
+    fn: Callable
+    args: Tuple[Any, ...]
+    cost: int  # 预计步骤数（文件数）
+    seq: int
+    steps: int = 0
+    started_at: float = 0.0
+    gen: Optional[Iterator] = field(default=None, repr=False)
+
+    @property
+    def remaining(self) -> int:
+        return max(1, self.cost - self.steps)
+
+
+class JobScheduler:
+    """固定工作线程池 + 有界队列，按用户公平调度"""
+
+    def __init__(self, workers: int = WEB_WORKERS, max_queue: int = WEB_QUEUE_SIZE,
+                 cpu_slots: int = WEB_CPU_CONCURRENCY, io_slots: int = WEB_IO_CONCURRENCY,
+                 client_limit: int = WEB_CLIENT_CONCURRENCY, small_task: int = WEB_SMALL_TASK_FILES,
+                 quantum: int = 1):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.cpu_slots = max(1, cpu_slots)
+        self.io_slots = max(1, io_slots)
+        self.client_limit = max(1, client_limit)
+        self.small_task = small_task
+        self.quantum = max(1, quantum)
+        self._flows: Dict[str, deque] = defaultdict(deque)  # {用户: 等待执行下一步的任务}
+        self._active = deque()  # 有任务在等待的用户（轮转顺序）
+        self._deficit: Dict[str, int] = defaultdict(int)
+        self._client_running: Dict[str, int] = defaultdict(int)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = 0
+        self._closed = False
+        self._durations = deque(maxlen=20)  # 最近完成任务的耗时，用于估计重试等待时间
+        self._cpu = threading.BoundedSemaphore(self.cpu_slots)
+        self._io = threading.BoundedSemaphore(self.io_slots)
+        self._cpu_busy = 0
+
+    def submit(self, job_id: str, fn: Callable, *args, client: str = "", cost: int = 1) -> int:
+        """加入队列，返回排队位置（1 起）"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("调度器已关闭")
+            if self._queued() >= self.max_queue:
+                raise QueueFullError(self.retry_after())
+            self._push(_Job(job_id, client, fn, args, max(1, cost), next(self._seq)))
+            self._start_workers()
+            self._cond.notify()
+            return self._position(job_id)
+
+    def is_full(self) -> bool:
+        with self._cond:
+            return self._queued() >= self.max_queue
+
+    def position(self, job_id: str) -> Optional[int]:
+        """排队位置（1 起，按提交顺序）；已开始或不存在返回 None"""
+        with self._cond:
+            return self._position(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """从队列中移除还没有开始的任务"""
+        with self._cond:
+            for client, flow in self._flows.items():
+                for job in flow:
+                    if job.job_id == job_id and not job.steps:
+                        flow.remove(job)
+                        if not flow:
+                            self._deactivate(client)
+                        return True
+        return False
+
+    @property
+    def queued(self) -> int:
+        with self._cond:
+            return self._queued()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def cpu_busy(self) -> int:
+        """正在占用 CPU 阶段名额的步骤数"""
+        return self._cpu_busy
+
+    @property
+    def pending(self) -> int:
+        """还没有结束的任务数（排队中、执行中和执行到一半的）"""
+        with self._cond:
+            return sum(len(flow) for flow in self._flows.values()) + self._running
+
+    def retry_after(self) -> int:
+        """队列满时建议的重试等待秒数（大约是空出一个位置的时间）"""
+        durations = list(self._durations)
+        average = sum(durations) / len(durations) if durations else DEFAULT_JOB_SECONDS
+        return max(1, math.ceil(average / self.workers))
+
+    @contextmanager
+    def cpu_slot(self):
+        """CPU 阶段（PDF 渲染、本地 OCR）"""
+        with self._cpu:
+            with self._cond:
+                self._cpu_busy += 1
+            try:
+                yield
+            finally:
+                with self._cond:
+                    self._cpu_busy -= 1
+
+    @contextmanager
+    def io_slot(self):
+        """I/O 阶段（API 调用）"""
+        with self._io:
+            yield
+
+    def shutdown(self, wait: bool = True):
+        """不再接受新任务；队列中已有的任务仍会执行"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    # 以下方法调用前应持有锁
+
+    def _queued(self) -> int:
+        return sum(1 for flow in self._flows.values() for job in flow if not job.steps)
+
+    def _position(self, job_id: str) -> Optional[int]:
+        waiting = sorted((job for flow in self._flows.values() for job in flow if not job.steps),
+                         key=lambda j: j.seq)
+        for idx, job in enumerate(waiting, 1):
+            if job.job_id == job_id:
+                return idx
+        return None
+
+    def _push(self, job: _Job):
+        if not self._flows[job.client]:
+            self._active.append(job.client)
+        self._flows[job.client].append(job)
+
+    def _deactivate(self, client: str):
+        self._active.remove(client)
+        del self._flows[client]
+        self._deficit.pop(client, None)
+
+    def _take(self, client: str, job: _Job) -> _Job:
+        flow = self._flows[client]
+        flow.remove(job)
+        if not flow:
+            self._deactivate(client)
+        self._client_running[client] += 1
+        return job
+
+    def _next_job(self) -> Optional[_Job]:
+        """按 小任务优先 → 差额轮转 挑选下一步；所有用户都到达并发上限时返回 None"""
+        eligible = [c for c in self._active if self._client_running.get(c, 0) < self.client_limit]
+        if not eligible:
+            return None
+
+        # 小任务也计入该用户的额度：额度透支超过一个小任务的用户不再优先，
+        # 回到差额轮转中排队，避免靠拆成许多小任务让大任务一直得不到执行
+        small = [job for c in eligible if self._deficit[c] > -self.small_task
+                 for job in self._flows[c] if job.remaining <= self.small_task]
+        if small:
+            job = min(small, key=lambda j: (j.remaining, j.seq))
+            self._deficit[job.client] -= 1
+            return self._take(job.client, job)
+
+        while True:
+            client = self._active[0]
+            self._active.rotate(-1)
+            if self._client_running.get(client, 0) >= self.client_limit:
+                continue
+            if self._deficit[client] >= 1:
+                self._deficit[client] -= 1
+                return self._take(client, self._flows[client][0])
+            self._deficit[client] += self.quantum
+
+    def _start_workers(self):
+        """第一次提交任务时启动工作线程"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    job = self._next_job() if self._active else None
+                    if job is not None or (self._closed and not self._active and not self._running):
+                        break
+                    self._cond.wait()
+                if job is None:
+                    return
+                self._running += 1
+
+            finished = self._step(job)
+
+            with self._cond:
+                self._running -= 1
+                self._client_running[job.client] -= 1
+                if not self._client_running[job.client]:
+                    del self._client_running[job.client]
+                if finished:
+                    self._durations.append(time.perf_counter() - job.started_at)
+                else:
+                    self._push(job)
+                self._cond.notify_all()
+
+    @staticmethod
+    def _step(job: _Job) -> bool:
+        """执行任务的一步，返回任务是否已结束"""
+        try:
+            if job.gen is None:
+                job.started_at = time.perf_counter()
+                result = job.fn(*job.args)
+                if not inspect.isgenerator(result):
+                    job.steps += 1
+                    return True
+                job.gen = result
+            next(job.gen)
+            job.steps += 1
+            return False
+        except StopIteration:
+            return True
+        except Exception:
+            traceback.print_exc()
+            return True
@@ -0,0 +1,92 @@
+"""内容寻址存储 - 原始文件只存一份，分类目录中放链接
+
+输出目录结构（--layout symlink / hardlink）:
+    <输出目录>/.store/ab/abcdef...0123.pdf     原始文件，以内容 sha256 命名，相同内容只存一份
+    <输出目录>/打车票/<组>/<文件名>.pdf         指向 .store 中对象的符号链接（或硬链接）
+分类目录只是一个“视图”：换了配对/命名规则后用 FileOrganizer.rebuild_view() 重建链接即可，
+不复制任何数据。
+"""
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from . import metrics
+from .index import hash_file
+from .placement import DEFAULT_WORKERS, PlacementEngine, PlacementResult, _next_candidate
+
+STORE_DIR = ".store"
+LAYOUTS = ("files", "symlink", "hardlink")
+
+
+class ContentStore:
+    """<输出目录>/.store"""
+
+    def __init__(self, output_dir: str):
+        self.root = Path(output_dir) / STORE_DIR
+
+    def path_for(self, file_hash: str, suffix: str) -> Path:
+        return self.root / file_hash[:2] / f"{file_hash}{suffix.lower()}"
+
+    def objects(self) -> Iterable[Path]:
+        if self.root.exists():
+            yield from (p for p in self.root.glob("*/*") if p.is_file())
+
+    def collect_garbage(self, referenced: Iterable[Path]) -> int:
+        """删除没有被引用的对象（例如回滚后留下的），返回删除数"""
+        keep = {Path(p) for p in referenced}
+        removed = 0
+        for obj in list(self.objects()):
+            if obj not in keep:
+                obj.unlink()
+                removed += 1
+        return removed
+
+
+class LinkPlacementEngine(PlacementEngine):
+    """把文件放入内容存储，再在目标位置创建指向它的链接"""
+
+    def __init__(self, store: ContentStore, kind: str = "symlink", copy_mode: bool = True,
+                 workers: int = DEFAULT_WORKERS, hardlink: bool = False,
+                 hashes: Optional[Dict[str, str]] = None):
+        super().__init__(copy_mode=copy_mode, workers=workers, hardlink=hardlink)
+        if kind not in ("symlink", "hardlink"):
+            raise ValueError(f"未知的链接方式: {kind}")
+        self.store = store
+        self.kind = kind
+        self.hashes = hashes if hashes is not None else {}  # {源文件: hash}，未知的放置时计算
+
+    def place(self, src: str, dst: Path) -> PlacementResult:
+        dst = Path(dst)
+        file_hash = self.hashes.get(src) or hash_file(src)
+        self.hashes[src] = file_hash
+        obj = self.store.path_for(file_hash, Path(src).suffix)
+
+        with metrics.timer("organizer.file_io"):
+            size = self._ingest(src, obj)
+            candidate = dst
+            counter = 1
+            while True:
+                try:
+                    if self.kind == "symlink":
+                        os.symlink(os.path.relpath(obj, candidate.parent), candidate)
+                    else:
+                        os.link(obj, candidate)
+                    break
+                except FileExistsError:
+                    candidate = _next_candidate(dst, counter)
+                    counter += 1
+        metrics.inc("files_placed", mode="copy" if self.copy_mode else "move", method=self.kind)
+        return PlacementResult(src, candidate, self.kind, size)
+
+    def _ingest(self, src: str, obj: Path) -> int:
+        """把源文件放入存储（已有相同内容时不再复制；移动模式下删除源文件）"""
+        if Path(src) == obj:
+            return 0
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            result = self._copy(src, obj) if self.copy_mode else self._move(src, obj)
+            return result.bytes
+        except FileExistsError:
+            if not self.copy_mode:
+                os.unlink(src)
+            return 0
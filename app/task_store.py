@@ -0,0 +1,425 @@
+"""任务存储 - Web 版的任务状态、逐文件进度和产物路径
+
+    MemoryTaskStore  进程内字典，重启后丢失（单进程、测试用）
+    SqliteTaskStore  SQLite（WAL 模式），默认。多个 Web 进程共用同一个数据库文件，
+                     重启后任务仍在；查询状态是按主键读一行
+
+租约: 处理任务的进程用 claim() 领取任务，并定期 renew() 续租。进程退出或崩溃后租约过期，
+其他进程（或重启后的同一进程）用 reclaim() 接管，已记录进度的文件不再重复识别。
+没有所有者的 queued 任务就是待处理队列，独立的任务处理进程（worker.py）同样用 reclaim() 领取。
+过期清理: expires_at 到期的任务由 expired() 找出，调用方删除临时目录后 delete()。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# 处理中（可以被接管）的状态
+ACTIVE_STATUSES = ('queued', 'processing', 'organizing')
+
+
+class TaskStore(ABC):
+    """任务存储接口；get() 返回的是副本，修改任务用 update()"""
+
+    persistent = False  # 重启后任务是否还在
+
+    @abstractmethod
+    def create(self, task_id: str, data: dict, owner: str = None, lease: float = 0):
+        """登记任务；指定 owner 时同时领取（租约 lease 秒），其他进程不会在登记后、领取前抢走"""
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def update(self, task_id: str, **fields) -> bool:
+        """合并字段，任务不存在时返回 False"""
+
+    @abstractmethod
+    def delete(self, task_id: str):
+        ...
+
+    @abstractmethod
+    def items(self) -> List[Tuple[str, dict]]:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def status_counts(self) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def oldest(self) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def position(self, task_id: str) -> Optional[int]:
+        """在所有排队任务中的位置（1 起，按创建顺序）；不在排队时返回 None"""
+
+    @abstractmethod
+    def expired(self, now: float = None) -> List[Tuple[str, dict]]:
+        """expires_at 已到期的任务"""
+
+    @abstractmethod
+    def record_file(self, task_id: str, idx: int, info: dict):
+        """记录第 idx 个文件（1 起）的识别结果"""
+
+    @abstractmethod
+    def files(self, task_id: str) -> Dict[int, dict]:
+        ...
+
+    @abstractmethod
+    def set_artifact(self, task_id: str, kind: str, path: str):
+        ...
+
+    @abstractmethod
+    def artifacts(self, task_id: str) -> Dict[str, str]:
+        ...
+
+    @abstractmethod
+    def claim(self, task_id: str, owner: str, lease: float) -> bool:
+        """领取任务（没有所有者、租约已过期或本来就是自己的）"""
+
+    @abstractmethod
+    def renew(self, owner: str, lease: float) -> int:
+        """为 owner 的所有处理中任务续租，返回任务数"""
+
+    @abstractmethod
+    def reclaim(self, owner: str, lease: float, limit: int = None) -> List[str]:
+        """按创建顺序接管没有所有者或租约已过期的处理中任务（最多 limit 个），返回任务 id"""
+
+    @abstractmethod
+    def release(self, owner: str, task_id: str = None):
+        """释放 owner 的租约（指定任务或全部），其他进程可以立即接管"""
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内任务存储"""
+
+    def __init__(self):
+        self._tasks: Dict[str, dict] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}  # {任务: (所有者, 到期时间)}
+        self._files: Dict[str, Dict[int, dict]] = {}
+        self._artifacts: Dict[str, Dict[str, str]] = {}
+        self._created: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def create(self, task_id: str, data: dict, owner: str = None, lease: float = 0):
+        with self._lock:
+            self._tasks[task_id] = dict(data)
+            self._created[task_id] = time.time()
+            self._files[task_id] = {}
+            self._artifacts[task_id] = {}
+            self._leases.pop(task_id, None)
+            if owner is not None:
+                self._leases[task_id] = (owner, time.time() + lease)
+
+    def get(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    def update(self, task_id: str, **fields) -> bool:
+        with self._lock:
+            if task_id not in self._tasks:
+                return False
+            self._tasks[task_id].update(fields)
+            return True
+
+    def delete(self, task_id: str):
+        with self._lock:
+            for table in (self._tasks, self._leases, self._files, self._artifacts, self._created):
+                table.pop(task_id, None)
+
+    def items(self) -> List[Tuple[str, dict]]:
+        with self._lock:
+            return [(task_id, dict(task)) for task_id, task in self._tasks.items()]
+
+    def count(self) -> int:
+        return len(self._tasks)
+
+    def status_counts(self) -> Dict[str, int]:
+        counts = {}
+        for _, task in self.items():
+            counts[task.get('status', '')] = counts.get(task.get('status', ''), 0) + 1
+        return counts
+
+    def oldest(self) -> Optional[str]:
+        with self._lock:
+            return min(self._created, key=self._created.get, default=None)
+
+    def position(self, task_id: str) -> Optional[int]:
+        with self._lock:
+            if self._tasks.get(task_id, {}).get('status') != 'queued':
+                return None
+            return sum(1 for tid, task in self._tasks.items()
+                       if task.get('status') == 'queued' and self._created[tid] <= self._created[task_id])
+
+    def expired(self, now: float = None) -> List[Tuple[str, dict]]:
+        now = time.time() if now is None else now
+        return [(task_id, task) for task_id, task in self.items()
+                if task.get('expires_at') is not None and task['expires_at'] <= now]
+
+    def record_file(self, task_id: str, idx: int, info: dict):
+        with self._lock:
+            if task_id in self._files:
+                self._files[task_id][idx] = dict(info)
+
+    def files(self, task_id: str) -> Dict[int, dict]:
+        with self._lock:
+            return dict(self._files.get(task_id, {}))
+
+    def set_artifact(self, task_id: str, kind: str, path: str):
+        with self._lock:
+            if task_id in self._artifacts:
+                self._artifacts[task_id][kind] = path
+
+    def artifacts(self, task_id: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._artifacts.get(task_id, {}))
+
+    def claim(self, task_id: str, owner: str, lease: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if task_id not in self._tasks:
+                return False
+            current = self._leases.get(task_id)
+            if current is not None and current[0] != owner and current[1] > now:
+                return False
+            self._leases[task_id] = (owner, now + lease)
+            return True
+
+    def renew(self, owner: str, lease: float) -> int:
+        until = time.time() + lease
+        with self._lock:
+            mine = [task_id for task_id, (who, _) in self._leases.items()
+                    if who == owner and self._tasks[task_id].get('status') in ACTIVE_STATUSES]
+            for task_id in mine:
+                self._leases[task_id] = (owner, until)
+            return len(mine)
+
+    def reclaim(self, owner: str, lease: float, limit: int = None) -> List[str]:
+        now = time.time()
+        with self._lock:
+            taken = [task_id for task_id, task in self._tasks.items()
+                     if task.get('status') in ACTIVE_STATUSES
+                     and self._leases.get(task_id, ("", 0.0))[1] <= now][:limit]
+            for task_id in taken:
+                self._leases[task_id] = (owner, now + lease)
+            return taken
+
+    def release(self, owner: str, task_id: str = None):
+        with self._lock:
+            for tid, (who, _) in list(self._leases.items()):
+                if who == owner and task_id in (None, tid):
+                    del self._leases[tid]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_status_lease ON tasks (status, lease_until);
+CREATE INDEX IF NOT EXISTS tasks_expires ON tasks (expires_at);
+CREATE INDEX IF NOT EXISTS tasks_created ON tasks (created_at);
+CREATE TABLE IF NOT EXISTS task_files (
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    info TEXT NOT NULL,
+    PRIMARY KEY (task_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS task_artifacts (
+    task_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (task_id, kind)
+) WITHOUT ROWID;
+"""
+
+# 单独存为列（有索引）的字段，其余字段存在 data（JSON）中
+_COLUMNS = ('status', 'expires_at')
+_ACTIVE_SQL = ",".join("?" * len(ACTIVE_STATUSES))
+
+
+class SqliteTaskStore(TaskStore):
+    """SQLite 任务存储（WAL 模式，多进程共用）"""
+
+    persistent = True
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程一个连接（fork 出的子进程不沿用父进程的连接）"""
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    @staticmethod
+    def _row_to_task(status: str, data: str, expires_at) -> dict:
+        task = json.loads(data)
+        task['status'] = status
+        task['expires_at'] = expires_at
+        return task
+
+    def create(self, task_id: str, data: dict, owner: str = None, lease: float = 0):
+        data = dict(data)
+        status, expires_at = data.pop('status', 'queued'), data.pop('expires_at', None)
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO tasks "
+                       "(id, status, data, created_at, expires_at, owner, lease_until) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (task_id, status, json.dumps(data, ensure_ascii=False), now, expires_at,
+                        owner, now + lease if owner is not None else None))
+
+    def get(self, task_id: str) -> Optional[dict]:
+        row = self._connection().execute(
+            "SELECT status, data, expires_at FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._row_to_task(*row) if row else None
+
+    def update(self, task_id: str, **fields) -> bool:
+        columns = {key: fields.pop(key) for key in _COLUMNS if key in fields}
+        with self._transaction() as db:
+            row = db.execute("SELECT data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                return False
+            if fields:
+                data = json.loads(row[0])
+                data.update(fields)
+                columns['data'] = json.dumps(data, ensure_ascii=False)
+            if columns:
+                assignments = ", ".join(f"{key} = ?" for key in columns)
+                db.execute(f"UPDATE tasks SET {assignments} WHERE id = ?", (*columns.values(), task_id))
+        return True
+
+    def delete(self, task_id: str):
+        with self._transaction() as db:
+            db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            db.execute("DELETE FROM task_files WHERE task_id = ?", (task_id,))
+            db.execute("DELETE FROM task_artifacts WHERE task_id = ?", (task_id,))
+
+    def items(self) -> List[Tuple[str, dict]]:
+        rows = self._connection().execute(
+            "SELECT id, status, data, expires_at FROM tasks ORDER BY created_at").fetchall()
+        return [(task_id, self._row_to_task(*rest)) for task_id, *rest in rows]
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def status_counts(self) -> Dict[str, int]:
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return dict(rows)
+
+    def oldest(self) -> Optional[str]:
+        row = self._connection().execute("SELECT id FROM tasks ORDER BY created_at LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def position(self, task_id: str) -> Optional[int]:
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM tasks WHERE status = 'queued' AND created_at <= "
+            "(SELECT created_at FROM tasks WHERE id = ? AND status = 'queued')", (task_id,)).fetchone()
+        return row[0] or None
+
+    def expired(self, now: float = None) -> List[Tuple[str, dict]]:
+        now = time.time() if now is None else now
+        rows = self._connection().execute(
+            "SELECT id, status, data, expires_at FROM tasks WHERE expires_at <= ?", (now,)).fetchall()
+        return [(task_id, self._row_to_task(*rest)) for task_id, *rest in rows]
+
+    def record_file(self, task_id: str, idx: int, info: dict):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO task_files (task_id, idx, info) VALUES (?, ?, ?)",
+                       (task_id, idx, json.dumps(info, ensure_ascii=False)))
+
+    def files(self, task_id: str) -> Dict[int, dict]:
+        rows = self._connection().execute(
+            "SELECT idx, info FROM task_files WHERE task_id = ?", (task_id,)).fetchall()
+        return {idx: json.loads(info) for idx, info in rows}
+
+    def set_artifact(self, task_id: str, kind: str, path: str):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO task_artifacts (task_id, kind, path) VALUES (?, ?, ?)",
+                       (task_id, kind, path))
+
+    def artifacts(self, task_id: str) -> Dict[str, str]:
+        rows = self._connection().execute(
+            "SELECT kind, path FROM task_artifacts WHERE task_id = ?", (task_id,)).fetchall()
+        return dict(rows)
+
+    def claim(self, task_id: str, owner: str, lease: float) -> bool:
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE tasks SET owner = ?, lease_until = ? "
+                "WHERE id = ? AND (owner IS NULL OR owner = ? OR lease_until <= ?)",
+                (owner, now + lease, task_id, owner, now))
+            return cursor.rowcount == 1
+
+    def renew(self, owner: str, lease: float) -> int:
+        with self._transaction() as db:
+            cursor = db.execute(
+                f"UPDATE tasks SET lease_until = ? WHERE owner = ? AND status IN ({_ACTIVE_SQL})",
+                (time.time() + lease, owner, *ACTIVE_STATUSES))
+            return cursor.rowcount
+
+    def reclaim(self, owner: str, lease: float, limit: int = None) -> List[str]:
+        now = time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                f"SELECT id FROM tasks WHERE status IN ({_ACTIVE_SQL}) "
+                f"AND (lease_until IS NULL OR lease_until <= ?) ORDER BY created_at LIMIT ?",
+                (*ACTIVE_STATUSES, now, -1 if limit is None else limit)).fetchall()
+            taken = [row[0] for row in rows]
+            db.executemany("UPDATE tasks SET owner = ?, lease_until = ? WHERE id = ?",
+                           [(owner, now + lease, task_id) for task_id in taken])
+        return taken
+
+    def release(self, owner: str, task_id: str = None):
+        with self._transaction() as db:
+            if task_id is None:
+                db.execute("UPDATE tasks SET owner = NULL, lease_until = NULL WHERE owner = ?", (owner,))
+            else:
+                db.execute("UPDATE tasks SET owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                           (task_id, owner))
+
+
+def open_task_store(kind: str, path: str = None) -> TaskStore:
+    """按配置创建任务存储: kind 为 "sqlite" 或 "memory" """
+    if kind == "memory":
+        return MemoryTaskStore()
+    if kind == "sqlite":
+        return SqliteTaskStore(path)
+    raise ValueError(f"未知的任务存储: {kind}")
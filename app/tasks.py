@@ -0,0 +1,411 @@
+"""Web 版任务处理 - 任务管理、识别整理流程和租约维护
+
+任务保存在任务存储中（见 task_store.py），处理任务的可以是:
+    embedded  Web 进程内的工作线程（默认），上传后直接加入本进程的调度器
+    external  独立的 worker.py 进程，Web 进程只登记任务；worker 从任务存储领取排队的任务
+
+两种方式共用 process_task() 和维护逻辑: 续租、接管待处理或中断的任务、清理过期任务。
+"""
+import atexit
+import math
+import os
+import shutil
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import metrics
+from .analyzer import InvoiceInfo, analyze_invoice, get_vision_analyzer
+from .config import TASK_DB, TASK_LEASE_SECONDS, TASK_STORE, WORKER_POLL_SECONDS
+from .index import OutputIndex
+from .journal import OrganizeJournal
+from .ocr import extract_text_from_file, file_to_image_content, is_supported_file
+from .organizer import FileOrganizer
+from .scheduler import DEFAULT_JOB_SECONDS, JobScheduler, QueueFullError
+from .task_store import TaskStore, open_task_store
+
+# 任务管理器配置
+MAX_TASKS = 100  # 最大任务数
+RECENT_TASKS = 20  # 估计重试等待时间时参考的最近完成任务数
+
+
+class TaskManager:
+    """任务管理器 - 任务保存在任务存储中（见 app/task_store.py），防止任务无限增长"""
+
+    def __init__(self, store: TaskStore = None, max_tasks: int = MAX_TASKS):
+        self.store = store or open_task_store(TASK_STORE, TASK_DB)
+        self.lock = threading.Lock()
+        self.max_tasks = max_tasks
+
+    def add(self, task_id: str, task_data: dict, owner: str = None) -> None:
+        """添加任务（指定 owner 时同时领取），如果超过限制则清理最旧的任务"""
+        with self.lock:
+            # 如果超过最大任务数，清理最旧的任务
+            while self.store.count() >= self.max_tasks:
+                self._cleanup_oldest()
+            self.store.create(task_id, task_data, owner=owner, lease=TASK_LEASE_SECONDS)
+
+    def get(self, task_id: str) -> Optional[dict]:
+        """获取任务（副本，修改任务用 update()）"""
+        return self.store.get(task_id)
+
+    def __contains__(self, task_id: str) -> bool:
+        """检查任务是否存在"""
+        return self.store.get(task_id) is not None
+
+    def __getitem__(self, task_id: str) -> dict:
+        """获取任务（字典风格访问）"""
+        task = self.store.get(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def update(self, task_id: str, **fields) -> bool:
+        """更新任务字段，任务已被删除时返回 False"""
+        return self.store.update(task_id, **fields)
+
+    def remove(self, task_id: str) -> None:
+        """移除任务"""
+        self.store.delete(task_id)
+
+    def discard(self, task_id: str, task: dict = None) -> None:
+        """删除任务的临时目录和输出目录，并移除任务"""
+        task = task or self.store.get(task_id) or {}
+        for key in ('temp_dir', 'output_dir'):
+            if task.get(key) and os.path.exists(task[key]):
+                shutil.rmtree(task[key], ignore_errors=True)
+        self.store.delete(task_id)
+
+    def items(self):
+        """返回任务项"""
+        return self.store.items()
+
+    def clear(self):
+        """清空所有任务"""
+        for task_id, _ in self.store.items():
+            self.store.delete(task_id)
+
+    def _cleanup_oldest(self) -> None:
+        """清理最旧的任务（内部方法，调用前应持有锁）"""
+        oldest_id = self.store.oldest()
+        if oldest_id is None:
+            return
+        self.discard(oldest_id)
+        print(f"[清理] 任务数超限，已清理最旧任务 {oldest_id}")
+
+
+# 任务管理器实例
+task_manager = TaskManager()
+
+# 处理任务的工作线程池（排队上限、各阶段并发数见 app/config.py）
+scheduler = JobScheduler()
+
+
+def worker_id() -> str:
+    """当前进程的标识（任务租约的所有者）"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def cleanup_task(task_id, delay=1800):
+    """延迟清理任务数据（默认30分钟后，由维护线程删除）"""
+    task_manager.update(task_id, expires_at=time.time() + delay)
+
+
+def sweep_expired_tasks():
+    """删除已到清理时间的任务"""
+    for task_id, task in task_manager.store.expired():
+        task_manager.discard(task_id, task)
+        print(f"[清理] 已删除任务 {task_id} 的临时文件")
+
+
+def resume_tasks():
+    """领取没有所有者或租约已过期的任务（新排队的、服务重启或其他进程退出时中断的），加入本进程的调度器"""
+    owner = worker_id()
+    # 除正在处理的以外，每个工作线程最多预取一个任务，其余留给其他进程
+    free = scheduler.workers * 2 - scheduler.pending
+    if free <= 0:
+        return
+    for task_id in task_manager.store.reclaim(owner, TASK_LEASE_SECONDS, limit=free):
+        task = task_manager.get(task_id)
+        if not task:
+            continue
+        remaining = task.get('total', 1) - len(task_manager.store.files(task_id))
+        try:
+            scheduler.submit(task_id, process_task, task_id, client=task.get('client', ''), cost=remaining)
+        except QueueFullError:
+            # 本进程排队已满，留给其他进程或下一轮
+            task_manager.store.release(owner, task_id)
+            continue
+        print(f"[处理] 已领取任务 {task_id}")
+
+
+def maintenance_pass(process_tasks: bool = True):
+    """一轮维护；process_tasks=False 时只清理过期任务（不处理任务的 Web 进程）"""
+    if process_tasks:
+        task_manager.store.renew(worker_id(), TASK_LEASE_SECONDS)
+        resume_tasks()
+    sweep_expired_tasks()
+    measure_temp_disk()
+
+
+def _maintenance(process_tasks: bool, interval: float):
+    while True:
+        try:
+            maintenance_pass(process_tasks)
+        except Exception:
+            traceback.print_exc()
+        time.sleep(interval)
+
+
+_maintenance_pid = None
+_maintenance_lock = threading.Lock()
+
+
+def start_maintenance(process_tasks: bool = True):
+    """启动本进程的维护线程（每个进程一个，gunicorn fork 出的进程各自启动）"""
+    global _maintenance_pid
+    with _maintenance_lock:
+        if _maintenance_pid == os.getpid():
+            return
+        _maintenance_pid = os.getpid()
+    interval = max(1, TASK_LEASE_SECONDS / 3)
+    threading.Thread(target=_maintenance, args=(process_tasks, interval),
+                     name="task-maintenance", daemon=True).start()
+
+
+def processing_gauges() -> dict:
+    """本进程处理任务的瞬时值（排队、工作线程、OCR 占用率），抓取指标时计算"""
+    return {
+        'queue_depth': scheduler.queued,
+        'workers_busy': scheduler.running,
+        'ocr_pool_size': scheduler.cpu_slots,
+        # 渲染和 OCR 都在 cpu_slot 中执行，按占用的名额计算，一个步骤只算一次
+        'ocr_pool_utilisation': scheduler.cpu_busy / scheduler.cpu_slots,
+    }
+
+
+_temp_disk_bytes = {'input': 0, 'output': 0}
+
+
+def _path_size(path: str) -> int:
+    """文件或目录占用的字节数"""
+    if not path or not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def measure_temp_disk():
+    """统计所有任务的临时文件占用的磁盘空间（维护线程每轮一次，抓取指标时直接用结果）"""
+    usage = {'input': 0, 'output': 0}
+    for _, task in task_manager.items():
+        usage['input'] += _path_size(task.get('temp_dir'))
+        usage['output'] += _path_size(task.get('output_dir'))
+    _temp_disk_bytes.update(usage)
+
+
+def temp_disk_bytes() -> Dict[str, int]:
+    """最近一次 measure_temp_disk() 的结果"""
+    return dict(_temp_disk_bytes)
+
+
+def store_retry_after() -> int:
+    """
+    队列满时建议的重试等待秒数（任务由 worker 进程处理，本进程的调度器不执行任务时）
+
+    按任务存储中最近完成的任务估计单个任务耗时，除以正在处理的任务数（所有 worker 的并发），
+    还没有完成过任务时按 DEFAULT_JOB_SECONDS 估计
+    """
+    tasks = [task for _, task in task_manager.items()]
+    finished = sorted((task for task in tasks if task.get('finished_at') and task.get('started_at')),
+                      key=lambda task: task['finished_at'])[-RECENT_TASKS:]
+    durations = [task['finished_at'] - task['started_at'] for task in finished]
+    average = sum(durations) / len(durations) if durations else DEFAULT_JOB_SECONDS
+    active = sum(1 for task in tasks if task.get('status') in ('processing', 'organizing'))
+    return max(1, math.ceil(average / max(1, active)))
+
+
+def run_worker(stop: threading.Event = None, poll_interval: float = WORKER_POLL_SECONDS):
+    """独立任务处理进程的主循环：领取并处理排队的任务，直到 stop 被设置"""
+    stop = stop or threading.Event()
+    print(f"[处理] 任务处理进程 {worker_id()} 已启动，{scheduler.workers} 个工作线程")
+    try:
+        while not stop.is_set():
+            try:
+                maintenance_pass()
+            except Exception:
+                traceback.print_exc()
+            stop.wait(poll_interval)
+    finally:
+        # 退出前释放租约，未完成的任务由其他进程立即接管
+        scheduler.shutdown(wait=False)
+        task_manager.store.release(worker_id())
+        print("[处理] 任务处理进程已退出")
+
+
+def cleanup_all_tasks():
+    """服务器关闭时清理所有任务；持久存储中的任务保留，只释放本进程的租约，重启后立即继续处理"""
+    if task_manager.store.persistent:
+        task_manager.store.release(worker_id())
+        return
+    with task_manager.lock:
+        for task_id, task in task_manager.items():
+            task_manager.discard(task_id, task)
+        print("[清理] 已清理所有临时文件")
+
+
+# 注册退出时清理
+atexit.register(cleanup_all_tasks)
+
+
+def organize_outputs(output_dir: str, invoice_infos: List[InvoiceInfo]) -> Dict[str, List[InvoiceInfo]]:
+    """整理识别结果；接管的任务上次整理到一半时继续整理，已整理完（还没来得及标记完成）时不再整理"""
+    organizer = FileOrganizer(output_dir, copy_mode=True)
+    state = OrganizeJournal(output_dir).load()
+    if state is None or state.rolled_back:
+        return organizer.organize(invoice_infos)
+    if not state.committed:
+        organizer.resume()
+    return OutputIndex(output_dir).categorized()
+
+
+def process_task(task_id):
+    """
+    后台处理上传的文件（生成器：每处理完一个文件 yield 一次，由调度器在各用户之间轮转）
+
+    每个文件的识别结果记录在任务存储中，中断后接管的进程跳过已识别的文件。
+    """
+    from .config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL
+    task = task_manager.get(task_id)
+    if not task:
+        return
+    temp_dir = task['temp_dir']
+    output_dir = task['output_dir']
+
+    # 自动检测是否使用视觉模型：硅基流动支持视觉模型，DeepSeek 需要用本地 OCR
+    is_siliconflow = 'siliconflow' in DEEPSEEK_BASE_URL.lower()
+    use_vision = task.get('use_vision', is_siliconflow)
+
+    print(f"[处理] API: {DEEPSEEK_BASE_URL}, 使用视觉模型: {use_vision}")
+
+    try:
+        # 获取 API Key
+        api_key = DEEPSEEK_API_KEY
+        if not api_key:
+            task_manager.update(task_id, status='error', error='服务器未配置 API Key，请联系管理员')
+            cleanup_task(task_id, delay=300)
+            return
+
+        # 扫描文件（排序，接管时序号与之前一致）
+        files = []
+        for f in sorted(Path(temp_dir).rglob("*")):
+            if f.is_file() and is_supported_file(str(f)):
+                files.append(str(f))
+
+        if not files:
+            task_manager.update(task_id, status='error', error='未找到有效的发票文件')
+            cleanup_task(task_id, delay=300)
+            return
+
+        task_manager.update(task_id, total=len(files), status='processing', started_at=time.time())
+        done = task_manager.store.files(task_id)
+
+        # 处理每个文件
+        invoice_infos = []
+        for idx, file_path in enumerate(files, 1):
+            if idx in done:
+                invoice_infos.append(InvoiceInfo(raw_text="", **done[idx]))
+                continue
+            if not task_manager.update(task_id, current=idx, current_file=Path(file_path).name):
+                return  # 任务已被清理
+
+            try:
+                if use_vision:
+                    # 使用视觉模型直接分析图片（推荐，无需本地OCR）
+                    with scheduler.cpu_slot():
+                        image_contents = file_to_image_content(file_path)
+                    with scheduler.io_slot():
+                        info = get_vision_analyzer(api_key).analyze_images(image_contents, file_path)
+                else:
+                    # 使用本地 OCR + API 文本分析
+                    with scheduler.cpu_slot():
+                        ocr_text = extract_text_from_file(file_path)
+                    with scheduler.io_slot():
+                        info = analyze_invoice(ocr_text, file_path, api_key)
+                metrics.inc("files_processed", result="ok")
+            except Exception as e:
+                metrics.inc("files_processed", result="error")
+                # 创建错误记录
+                info = InvoiceInfo(
+                    type="other",
+                    subtype="处理失败",
+                    amount=0.0,
+                    date="",
+                    service_date="",
+                    merchant="",
+                    invoice_number="",
+                    is_invoice=False,
+                    description=f"处理失败: {str(e)}",
+                    raw_text="",
+                    file_path=file_path,
+                    order_number=""
+                )
+            invoice_infos.append(info)
+            record = info.to_dict()
+            record.pop("raw_text")
+            task_manager.store.record_file(task_id, idx, record)
+            # 让出工作线程，调度器可以先处理其他用户的文件
+            yield
+
+        # 分类和整理
+        task_manager.update(task_id, status='organizing')
+        categorized = organize_outputs(output_dir, invoice_infos)
+
+        # 计算汇总（报表和 ZIP 在第一次下载时才生成）
+        summary = {}
+        total_amount = 0.0
+        for category_name in ['打车票', '火车飞机票', '住宿费', '餐费', '其他']:
+            if category_name in categorized:
+                infos = categorized[category_name]
+                invoice_amount = sum(i.amount for i in infos if i.is_invoice)
+                invoice_count = len([i for i in infos if i.is_invoice])
+                summary[category_name] = {
+                    'count': invoice_count,
+                    'amount': invoice_amount
+                }
+                total_amount += invoice_amount
+
+        task_manager.update(
+            task_id,
+            summary=summary,
+            total_amount=total_amount,
+            zip_filename=f"报销结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+            status='completed',
+            finished_at=time.time()
+        )
+        metrics.inc("tasks_finished", status="completed")
+
+        # 立即清理输入文件（保护隐私）
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+        # 启动延迟清理（30分钟后清理输出）
+        cleanup_task(task_id, delay=1800)
+
+    except Exception as e:
+        task_manager.update(task_id, status='error', error=str(e))
+        metrics.inc("tasks_finished", status="error")
+        traceback.print_exc()
+        # 异常时也启动延迟清理
+        cleanup_task(task_id, delay=300)  # 5分钟后清理
@@ -0,0 +1 @@
+"""性能测试工具集 - 本地模拟 API、合成发票数据集、端到端基准测试"""
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+合成发票数据集生成器 - 为性能测试提供可复现的输入
+
+生成电子发票 PDF、扫描件风格的图片、打车行程单、酒店水单，包含可配对的凭证/发票组合，
+并输出每个文件的真实标注（ground truth），格式与 InvoiceInfo 字段一致。
+
+同样的 --seed 和 --count 总是生成同样的数据集。
+
+使用方法:
+    python -m benchmarks.corpus --output ./bench_corpus --count 1000
+    python -m benchmarks.corpus --output ./bench_corpus --count 100000 --workers 8
+
+输出结构:
+    bench_corpus/
+    ├── corpus.json             # 生成参数和统计
+    ├── ground_truth.jsonl      # 每行一个文件的标注
+    └── docs/
+        ├── batch_000/          # 每 1000 个文件一个子目录
+        └── ...
+"""
+import argparse
+import io
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageFilter
+
+CORPUS_VERSION = 1
+GROUND_TRUTH_FILE = "ground_truth.jsonl"
+SUMMARY_FILE = "corpus.json"
+BATCH_SIZE = 1000
+
+# 平台/商家（简称, 销售方全称）
+TAXI_PLATFORMS = [
+    ("滴滴出行", "滴滴出行科技有限公司"),
+    ("高德打车", "高德软件有限公司"),
+    ("曹操出行", "曹操出行有限公司"),
+    ("首汽约车", "首约科技（北京）有限公司"),
+]
+HOTELS = [
+    ("如家酒店", "如家酒店管理有限公司"),
+    ("汉庭酒店", "汉庭星空（上海）酒店管理有限公司"),
+    ("全季酒店", "全季酒店管理有限公司"),
+    ("亚朵酒店", "亚朵酒店管理有限公司"),
+]
+AIRLINES = [
+    ("中国国际航空", "中国国际航空股份有限公司"),
+    ("东方航空", "中国东方航空股份有限公司"),
+    ("南方航空", "中国南方航空股份有限公司"),
+]
+RESTAURANTS = [
+    ("海底捞", "四川海底捞餐饮股份有限公司"),
+    ("西贝莜面村", "西贝餐饮管理有限公司"),
+    ("肯德基", "百胜餐饮有限公司"),
+]
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "成都", "武汉", "西安"]
+PLACES = ["国贸", "望京SOHO", "虹桥火车站", "首都机场T3", "中关村", "西湖", "天府广场", "科技园"]
+
+_TEXT_FONT = "china-s"
+_PAGE_WIDTH, _PAGE_HEIGHT = 595, 420  # A5 横向
+_PDF_METADATA = {
+    "producer": "benchmarks.corpus",
+    "creator": "benchmarks.corpus",
+    "creationDate": "D:20240101000000",
+    "modDate": "D:20240101000000",
+}
+
+
+def _cn_date(d: date) -> str:
+    return f"{d.year}年{d.month:02d}月{d.day:02d}日"
+
+
+class CorpusBuilder:
+    """根据随机种子生成文档规格（只生成描述，不渲染）"""
+
+    def __init__(self, seed: int = 42, scanned_ratio: float = 0.2, start: date = date(2024, 1, 1), days: int = 365):
+        self.rng = random.Random(seed)
+        self.scanned_ratio = scanned_ratio
+        self.start = start
+        self.days = days
+        self._seq = 0
+        self._group_seq = 0
+
+    def iter_documents(self, count: int) -> Iterator[dict]:
+        """生成恰好 count 个文档规格"""
+        produced = 0
+        while produced < count:
+            remaining = count - produced
+            docs = self._next_event(remaining)
+            for doc in docs[:remaining]:
+                yield doc
+            produced += min(len(docs), remaining)
+
+    def _next_event(self, remaining: int) -> List[dict]:
+        """生成一次消费产生的全部文档"""
+        if remaining == 1:
+            return self._meal()
+        roll = self.rng.random()
+        if roll < 0.45:
+            return self._taxi()
+        if roll < 0.60:
+            return self._hotel()
+        if roll < 0.72:
+            return self._train()
+        if roll < 0.82:
+            return self._flight()
+        return self._meal()
+
+    # ---------- 各类消费 ----------
+
+    def _taxi(self) -> List[dict]:
+        subtype, seller = self.rng.choice(TAXI_PLATFORMS)
+        service = self._random_date()
+        rides = 1 if self.rng.random() < 0.8 else self.rng.randint(2, 5)
+        ride_amounts = [round(self.rng.uniform(12, 160), 2) for _ in range(rides)]
+        amount = round(sum(ride_amounts), 2)
+        order_number = self._order_number() if self.rng.random() < 0.7 else ""
+        group = self._new_group()
+
+        ride_lines = []
+        for idx, ride_amount in enumerate(ride_amounts, 1):
+            start, end = self.rng.sample(PLACES, 2)
+            ride_lines.append(f"{idx}  快车  {service.isoformat()} {self.rng.randint(7, 22):02d}:{self.rng.randint(0, 59):02d}  "
+                              f"{start} → {end}  {ride_amount:.2f}元")
+        voucher_lines = [
+            f"{subtype}-行程单",
+            f"申请日期：{_cn_date(service + timedelta(days=1))}",
+            f"乘车日期：{service.isoformat()}",
+            f"共 {rides} 笔行程",
+        ]
+        if order_number:
+            voucher_lines.append(f"订单号：{order_number}")
+        voucher_lines += ride_lines + [f"合计：{amount:.2f}元"]
+
+        docs = [
+            self._invoice("taxi", subtype, seller, amount, service, order_number, group,
+                          "*运输服务*客运服务费", "乘车日期", f"{subtype}打车费用"),
+            self._document(
+                kind="taxi_itinerary", lines=voucher_lines, group=group,
+                truth=dict(type="taxi", subtype=subtype, amount=amount, date=service.isoformat(),
+                           service_date=service.isoformat(), merchant=subtype, invoice_number="",
+                           is_invoice=False, description=f"{subtype}行程单（{rides}笔）",
+                           order_number=order_number),
+                name=f"{subtype}行程报销单"),
+        ]
+        return docs
+
+    def _hotel(self) -> List[dict]:
+        subtype, seller = self.rng.choice(HOTELS)
+        city = self.rng.choice(CITIES)
+        check_in = self._random_date()
+        nights = self.rng.choice([1, 1, 2, 3, 4])
+        rates = [round(self.rng.uniform(180, 680), 2) for _ in range(nights)]
+        amount = round(sum(rates), 2)
+        order_number = self._order_number() if self.rng.random() < 0.5 else ""
+        room = self.rng.randint(201, 1899)
+        group = self._new_group()
+
+        docs = [self._invoice("hotel", subtype, seller, amount, check_in, order_number, group,
+                              "*住宿服务*住宿费", "入住日期", f"{city}{subtype}住宿{nights}晚")]
+
+        # 多晚住宿有一半概率按晚出具水单（多张水单对应一张发票）
+        nightly = nights > 1 and self.rng.random() < 0.5
+        folios = list(enumerate(rates)) if nightly else [(0, amount)]
+        for night, folio_amount in folios:
+            stay_date = check_in + timedelta(days=night)
+            lines = [
+                f"{subtype}（{city}店） 宾客账单",
+                f"房号：{room}",
+                f"入住日期：{stay_date.isoformat()}",
+                f"离店日期：{(stay_date + timedelta(days=1 if nightly else nights)).isoformat()}",
+            ]
+            if order_number:
+                lines.append(f"订单号：{order_number}")
+            lines += [f"房费：¥{folio_amount:.2f}", f"合计：{folio_amount:.2f}元"]
+            docs.append(self._document(
+                kind="hotel_folio", lines=lines, group=group,
+                truth=dict(type="hotel", subtype=subtype, amount=folio_amount, date=stay_date.isoformat(),
+                           service_date=stay_date.isoformat(), merchant=seller, invoice_number="",
+                           is_invoice=False, description=f"{subtype}水单", order_number=order_number),
+                name=f"水单_{room}"))
+        return docs
+
+    def _train(self) -> List[dict]:
+        service = self._random_date()
+        origin, destination = self.rng.sample(CITIES, 2)
+        amount = round(self.rng.uniform(55, 980), 1)
+        return [self._invoice("train", "12306", "中国铁路", amount, service, "", self._new_group(),
+                              "*运输服务*铁路旅客运输", "乘车日期", f"{origin}-{destination}高铁")]
+
+    def _flight(self) -> List[dict]:
+        subtype, seller = self.rng.choice(AIRLINES)
+        service = self._random_date()
+        origin, destination = self.rng.sample(CITIES, 2)
+        amount = float(self.rng.randrange(380, 3200, 10))
+        order_number = self._order_number()
+        group = self._new_group()
+        lines = [
+            "航空运输电子客票行程单",
+            f"承运人：{subtype}",
+            f"出发日期：{service.isoformat()}",
+            f"航程：{origin} → {destination}",
+            f"订单号：{order_number}",
+            f"票价：¥{amount - 50:.2f}  民航发展基金：¥50.00",
+            f"合计：{amount:.2f}元",
+        ]
+        return [
+            self._invoice("flight", subtype, seller, amount, service, order_number, group,
+                          "*运输服务*国内航空旅客运输", "出发日期", f"{origin}-{destination}机票"),
+            self._document(
+                kind="flight_itinerary", lines=lines, group=group,
+                truth=dict(type="flight", subtype=subtype, amount=amount, date=service.isoformat(),
+                           service_date=service.isoformat(), merchant=seller, invoice_number="",
+                           is_invoice=False, description=f"{origin}-{destination}行程单",
+                           order_number=order_number),
+                name=f"行程单_{order_number}"),
+        ]
+
+    def _meal(self) -> List[dict]:
+        subtype, seller = self.rng.choice(RESTAURANTS)
+        service = self._random_date()
+        amount = round(self.rng.uniform(25, 600), 2)
+        doc = self._invoice("meal", subtype, seller, amount, service, "", self._new_group(),
+                            "*餐饮服务*餐费", "消费日期", f"{subtype}餐费")
+        # 部分餐饮发票没有消费日期（会进入"待确认"）
+        if self.rng.random() < 0.2:
+            doc["lines"] = [l for l in doc["lines"] if not l.startswith("消费日期")]
+            doc["truth"]["service_date"] = ""
+        return [doc]
+
+    # ---------- 通用构造 ----------
+
+    def _invoice(self, inv_type: str, subtype: str, seller: str, amount: float, service: date,
+                 order_number: str, group: str, item: str, date_label: str, description: str) -> dict:
+        issued = service + timedelta(days=self.rng.choice([0, 0, 1, 2, 5, 10]))
+        invoice_number = str(self.rng.randrange(10 ** 19, 10 ** 20))
+        tax = round(amount - amount / 1.06, 2)
+        lines = [
+            "电子发票（普通发票）",
+            f"发票号码：{invoice_number}",
+            f"开票日期：{_cn_date(issued)}",
+            "购买方：示例科技有限公司",
+            f"销售方：{seller}",
+            f"项目名称：{item}",
+            f"{date_label}：{service.isoformat()}",
+        ]
+        if order_number:
+            lines.append(f"订单号：{order_number}")
+        lines += [f"税额：¥{tax:.2f}", f"价税合计：¥{amount:.2f}"]
+        return self._document(
+            kind=f"{inv_type}_invoice", lines=lines, group=group,
+            truth=dict(type=inv_type, subtype=subtype, amount=amount, date=issued.isoformat(),
+                       service_date=service.isoformat(), merchant=seller, invoice_number=invoice_number,
+                       is_invoice=True, description=description, order_number=order_number),
+            name=f"dzfp_{invoice_number}")
+
+    def _document(self, kind: str, lines: List[str], group: str, truth: dict, name: str) -> dict:
+        self._seq += 1
+        scanned = self.rng.random() < self.scanned_ratio
+        suffix = ".jpg" if scanned else ".pdf"
+        batch = f"batch_{(self._seq - 1) // BATCH_SIZE:03d}"
+        return {
+            "file": f"docs/{batch}/{name}_{self._seq:06d}{suffix}",
+            "kind": kind,
+            "scanned": scanned,
+            "group_id": group,
+            "lines": lines,
+            "render_seed": self.rng.randrange(2 ** 31),
+            "truth": truth,
+        }
+
+    def _new_group(self) -> str:
+        self._group_seq += 1
+        return f"g{self._group_seq:06d}"
+
+    def _order_number(self) -> str:
+        return str(self.rng.randrange(10 ** 15, 10 ** 16))
+
+    def _random_date(self) -> date:
+        return self.start + timedelta(days=self.rng.randrange(self.days))
+
+
+def _render_pdf_page(lines: List[str]) -> fitz.Document:
+    doc = fitz.open()
+    page = doc.new_page(width=_PAGE_WIDTH, height=_PAGE_HEIGHT)
+    page.insert_text((40, 50), lines[0], fontname=_TEXT_FONT, fontsize=16)
+    y = 85
+    for line in lines[1:]:
+        page.insert_text((40, y), line, fontname=_TEXT_FONT, fontsize=10.5)
+        y += 22
+    page.draw_rect(fitz.Rect(25, 25, _PAGE_WIDTH - 25, _PAGE_HEIGHT - 25), color=(0.6, 0.2, 0.2), width=0.8)
+    doc.set_metadata(_PDF_METADATA)
+    return doc
+
+
+_NOISE_TILE = None
+
+
+def _noise_tile() -> Image.Image:
+    """噪点底图（每个进程生成一次，随机裁剪使用；固定种子保证可复现）"""
+    global _NOISE_TILE
+    if _NOISE_TILE is None:
+        size = (1400, 1000)
+        noise_bytes = random.Random(CORPUS_VERSION).randbytes(size[0] * size[1])
+        _NOISE_TILE = Image.frombytes("L", size, noise_bytes)
+    return _NOISE_TILE
+
+
+def render_document(spec: dict, root: str) -> int:
+    """渲染单个文档到磁盘，返回写入的字节数"""
+    target = Path(root) / spec["file"]
+    target.parent.mkdir(parents=True, exist_ok=True)
+    doc = _render_pdf_page(spec["lines"])
+    try:
+        if not spec["scanned"]:
+            data = doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+            target.write_bytes(data)
+            return len(data)
+
+        # 扫描件效果：灰度、轻微旋转、噪点、模糊、JPEG 压缩
+        rng = random.Random(spec["render_seed"])
+        pix = doc[0].get_pixmap(dpi=110, colorspace=fitz.csGRAY)
+        img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        img = img.rotate(rng.uniform(-2.0, 2.0), resample=Image.BILINEAR, expand=True, fillcolor=255)
+        tile = _noise_tile()
+        left = rng.randrange(tile.width - img.width)
+        top = rng.randrange(tile.height - img.height)
+        noise = tile.crop((left, top, left + img.width, top + img.height))
+        img = Image.blend(img, noise, rng.uniform(0.06, 0.14))
+        img = img.filter(ImageFilter.GaussianBlur(rng.uniform(0.3, 0.8)))
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=rng.randint(55, 80))
+        target.write_bytes(buffer.getvalue())
+        return buffer.tell()
+    finally:
+        doc.close()
+
+
+def _render_batch(args) -> int:
+    specs, root = args
+    return sum(render_document(spec, root) for spec in specs)
+
+
+def generate_corpus(output_dir: str, count: int, seed: int = 42, scanned_ratio: float = 0.2,
+                    workers: int = 1) -> dict:
+    """
+    生成合成数据集
+
+    Args:
+        output_dir: 输出目录
+        count: 文件数量
+        seed: 随机种子
+        scanned_ratio: 扫描件（JPEG）比例
+        workers: 渲染进程数
+
+    Returns:
+        数据集统计信息（同时写入 corpus.json）
+    """
+    if count < 1:
+        raise ValueError("文件数量必须大于 0")
+
+    root = Path(output_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    builder = CorpusBuilder(seed=seed, scanned_ratio=scanned_ratio)
+
+    started = time.perf_counter()
+    kinds = Counter()
+    groups = set()
+    batches = []
+    batch = []
+    with open(root / GROUND_TRUTH_FILE, "w", encoding="utf-8") as f:
+        for spec in builder.iter_documents(count):
+            record = {"file": spec["file"], "kind": spec["kind"], "scanned": spec["scanned"],
+                      "group_id": spec["group_id"], **spec["truth"]}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            kinds[spec["kind"]] += 1
+            groups.add(spec["group_id"])
+            batch.append(spec)
+            if len(batch) >= 50:
+                batches.append(batch)
+                batch = []
+    if batch:
+        batches.append(batch)
+
+    jobs = [(b, str(root)) for b in batches]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            total_bytes = sum(pool.map(_render_batch, jobs))
+    else:
+        total_bytes = sum(_render_batch(job) for job in jobs)
+
+    summary = {
+        "version": CORPUS_VERSION,
+        "seed": seed,
+        "count": count,
+        "scanned_ratio": scanned_ratio,
+        "groups": len(groups),
+        "kinds": dict(sorted(kinds.items())),
+        "bytes": total_bytes,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(root / SUMMARY_FILE, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def load_ground_truth(corpus_dir: str) -> Dict[str, dict]:
+    """读取标注，返回 {文件绝对路径: 标注}"""
+    root = Path(corpus_dir).absolute()
+    truth = {}
+    with open(root / GROUND_TRUTH_FILE, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                truth[str(root / record["file"])] = record
+    return truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成发票数据集（性能测试用）")
+    parser.add_argument("--output", "-o", required=True, help="输出目录")
+    parser.add_argument("--count", "-n", type=int, default=100, help="文件数量（10 ~ 100000）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--scanned-ratio", type=float, default=0.2, help="扫描件图片比例")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1, help="渲染进程数")
+    args = parser.parse_args()
+
+    print(f"生成 {args.count} 个文件到 {args.output} ...")
+    summary = generate_corpus(args.output, args.count, seed=args.seed,
+                              scanned_ratio=args.scanned_ratio, workers=args.workers)
+    print(f"完成: {summary['groups']} 组, {summary['bytes'] / 1024 / 1024:.1f} MB, 用时 {summary['seconds']}s")
+    for kind, n in summary["kinds"].items():
+        print(f"  {kind}: {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+本地模拟 OpenAI 兼容接口 - 用于无网络环境下的压测和故障复现
+
+只实现 /v1/chat/completions（以及 /v1/models），返回根据请求内容推导出的发票 JSON，
+支持可配置的延迟分布、429/5xx 错误注入和慢速流式输出。
+
+使用方法:
+    python -m benchmarks.mock_api --port 8808
+    python -m benchmarks.mock_api --scenario throttled
+    python -m benchmarks.mock_api --latency lognormal:-1.2,0.6 --rate-429 0.1 --rate-5xx 0.02
+
+    # 然后让应用指向本地服务
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8808 DEEPSEEK_API_KEY=sk-mock python cli.py -i ./发票
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, asdict
+from datetime import date, timedelta
+from typing import Callable
+
+from flask import Flask, Response, jsonify, request
+
+from app.analyzer import LocalAnalyzer
+
+# 预设场景：复现线上常见的供应商降级情况
+SCENARIOS = {
+    "healthy": {"latency": "lognormal:-1.6,0.4"},
+    "slow": {"latency": "lognormal:0.7,0.5", "stream_delay": 0.2},
+    "throttled": {"latency": "lognormal:-1.2,0.5", "rate_429": 0.3, "retry_after": 2},
+    "flaky": {"latency": "uniform:0.2,1.5", "rate_5xx": 0.15},
+    "outage": {"latency": "fixed:0.05", "rate_5xx": 0.9},
+}
+
+_ORDER_NUMBER_RE = re.compile(r'(?:订单号|交易号|流水号)[：:]*\s*([A-Za-z0-9]+)')
+_SERVICE_DATE_RE = re.compile(r'(?:乘车|入住|出发|消费|服务)(?:日期|时间)[：:]*\s*(\d{4})[年\-/](\d{1,2})[月\-/](\d{1,2})')
+
+
+@dataclass
+class MockConfig:
+    """模拟服务配置"""
+    latency: str = "fixed:0"  # 延迟分布，见 parse_latency
+    rate_429: float = 0.0  # 返回 429 的概率
+    rate_5xx: float = 0.0  # 返回 500/502/503 的概率
+    retry_after: int = 1  # 429 响应的 Retry-After 秒数
+    stream_delay: float = 0.0  # 流式输出每个分片之间的间隔（秒）
+    stream_chunk: int = 16  # 流式输出每个分片的字符数
+    markdown_rate: float = 0.0  # 用 ```json 代码块包裹响应的概率
+    seed: int = 0  # 随机种子（0 表示不固定）
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """
+    解析延迟分布描述，返回采样函数（单位：秒）
+
+    支持的格式:
+        fixed:0.2              固定延迟
+        uniform:0.1,0.8        均匀分布
+        normal:0.5,0.1         正态分布（均值, 标准差），截断到 0
+        lognormal:-1.2,0.6     对数正态分布（mu, sigma），长尾更接近真实 API
+    """
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(p) for p in params.split(",") if p.strip()]
+    except ValueError:
+        raise ValueError(f"无效的延迟参数: {spec}")
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"无效的延迟分布: {spec}（支持 fixed/uniform/normal/lognormal）")
+
+
+def _extract_request_text(messages: list) -> tuple:
+    """从请求消息中取出用户文字和图片数据，返回 (文字, 图片数据列表)"""
+    texts = []
+    images = []
+    for message in messages:
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    texts.append(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    images.append(part.get("image_url", {}).get("url", ""))
+    return "\n".join(texts), images
+
+
+def build_invoice_json(text: str, images: list) -> dict:
+    """
+    根据请求内容生成发票 JSON
+
+    文字请求：用本地规则分析器从 OCR 文字中提取字段，结果与输入内容一致
+    图片请求：根据图片内容的哈希生成确定性的结果（同一张图片总是得到同样的结果）
+    """
+    if text.strip() and not images:
+        info = LocalAnalyzer().analyze(text, "")
+        result = info.to_dict()
+        for key in ("raw_text", "file_path"):
+            result.pop(key, None)
+
+        order_match = _ORDER_NUMBER_RE.search(text)
+        if order_match:
+            result["order_number"] = order_match.group(1)
+        service_match = _SERVICE_DATE_RE.search(text)
+        if service_match:
+            year, month, day = service_match.groups()
+            result["service_date"] = f"{year}-{int(month):02d}-{int(day):02d}"
+        return result
+
+    digest = hashlib.sha256("".join(images).encode("utf-8")).digest()
+    rng = random.Random(digest)
+    inv_type, subtype = rng.choice([
+        ("taxi", "滴滴出行"), ("taxi", "高德打车"), ("train", "12306"),
+        ("flight", "中国国际航空"), ("hotel", "如家酒店"), ("meal", "海底捞"),
+    ])
+    service_date = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+    issue_date = service_date + timedelta(days=rng.randrange(10))
+    is_invoice = rng.random() < 0.5
+    return {
+        "type": inv_type,
+        "subtype": subtype,
+        "amount": round(rng.uniform(10, 1500), 2),
+        "date": issue_date.isoformat(),
+        "service_date": service_date.isoformat(),
+        "merchant": subtype,
+        "invoice_number": str(rng.randrange(10 ** 19, 10 ** 20)) if is_invoice else "",
+        "order_number": digest.hex()[:16],
+        "is_invoice": is_invoice,
+        "description": f"模拟{subtype}{'发票' if is_invoice else '行程单'}",
+        "ocr_text": "",
+    }
+
+
+def create_app(config: MockConfig) -> Flask:
+    """创建模拟服务 Flask 应用"""
+    mock = Flask(__name__)
+    rng = random.Random(config.seed or None)
+    rng_lock = threading.Lock()
+    sample_latency = parse_latency(config.latency, rng)
+    stats = Counter()
+    stats_lock = threading.Lock()
+
+    def record(key: str):
+        with stats_lock:
+            stats[key] += 1
+
+    def error_response(status: int, message: str, error_type: str):
+        record(str(status))
+        response = jsonify({"error": {"message": message, "type": error_type, "code": status}})
+        response.status_code = status
+        if status == 429:
+            response.headers["Retry-After"] = str(config.retry_after)
+        return response
+
+    @mock.route("/v1/models")
+    def models():
+        return jsonify({"object": "list", "data": [
+            {"id": "mock-text", "object": "model", "owned_by": "mock"},
+            {"id": "mock-vision", "object": "model", "owned_by": "mock"},
+        ]})
+
+    @mock.route("/mock/stats")
+    def mock_stats():
+        """请求统计（按状态码），用于压测时核对注入的错误数量"""
+        with stats_lock:
+            return jsonify(dict(stats))
+
+    @mock.route("/v1/chat/completions", methods=["POST"])
+    def chat_completions():
+        record("requests")
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return error_response(401, "缺少 API Key", "authentication_error")
+
+        payload = request.get_json(silent=True)
+        if not payload or not isinstance(payload.get("messages"), list):
+            return error_response(400, "请求体必须包含 messages 数组", "invalid_request_error")
+
+        with rng_lock:
+            delay = sample_latency()
+            roll = rng.random()
+            status_5xx = rng.choice([500, 502, 503])
+            use_markdown = rng.random() < config.markdown_rate
+        time.sleep(delay)
+
+        if roll < config.rate_429:
+            return error_response(429, "Rate limit reached, please retry later", "rate_limit_error")
+        if roll < config.rate_429 + config.rate_5xx:
+            return error_response(status_5xx, "The server is overloaded", "server_error")
+
+        text, images = _extract_request_text(payload["messages"])
+        content = json.dumps(build_invoice_json(text, images), ensure_ascii=False)
+        if use_markdown:
+            content = f"```json\n{content}\n```"
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = payload.get("model", "mock")
+        created = int(time.time())
+        record("200")
+
+        if payload.get("stream"):
+            def generate():
+                for start in range(0, len(content), config.stream_chunk):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk",
+                        "created": created, "model": model,
+                        "choices": [{"index": 0, "finish_reason": None,
+                                     "delta": {"content": content[start:start + config.stream_chunk]}}],
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    if config.stream_delay:
+                        time.sleep(config.stream_delay)
+                done = {
+                    "id": completion_id, "object": "chat.completion.chunk",
+                    "created": created, "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}],
+                }
+                yield f"data: {json.dumps(done)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return Response(generate(), mimetype="text/event-stream")
+
+        return jsonify({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {
+                "prompt_tokens": len(text) // 2 + 85 * len(images),
+                "completion_tokens": len(content) // 2,
+                "total_tokens": len(text) // 2 + 85 * len(images) + len(content) // 2,
+            },
+        })
+
+    return mock
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="本地模拟 OpenAI 兼容接口（压测/故障复现）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+预设场景: {', '.join(SCENARIOS)}
+
+示例:
+  python -m benchmarks.mock_api --scenario throttled
+  DEEPSEEK_BASE_URL=http://127.0.0.1:8808 python reimbursement.py -i ./发票 -o ./结果
+        """
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8808, help="监听端口")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), help="使用预设场景（可被其他参数覆盖）")
+    parser.add_argument("--latency", help="延迟分布，如 fixed:0.2 / uniform:0.1,0.8 / lognormal:-1.2,0.6")
+    parser.add_argument("--rate-429", type=float, help="返回 429 的概率")
+    parser.add_argument("--rate-5xx", type=float, help="返回 5xx 的概率")
+    parser.add_argument("--retry-after", type=int, help="429 响应的 Retry-After 秒数")
+    parser.add_argument("--stream-delay", type=float, help="流式输出分片间隔（秒）")
+    parser.add_argument("--markdown-rate", type=float, help="用 markdown 代码块包裹 JSON 的概率")
+    parser.add_argument("--seed", type=int, help="随机种子")
+    args = parser.parse_args()
+
+    options = dict(SCENARIOS.get(args.scenario, {}))
+    for field in asdict(MockConfig()):
+        value = getattr(args, field, None)
+        if value is not None:
+            options[field] = value
+    config = MockConfig(**options)
+    parse_latency(config.latency, random.Random())  # 启动前校验参数
+
+    print("=" * 50)
+    print("模拟 API 服务")
+    print("=" * 50)
+    print(f"地址: http://{args.host}:{args.port}")
+    print(f"配置: {asdict(config)}")
+    print(f"使用: DEEPSEEK_BASE_URL=http://{args.host}:{args.port}")
+    print("=" * 50)
+
+    create_app(config).run(host=args.host, port=args.port, debug=False, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+配对引擎规模测试 - 对比索引配对和逐一比较的耗时，并校验两者结果一致
+
+文档由 benchmarks.corpus 的生成器产生（只用标注，不渲染文件），
+--noise 控制去掉订单号、金额和日期轻微偏差的文档比例，用来覆盖非订单号的配对路径。
+同时给出贪心和全局最优（optimal）两种模式配对结果的准确率（配对双方属于同一笔消费的比例），
+以及多对一分组（--group）找回的多凭证消费比例。
+
+使用方法:
+    python -m benchmarks.pairing
+    python -m benchmarks.pairing --sizes 1000,10000,100000 --brute-max 5000
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from app import InvoiceInfo
+from app.pairing import DocKey, match_score, pair_documents
+
+from .corpus import CorpusBuilder
+
+
+def build_documents(count: int, seed: int = 42, noise: float = 0.3) -> Tuple[List[InvoiceInfo], Dict[str, str]]:
+    """生成 count 个文档的 InvoiceInfo（顺序打乱），以及 {文件: 消费分组} 标注"""
+    rng = random.Random(seed)
+    infos = []
+    groups = {}
+    for spec in CorpusBuilder(seed=seed, scanned_ratio=0).iter_documents(count):
+        truth = dict(spec["truth"])
+        if rng.random() < noise:
+            truth["order_number"] = ""
+            truth["amount"] = round(truth["amount"] * rng.uniform(0.97, 1.03), 2)
+            if truth["service_date"] and rng.random() < 0.5:
+                shifted = date.fromisoformat(truth["service_date"]) + timedelta(days=rng.choice([-1, 1]))
+                truth["service_date"] = shifted.isoformat()
+        infos.append(InvoiceInfo(raw_text="", file_path=spec["file"], **truth))
+        groups[spec["file"]] = spec["group_id"]
+    rng.shuffle(infos)
+    return infos, groups
+
+
+def brute_force_pairs(infos: List[InvoiceInfo]) -> List[List[InvoiceInfo]]:
+    """逐一比较所有凭证和发票的贪心配对（原实现，每次比较都重新计算配对键）"""
+    invoices = [(idx, i) for idx, i in enumerate(infos) if i.is_invoice]
+    vouchers = [(idx, i) for idx, i in enumerate(infos) if not i.is_invoice]
+    paired_groups = []
+    used = set()
+    for _, voucher in vouchers:
+        best_match, best_idx, best_score = None, None, 0
+        for invoice_idx, invoice in invoices:
+            if invoice_idx in used:
+                continue
+            score = match_score(DocKey.from_info(voucher), DocKey.from_info(invoice))
+            if score > best_score and score >= 2:
+                best_match, best_idx, best_score = invoice, invoice_idx, score
+        if best_match:
+            paired_groups.append([voucher, best_match])
+            used.add(best_idx)
+        else:
+            paired_groups.append([voucher])
+    for invoice_idx, invoice in invoices:
+        if invoice_idx not in used:
+            paired_groups.append([invoice])
+    return paired_groups
+
+
+def _group_ids(groups: List[List[InvoiceInfo]]) -> List[List[int]]:
+    return [[id(info) for info in group] for group in groups]
+
+
+def pair_precision(groups: List[List[InvoiceInfo]], truth: Dict[str, str]) -> float:
+    """配对结果中属于同一笔消费的比例"""
+    pairs = [g for g in groups if len(g) == 2]
+    if not pairs:
+        return 0.0
+    correct = sum(1 for a, b in pairs if truth[a.file_path] == truth[b.file_path])
+    return correct / len(pairs)
+
+
+def group_recall(groups: List[List[InvoiceInfo]], truth: Dict[str, str]) -> float:
+    """多凭证消费（一张发票对应多张凭证）被完整归到同一组的比例"""
+    sizes = Counter(truth.values())
+    expected = sum(1 for size in sizes.values() if size > 2)
+    if not expected:
+        return 0.0
+    found = sum(1 for g in groups
+                if len(g) > 2 and len({truth[i.file_path] for i in g}) == 1 and len(g) == sizes[truth[g[0].file_path]])
+    return found / expected
+
+
+def run(sizes: List[int], brute_max: int, seed: int, noise: float) -> List[dict]:
+    rows = []
+    for size in sizes:
+        infos, truth = build_documents(size, seed=seed, noise=noise)
+        start = time.perf_counter()
+        groups = pair_documents(infos)
+        indexed_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        optimal_groups = pair_documents(infos, mode="optimal")
+        optimal_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        multi_groups = pair_documents(infos, group_multi=True)
+        group_seconds = time.perf_counter() - start
+
+        row = {
+            "documents": size,
+            "vouchers": sum(1 for i in infos if not i.is_invoice),
+            "pairs": sum(1 for g in groups if len(g) == 2),
+            "indexed_seconds": indexed_seconds,
+            "brute_seconds": None,
+            "identical": None,
+            "optimal_seconds": optimal_seconds,
+            "greedy_precision": pair_precision(groups, truth),
+            "optimal_precision": pair_precision(optimal_groups, truth),
+            "group_seconds": group_seconds,
+            "group_recall": group_recall(multi_groups, truth),
+        }
+        if size <= brute_max:
+            start = time.perf_counter()
+            expected = brute_force_pairs(infos)
+            row["brute_seconds"] = time.perf_counter() - start
+            row["identical"] = _group_ids(expected) == _group_ids(groups)
+        rows.append(row)
+        print_row(row)
+    return rows
+
+
+def print_header():
+    print(f"{'文档数':>10}{'凭证数':>10}{'配对数':>10}{'索引(s)':>12}{'逐一比较(s)':>14}{'加速比':>10}{'结果一致':>10}"
+          f"{'最优(s)':>10}{'贪心准确率':>12}{'最优准确率':>12}{'多对一(s)':>12}{'多对一召回':>12}")
+
+
+def print_row(row: dict):
+    brute = row["brute_seconds"]
+    brute_text = f"{brute:.3f}" if brute is not None else "-"
+    speedup = f"{brute / row['indexed_seconds']:.1f}x" if brute is not None and row["indexed_seconds"] else "-"
+    identical = {True: "是", False: "否", None: "-"}[row["identical"]]
+    print(f"{row['documents']:>10}{row['vouchers']:>10}{row['pairs']:>10}{row['indexed_seconds']:>12.3f}"
+          f"{brute_text:>14}{speedup:>10}{identical:>10}{row['optimal_seconds']:>10.3f}"
+          f"{row['greedy_precision']:>12.2%}{row['optimal_precision']:>12.2%}"
+          f"{row['group_seconds']:>12.3f}{row['group_recall']:>12.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="配对引擎规模测试")
+    parser.add_argument("--sizes", default="1000,5000,10000,50000,100000", help="文档数量，逗号分隔")
+    parser.add_argument("--brute-max", type=int, default=5000, help="超过该数量不跑逐一比较")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--noise", type=float, default=0.3, help="去掉订单号并加入偏差的文档比例")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    print_header()
+    rows = run(sizes, args.brute_max, args.seed, args.noise)
+    if any(row["identical"] is False for row in rows):
+        raise SystemExit("索引配对与逐一比较结果不一致")
+
+
+if __name__ == "__main__":
+    main()
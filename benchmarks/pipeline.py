@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+端到端基准测试 - 扫描 → OCR/视觉预处理 → 分析 → 整理 → 报表 → 打包
+
+分析阶段默认用数据集标注回放（不访问网络），也可以指向本地模拟服务（benchmarks.mock_api）。
+结果保存为 JSON，两次结果可以直接对比。
+
+使用方法:
+    python -m benchmarks.corpus -o ./bench_corpus -n 1000
+    python -m benchmarks.pipeline --corpus ./bench_corpus --save results/v1.3.json
+    python -m benchmarks.pipeline --compare results/v1.3.json results/dev.json
+
+    # 通过模拟服务跑真实的 API 调用路径
+    python -m benchmarks.mock_api --scenario healthy &
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8808 DEEPSEEK_API_KEY=sk-mock \\
+        python -m benchmarks.pipeline --corpus ./bench_corpus --analyzer api
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app import FileOrganizer, InvoiceInfo, generate_report, metrics
+from app.analyzer import analyze_invoice, get_local_analyzer, get_vision_analyzer
+from app.archive import write_archive
+from app.ocr import extract_text_from_file, file_to_image_content, is_supported_file
+
+from .corpus import SUMMARY_FILE, load_ground_truth
+
+STAGES = ["scan", "preprocess", "analyze", "organize", "report", "zip"]
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """线性插值百分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def peak_rss_kb() -> int:
+    """进程峰值常驻内存（KB）"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 返回字节，Linux 返回 KB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def io_write_bytes() -> Optional[int]:
+    """进程累计写入字节数（仅 Linux 可用）"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class StageRecorder:
+    """记录每个阶段的耗时样本、内存峰值和写入字节数"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.wall = {}
+        self.rss = {}
+        self.bytes_written = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, bytes_fn=None):
+        io_before = io_write_bytes()
+        started = time.perf_counter()
+        yield
+        self.wall[name] = time.perf_counter() - started
+        self.rss[name] = peak_rss_kb()
+        io_after = io_write_bytes()
+        if bytes_fn is not None:
+            self.bytes_written[name] = bytes_fn()
+        elif io_before is not None and io_after is not None:
+            self.bytes_written[name] = io_after - io_before
+
+    @contextlib.contextmanager
+    def sample(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - started)
+
+    def summary(self, file_count: int) -> Dict[str, dict]:
+        result = {}
+        for name in STAGES:
+            if name not in self.wall:
+                continue
+            samples = self.samples.get(name) or [self.wall[name]]
+            wall = self.wall[name]
+            result[name] = {
+                "seconds": round(wall, 6),
+                "samples": len(samples),
+                "mean": round(sum(samples) / len(samples), 6),
+                "p50": round(percentile(samples, 50), 6),
+                "p95": round(percentile(samples, 95), 6),
+                "p99": round(percentile(samples, 99), 6),
+                "files_per_second": round(file_count / wall, 2) if wall > 0 else None,
+                "peak_rss_kb": self.rss.get(name, 0),
+                "bytes_written": self.bytes_written.get(name),
+            }
+        return result
+
+
+def _info_from_truth(record: Optional[dict], file_path: str) -> InvoiceInfo:
+    """根据标注构造分析结果（回放模式）"""
+    record = record or {}
+    return InvoiceInfo(
+        type=record.get("type", "other"),
+        subtype=record.get("subtype", "未识别"),
+        amount=float(record.get("amount", 0.0)),
+        date=record.get("date", ""),
+        service_date=record.get("service_date", ""),
+        merchant=record.get("merchant", ""),
+        invoice_number=record.get("invoice_number", ""),
+        is_invoice=bool(record.get("is_invoice", False)),
+        description=record.get("description", ""),
+        raw_text="",
+        file_path=file_path,
+        order_number=record.get("order_number", ""),
+    )
+
+
+def _pairing_quality(original_paths: List[str], infos: List[InvoiceInfo], truth: Dict[str, dict]) -> dict:
+    """对比整理结果与标注分组：统计被完整还原的组的比例"""
+    predicted = defaultdict(set)
+    for original, info in zip(original_paths, infos):
+        predicted[str(Path(info.file_path).parent)].add(original)
+    folder_of = {}
+    for folder, members in predicted.items():
+        for member in members:
+            folder_of[member] = folder
+
+    expected = defaultdict(set)
+    for path in original_paths:
+        if path in truth:
+            expected[truth[path]["group_id"]].add(path)
+
+    exact = sum(
+        1 for members in expected.values()
+        if len({folder_of[m] for m in members}) == 1 and predicted[folder_of[next(iter(members))]] == members
+    )
+    return {
+        "groups_expected": len(expected),
+        "groups_predicted": len(predicted),
+        "groups_exact": exact,
+        "group_accuracy": round(exact / len(expected), 4) if expected else None,
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).parent, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run_benchmark(corpus_dir: str, mode: str = "vision", analyzer: str = "replay",
+                  limit: int = None, work_dir: str = None, api_key: str = None) -> dict:
+    """
+    运行端到端基准测试
+
+    Args:
+        corpus_dir: 数据集目录（benchmarks.corpus 生成）
+        mode: 预处理方式 vision（渲染为图片并编码）或 ocr（本地文字提取）
+        analyzer: replay（标注回放）、local（本地规则）或 api（调用 DEEPSEEK_BASE_URL）
+        limit: 最多处理的文件数
+        work_dir: 输出目录（默认临时目录，结束后删除）
+        api_key: analyzer=api 时使用的 API Key
+
+    Returns:
+        基准测试结果
+    """
+    corpus_path = Path(corpus_dir).absolute()
+    truth = load_ground_truth(str(corpus_path))
+    keep_output = work_dir is not None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="reimbursement_bench_")
+    output_dir = os.path.join(work_dir, "报销结果")
+    zip_path = os.path.join(work_dir, "报销结果.zip")
+    recorder = StageRecorder()
+    metrics_enabled = metrics.is_enabled()
+    metrics.enable()
+    metrics.reset()
+
+    try:
+        with recorder.stage("scan", bytes_fn=lambda: 0):
+            files = sorted(
+                str(f) for f in (corpus_path / "docs").rglob("*")
+                if f.is_file() and is_supported_file(str(f))
+            )
+            if limit:
+                files = files[:limit]
+
+        # 分析阶段直接使用预处理的结果；本地规则分析器只能用文字，总是提取文字
+        render = mode == "vision" and analyzer != "local"
+        preprocessed = {}
+        with recorder.stage("preprocess"):
+            for file_path in files:
+                with recorder.sample("preprocess"):
+                    if render:
+                        preprocessed[file_path] = file_to_image_content(file_path)
+                    else:
+                        preprocessed[file_path] = extract_text_from_file(file_path)
+
+        infos = []
+        with recorder.stage("analyze"):
+            for file_path in files:
+                with recorder.sample("analyze"):
+                    if analyzer == "replay":
+                        info = _info_from_truth(truth.get(file_path), file_path)
+                    elif analyzer == "local":
+                        info = get_local_analyzer().analyze(preprocessed[file_path], file_path)
+                    elif render:
+                        info = get_vision_analyzer(api_key).analyze_images(preprocessed[file_path], file_path)
+                    else:
+                        info = analyze_invoice(preprocessed[file_path], file_path, api_key)
+                infos.append(info)
+        preprocessed.clear()
+
+        original_paths = [info.file_path for info in infos]
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            with recorder.stage("organize", bytes_fn=lambda: dir_size(output_dir)):
+                organizer = FileOrganizer(output_dir, copy_mode=True)
+                categorized = organizer.organize(infos)
+
+        with recorder.stage("report", bytes_fn=lambda: os.path.getsize(report_path)):
+            report_path = generate_report(output_dir, categorized)
+
+        with recorder.stage("zip", bytes_fn=lambda: os.path.getsize(zip_path)):
+            # 与产品相同的打包路径（按文件类型决定是否压缩，并行压缩）
+            write_archive(output_dir, zip_path)
+
+        stages = recorder.summary(len(files))
+        total_seconds = sum(s["seconds"] for s in stages.values())
+        corpus_summary = {}
+        if (corpus_path / SUMMARY_FILE).exists():
+            corpus_summary = json.loads((corpus_path / SUMMARY_FILE).read_text(encoding="utf-8"))
+
+        return {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "revision": _git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "mode": mode,
+                "analyzer": analyzer,
+                "corpus": corpus_summary,
+            },
+            "totals": {
+                "files": len(files),
+                "seconds": round(total_seconds, 6),
+                "files_per_second": round(len(files) / total_seconds, 2) if total_seconds > 0 else None,
+                "peak_rss_kb": peak_rss_kb(),
+                "bytes_written": sum(s["bytes_written"] or 0 for s in stages.values()),
+            },
+            "stages": stages,
+            "quality": _pairing_quality(original_paths, infos, truth),
+            "metrics": metrics.snapshot(),
+        }
+    finally:
+        if not metrics_enabled:
+            metrics.disable()
+        if not keep_output:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_result(result: dict):
+    """打印单次结果"""
+    totals = result["totals"]
+    print("=" * 78)
+    print(f"文件: {totals['files']}  总耗时: {totals['seconds']:.2f}s  "
+          f"吞吐: {totals['files_per_second']} 个/秒  峰值内存: {totals['peak_rss_kb'] / 1024:.1f} MB")
+    print("-" * 78)
+    print(f"{'阶段':<12}{'总耗时(s)':>11}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'个/秒':>10}{'写入(MB)':>11}")
+    for name, stage in result["stages"].items():
+        written = stage["bytes_written"]
+        written_str = f"{written / 1024 / 1024:.2f}" if written is not None else "-"
+        print(f"{name:<12}{stage['seconds']:>11.3f}{stage['p50'] * 1000:>10.2f}{stage['p95'] * 1000:>10.2f}"
+              f"{stage['p99'] * 1000:>10.2f}{stage['files_per_second'] or 0:>10.1f}{written_str:>11}")
+    quality = result.get("quality")
+    if quality and quality.get("group_accuracy") is not None:
+        print("-" * 78)
+        print(f"配对还原: {quality['groups_exact']}/{quality['groups_expected']} 组 "
+              f"({quality['group_accuracy'] * 100:.1f}%)")
+    print("=" * 78)
+    if result.get("metrics"):
+        print("热点指标:")
+        print(metrics.format_summary())
+        print("=" * 78)
+
+
+def compare_results(baseline: dict, current: dict) -> List[dict]:
+    """对比两次结果，返回每个阶段的变化"""
+    rows = []
+    for name in STAGES:
+        before = baseline["stages"].get(name)
+        after = current["stages"].get(name)
+        if not before or not after:
+            continue
+        # 整体阶段只有一个样本，百分位数没有意义
+        metrics = ("seconds", "p50", "p95", "p99") if after["samples"] > 1 else ("seconds",)
+        for metric in metrics:
+            old, new = before[metric], after[metric]
+            change = (new - old) / old * 100 if old else None
+            rows.append({"stage": name, "metric": metric, "baseline": old, "current": new, "change_pct": change})
+    old_rss, new_rss = baseline["totals"]["peak_rss_kb"], current["totals"]["peak_rss_kb"]
+    rows.append({"stage": "total", "metric": "peak_rss_kb", "baseline": old_rss, "current": new_rss,
+                 "change_pct": (new_rss - old_rss) / old_rss * 100 if old_rss else None})
+    return rows
+
+
+def print_comparison(rows: List[dict], threshold: float = 10.0):
+    """打印对比结果，变化超过阈值的行标记出来"""
+    print(f"{'阶段':<12}{'指标':<14}{'基线':>14}{'当前':>14}{'变化':>10}")
+    for row in rows:
+        change = row["change_pct"]
+        change_str = f"{change:+.1f}%" if change is not None else "-"
+        flag = "  ⚠" if change is not None and change > threshold else ""
+        print(f"{row['stage']:<12}{row['metric']:<14}{row['baseline']:>14.4f}{row['current']:>14.4f}{change_str:>10}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="报销助手端到端基准测试")
+    parser.add_argument("--corpus", help="数据集目录（benchmarks.corpus 生成）")
+    parser.add_argument("--mode", choices=["vision", "ocr"], default="vision", help="预处理方式")
+    parser.add_argument("--analyzer", choices=["replay", "local", "api"], default="replay", help="分析方式")
+    parser.add_argument("--limit", type=int, help="最多处理的文件数")
+    parser.add_argument("--work-dir", help="保留输出到该目录（默认使用临时目录并删除）")
+    parser.add_argument("--save", help="保存结果 JSON 的路径")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="对比两次结果")
+    parser.add_argument("--threshold", type=float, default=10.0, help="对比时标记变慢的阈值（%%）")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare)
+        print_comparison(compare_results(baseline, current), args.threshold)
+        return
+
+    if not args.corpus:
+        parser.error("需要 --corpus 或 --compare")
+
+    result = run_benchmark(args.corpus, mode=args.mode, analyzer=args.analyzer,
+                           limit=args.limit, work_dir=args.work_dir)
+    print_result(result)
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已保存: {args.save}")
+
+
+if __name__ == "__main__":
+    main()
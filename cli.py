@@ -6,6 +6,7 @@
 使用方法:
     python cli.py --input ./发票 --output ./报销结果
     python cli.py  # 交互模式
+    python cli.py --output ./报销结果 --resume    # 继续中断的整理（--rollback 撤销）
 """
 import argparse
 import sys
@@ -15,7 +16,10 @@ from typing import List
 from app import get_api_key, setup_wizard, is_configured, INVOICE_CATEGORIES, PENDING_CATEGORY
 from app import analyze_invoice_vision, InvoiceInfo
 from app import FileOrganizer, generate_report
+from app.index import OutputIndex
+from app.journal import JournalError
 from app.ocr import is_supported_file
+from app import metrics, profiling
 
 
 class Colors:
@@ -113,6 +117,25 @@ def process_invoices(files: List[str], api_key: str, show_progress: bool = True)
     return results
 
 
+def recover(output_dir: str, rollback: bool):
+    """继续（--resume）或回滚（--rollback）中断的整理"""
+    output_path = Path(output_dir).absolute()
+    organizer = FileOrganizer(str(output_path))
+    try:
+        if rollback:
+            count = organizer.rollback()
+            print_success(f"已回滚 {count} 个文件")
+            return
+        count = organizer.resume()
+    except JournalError as e:
+        print_error(str(e))
+        sys.exit(1)
+
+    print_info(f"已继续放置 {count} 个文件，重新生成报表...")
+    report_path = generate_report(str(output_path), OutputIndex(str(output_path)).categorized())
+    print_success(f"报表已生成: {report_path}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="报销助手 - 智能发票识别与报销整理工具",
@@ -121,6 +144,7 @@ def main():
 示例:
   python cli.py --input ./发票 --output ./报销结果
   python cli.py  # 交互模式
+  python cli.py --output ./报销结果 --resume    # 继续中断的整理
 
 环境变量:
   DEEPSEEK_API_KEY  DeepSeek API 密钥
@@ -132,14 +156,35 @@ def main():
     parser.add_argument("--copy", "-c", action="store_true", default=True, help="复制文件（默认）")
     parser.add_argument("--move", "-m", action="store_true", help="移动文件（不保留原文件）")
     parser.add_argument("--setup", "-s", action="store_true", help="配置 API Key")
+    parser.add_argument("--stats", action="store_true", help="结束时显示各阶段耗时统计")
+    parser.add_argument("--pairing", choices=["greedy", "optimal"], default="greedy",
+                        help="配对方式：greedy=按文件顺序逐个配对（默认），optimal=全局最优配对")
+    parser.add_argument("--group", action="store_true",
+                        help="多张凭证按金额之和归到一张发票（酒店按晚水单、多张行程单）")
+    parser.add_argument("--hardlink", action="store_true",
+                        help="复制模式下用硬链接代替复制（同一磁盘上不占额外空间，修改任一处另一处同步变化）")
+    parser.add_argument("--profile", action="store_true",
+                        help="剖析各阶段（cProfile、火焰图折叠栈、内存分配），结果写到 <输出目录>_profile/")
+    parser.add_argument("--resume", action="store_true", help="继续上次中断的整理（读取输出目录下的整理日志）")
+    parser.add_argument("--rollback", action="store_true", help="撤销最近一次整理：移动的文件移回原处，复制的文件删除")
 
     args = parser.parse_args()
 
+    if args.stats:
+        metrics.enable()
+
     # 配置 API Key
     if args.setup:
         setup_wizard()
         return
 
+    if args.resume or args.rollback:
+        if not args.output:
+            print_error("请用 --output 指定报销结果文件夹")
+            sys.exit(1)
+        recover(args.output, args.rollback)
+        return
+
     # 获取 API Key
     if not is_configured():
         print_header("首次使用需要配置 API Key")
@@ -179,11 +224,14 @@ def main():
     print(f"输入目录: {input_path}")
     print(f"输出目录: {output_path}")
     print(f"模式: {'复制' if args.copy and not args.move else '移动'}")
+    if args.profile:
+        profiling.start(profiling.profile_dir_for(str(output_path)))
 
     # 扫描文件
     print_info("扫描发票文件...")
     try:
-        files = scan_files(str(input_path))
+        with profiling.stage("scan"):
+            files = scan_files(str(input_path))
     except Exception as e:
         print_error(f"扫描失败: {e}")
         sys.exit(1)
@@ -196,17 +244,25 @@ def main():
 
     # 分析发票
     print_header("分析发票内容")
-    invoice_infos = process_invoices(files, api_key)
+    with profiling.stage("analyze"):
+        invoice_infos = process_invoices(files, api_key)
 
     # 整理文件
     print_header("整理文件")
     copy_mode = not args.move
-    organizer = FileOrganizer(str(output_path), copy_mode=copy_mode)
-    categorized = organizer.organize(invoice_infos)
+    organizer = FileOrganizer(str(output_path), copy_mode=copy_mode, pairing=args.pairing,
+                                group_multi=args.group, hardlink=args.hardlink)
+    try:
+        with profiling.stage("organize"):
+            categorized = organizer.organize(invoice_infos)
+    except JournalError as e:
+        print_error(str(e))
+        sys.exit(1)
 
     # 生成报表
     print_info("生成统计报表...")
-    report_path = generate_report(str(output_path), categorized)
+    with profiling.stage("report"):
+        report_path = generate_report(str(output_path), categorized)
     print_success(f"报表已生成: {report_path}")
 
     # 显示汇总
@@ -233,6 +289,14 @@ def main():
     print_success(f"文件已整理到: {output_path}")
     print_success(f"统计报表: {report_path}")
 
+    if args.stats:
+        print_header("性能统计")
+        print(metrics.format_summary())
+
+    profile_dir = profiling.stop()
+    if profile_dir:
+        print_success(f"剖析文件: {profile_dir}")
+
 
 if __name__ == "__main__":
     main()
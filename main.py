@@ -5,6 +5,7 @@
 使用方法:
     python main.py              # 桌面版（默认）
     python main.py --web        # 网页版
+    python main.py --worker     # 网页版的任务处理进程（TASK_WORKER=external）
     python main.py --cli        # 命令行版
     python main.py --cli -i ./发票 -o ./结果
 """
@@ -20,6 +21,7 @@ def main():
 示例:
   python main.py              # 启动桌面版
   python main.py --web        # 启动网页版
+  python main.py --worker     # 启动网页版的任务处理进程
   python main.py --cli        # 启动命令行版
   python main.py --cli -i ./发票 -o ./结果  # 命令行处理
         """
@@ -30,6 +32,11 @@ def main():
         action='store_true',
         help='启动网页版'
     )
+    parser.add_argument(
+        '--worker',
+        action='store_true',
+        help='启动网页版的任务处理进程（网页版设置 TASK_WORKER=external）'
+    )
     parser.add_argument(
         '--cli', '-c',
         action='store_true',
@@ -52,11 +59,68 @@ def main():
         '--api-key', '-k',
         help='API 密钥'
     )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='显示各阶段耗时统计（仅CLI模式）'
+    )
+    parser.add_argument(
+        '--pairing',
+        choices=['greedy', 'optimal'],
+        help='配对方式（仅CLI模式）'
+    )
+    parser.add_argument(
+        '--group',
+        action='store_true',
+        help='多张凭证按金额之和归到一张发票（仅CLI模式）'
+    )
+    parser.add_argument(
+        '--hardlink',
+        action='store_true',
+        help='复制时用硬链接代替复制（仅CLI模式）'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='剖析各阶段并写出剖析文件（仅CLI模式）'
+    )
+    parser.add_argument(
+        '--zip',
+        nargs='?',
+        const='',
+        metavar='PATH',
+        help='整理完成后打包为 ZIP（默认 <输出目录>.zip，仅CLI模式）'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='继续上次中断的整理（仅CLI模式）'
+    )
+    parser.add_argument(
+        '--rollback',
+        action='store_true',
+        help='撤销最近一次整理（仅CLI模式）'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='增量整理，跳过已整理过的文件（仅CLI模式）'
+    )
+    parser.add_argument(
+        '--layout',
+        choices=['files', 'symlink', 'hardlink'],
+        help='输出布局（仅CLI模式）'
+    )
+    parser.add_argument(
+        '--rebuild-view',
+        action='store_true',
+        help='重建 symlink/hardlink 布局的分类目录（仅CLI模式）'
+    )
 
     args = parser.parse_args()
 
     # 默认启动桌面版
-    if not args.web and not args.cli:
+    if not args.web and not args.cli and not args.worker:
         # 桌面版
         import desktop_app
         desktop_app.main()
@@ -68,6 +132,12 @@ def main():
         web_app.main()
         return
 
+    # 网页版的任务处理进程
+    if args.worker:
+        import worker
+        worker.main()
+        return
+
     # 命令行版
     if args.cli:
         import reimbursement
@@ -81,6 +151,30 @@ def main():
             cli_args.append('--copy')
         if args.api_key:
             cli_args.extend(['--api-key', args.api_key])
+        if args.stats:
+            cli_args.append('--stats')
+        if args.pairing:
+            cli_args.extend(['--pairing', args.pairing])
+        if args.group:
+            cli_args.append('--group')
+        if args.hardlink:
+            cli_args.append('--hardlink')
+        if args.profile:
+            cli_args.append('--profile')
+        if args.zip is not None:
+            cli_args.append('--zip')
+            if args.zip:
+                cli_args.append(args.zip)
+        if args.resume:
+            cli_args.append('--resume')
+        if args.rollback:
+            cli_args.append('--rollback')
+        if args.incremental:
+            cli_args.append('--incremental')
+        if args.layout:
+            cli_args.extend(['--layout', args.layout])
+        if args.rebuild_view:
+            cli_args.append('--rebuild-view')
 
         # 修改 sys.argv
         sys.argv = ['reimbursement.py'] + cli_args
@@ -10,12 +10,20 @@ import argparse
 import os
 import re
 import sys
+import time
+import zipfile
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, Dict, List, Optional
 
 from app import DEEPSEEK_API_KEY, INVOICE_CATEGORIES, get_api_key
 from app import extract_text_from_file, is_supported_file
 from app import analyze_invoice, InvoiceInfo, FileOrganizer, generate_report
+from app import metrics, profiling
+from app.index import OutputIndex
+from app.archive import ArchiveError, write_archive
+from app.journal import JournalError
+from app.report import append_export, export_report
+from app.report_update import update_report
 
 
 def scan_files(input_dir: str) -> List[str]:
@@ -77,10 +85,13 @@ def normalize_category(folder_name: str) -> str:
     return folder_name  # 保留原名
 
 
-def scan_organized_dir(organized_dir: str, use_ai: bool = False, api_key: str = None) -> Dict[str, List[InvoiceInfo]]:
+def scan_organized_dir(organized_dir: str, use_ai: bool = False, api_key: str = None,
+                       confirm_ai: Optional[Callable[[], bool]] = None) -> Dict[str, List[InvoiceInfo]]:
     """
-    扫描已整理好的目录，从文件名中提取信息
-    如果 use_ai=True，对于无法从文件名解析的文件，会调用 AI 分析
+    扫描已整理好的目录
+    优先使用整理时写下的索引（.index.jsonl，含完整发票信息），索引中没有的文件才从文件名中提取信息；
+    如果 use_ai=True，对于无法从文件名解析金额的文件，会调用 AI 分析。
+    给出 confirm_ai 时在第一次需要 AI 分析前调用它确认（只问一次），返回 False 则不使用 AI
 
     目录结构：
     organized_dir/
@@ -119,11 +130,20 @@ def scan_organized_dir(organized_dir: str, use_ai: bool = False, api_key: str =
 
             files_to_process.append((file_path, category_name))
 
-    # 处理所有文件
-    total = len(files_to_process)
+    # 对照索引：认识的文件直接用索引中的信息（手动移动过的按 hash 找回）
+    index = OutputIndex(organized_dir)
+    synced = index.sync(files_to_process)
+    for entry in synced.entries:
+        categorized[entry.category].append(entry.to_info(organized_path))
+    if len(index):
+        print(f"  索引中找到 {len(synced.entries)} 个文件（手动移动 {synced.moved} 个，已删除 {synced.removed} 个）")
+
+    # 处理索引中没有的文件
+    total = len(synced.unknown)
     ai_analyzed_count = 0
+    ai_confirmed = None if confirm_ai else True  # None: 还没有确认过
 
-    for idx, (file_path, category_name) in enumerate(files_to_process, 1):
+    for idx, (file_path, category_name, file_hash) in enumerate(synced.unknown, 1):
         filename = file_path.stem  # 不含扩展名
         parent_folder = file_path.parent.name
 
@@ -131,7 +151,9 @@ def scan_organized_dir(organized_dir: str, use_ai: bool = False, api_key: str =
         info = parse_filename(filename, str(file_path), category_name, parent_folder)
 
         # 如果金额为0且启用了AI，尝试用AI分析
-        if use_ai and info.amount == 0:
+        if use_ai and info.amount == 0 and ai_confirmed is None:
+            ai_confirmed = confirm_ai()
+        if use_ai and info.amount == 0 and ai_confirmed:
             print(f"  [{idx}/{total}] AI 分析: {filename}...")
             ai_info = analyze_file_with_ai(str(file_path), category_name, api_key)
             if ai_info and ai_info.amount > 0:
@@ -139,10 +161,15 @@ def scan_organized_dir(organized_dir: str, use_ai: bool = False, api_key: str =
                 ai_analyzed_count += 1
 
         categorized[category_name].append(info)
+        # 同一目录的文件视为一组
+        index.record(info, file_hash, file_path.parent.relative_to(organized_path).as_posix(), category_name)
 
-    if use_ai and ai_analyzed_count > 0:
+    if ai_analyzed_count > 0:
         print(f"  AI 分析了 {ai_analyzed_count} 个文件")
 
+    if synced.unknown or synced.moved or synced.removed:
+        index.save()
+
     return dict(categorized)
 
 
@@ -277,20 +304,22 @@ def regenerate_report(args):
     print("=" * 50)
     print(f"扫描目录: {organized_dir}")
     print("=" * 50)
+    start_profile(args, organized_dir)
 
-    # 询问是否使用 AI 分析
-    use_ai = False
-    if api_key:
+    # 询问是否使用 AI 分析（只在索引中没有、文件名里也没有金额的文件出现时才问）
+    def ask_use_ai() -> bool:
         print("\n  对于文件名中没有金额信息的文件，是否使用 AI 识别？")
         print("  [1] 是（需要调用 API，较慢但准确）")
         print("  [2] 否（仅从文件名提取，快速但可能不完整）")
         choice = input("  请选择 [1/2，默认2]: ").strip()
-        use_ai = choice == "1"
+        return choice == "1"
 
     # 扫描目录
     print("\n[步骤1] 扫描已整理的文件...")
     try:
-        categorized = scan_organized_dir(organized_dir, use_ai=use_ai, api_key=api_key)
+        with profiling.stage("scan"):
+            categorized = scan_organized_dir(organized_dir, use_ai=bool(api_key), api_key=api_key,
+                                             confirm_ai=ask_use_ai)
     except FileNotFoundError as e:
         print(f"错误: {e}")
         sys.exit(1)
@@ -304,7 +333,8 @@ def regenerate_report(args):
 
     # 生成报表
     print("\n[步骤2] 生成统计报表...")
-    report_path = generate_report(organized_dir, categorized)
+    with profiling.stage("report"):
+        report_path = generate_report(organized_dir, categorized)
     print(f"报表已生成: {report_path}")
 
     # 显示汇总
@@ -326,6 +356,91 @@ def regenerate_report(args):
     print(f"  总计: ¥{total_amount:.2f}")
     print("=" * 50)
     print(f"\n统计报表: {report_path}")
+    pack_results(args, organized_dir)
+    print_stats(args)
+
+
+def recover(args):
+    """继续（--resume）或回滚（--rollback）中断的整理"""
+    output_dir = args.output or args.input
+    if not output_dir:
+        print("错误: 请用 --output 指定报销结果文件夹")
+        sys.exit(1)
+    output_dir = os.path.abspath(output_dir)
+
+    organizer = FileOrganizer(output_dir)
+    try:
+        if args.rollback:
+            count = organizer.rollback()
+            print(f"已回滚 {count} 个文件")
+            return
+        count = organizer.resume()
+    except JournalError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    print(f"已继续放置 {count} 个文件，重新生成报表...")
+    categorized = OutputIndex(output_dir).categorized()
+    report_path = generate_report(output_dir, categorized)
+    print(f"报表已生成: {report_path}")
+
+
+def rebuild_view(args):
+    """按当前配对规则重建链接布局的分类目录（--rebuild-view）"""
+    output_dir = args.output or args.input
+    if not output_dir:
+        print("错误: 请用 --output 指定报销结果文件夹")
+        sys.exit(1)
+    output_dir = os.path.abspath(output_dir)
+    layout = args.layout if args.layout != "files" else "symlink"
+
+    organizer = FileOrganizer(output_dir, pairing=args.pairing, group_multi=args.group, layout=layout)
+    try:
+        organizer.rebuild_view()
+    except JournalError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    report_path = generate_report(output_dir, OutputIndex(output_dir).categorized())
+    print(f"报表已生成: {report_path}")
+
+
+def pack_results(args, output_dir: str):
+    """打包整理结果（--zip），显示每个文件的压缩方式和耗时"""
+    if args.zip is None:
+        return
+    zip_path = os.path.abspath(args.zip or output_dir.rstrip(os.sep) + ".zip")
+    print(f"\n[打包] {zip_path}")
+    start = time.perf_counter()
+    try:
+        entries = write_archive(output_dir, zip_path)
+    except ArchiveError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    for entry in entries:
+        method = "压缩" if entry.method == zipfile.ZIP_DEFLATED else "存储"
+        print(f"  {method} {entry.size:>10,} -> {entry.compressed_size:>10,} 字节 "
+              f"{entry.seconds * 1000:8.1f}ms  {entry.arcname}")
+    total, packed = sum(e.size for e in entries), os.path.getsize(zip_path)
+    print(f"共 {len(entries)} 个文件，{total:,} -> {packed:,} 字节，耗时 {time.perf_counter() - start:.2f}s")
+
+
+def print_stats(args):
+    """显示性能指标（--stats）和剖析文件位置（--profile）"""
+    if getattr(args, 'stats', False):
+        print("\n" + "=" * 50)
+        print("性能统计")
+        print("=" * 50)
+        print(metrics.format_summary())
+    profile_dir = profiling.stop()
+    if profile_dir:
+        print(f"\n剖析文件: {profile_dir}")
+
+
+def start_profile(args, output_dir: str):
+    """开启剖析（--profile），剖析文件写到输出目录旁边"""
+    if getattr(args, 'profile', False):
+        profiling.start(profiling.profile_dir_for(output_dir))
 
 
 def process_files(files: List[str], api_key: str = None) -> List[InvoiceInfo]:
@@ -416,14 +531,84 @@ def main():
         action="store_true",
         help="仅重新生成报表（扫描已整理好的目录）"
     )
+    parser.add_argument(
+        "--incremental", "-u",
+        action="store_true",
+        help="增量整理：跳过已整理过的文件，新文件和输出目录中未配对的文件一起配对"
+    )
+    parser.add_argument(
+        "--layout",
+        choices=["files", "symlink", "hardlink"],
+        default="files",
+        help="输出布局：files=分类目录中放文件（默认）；symlink/hardlink=原始文件只在 .store 存一份，分类目录中放链接"
+    )
+    parser.add_argument(
+        "--rebuild-view",
+        action="store_true",
+        help="按当前配对规则重建 symlink/hardlink 布局的分类目录（不复制数据）"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="继续上次中断的整理（读取输出目录下的整理日志）"
+    )
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="撤销最近一次整理：移动的文件移回原处，复制的文件删除"
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="结束时显示各阶段耗时统计"
+    )
+    parser.add_argument(
+        "--pairing",
+        choices=["greedy", "optimal"],
+        default="greedy",
+        help="配对方式：greedy=按文件顺序逐个配对（默认），optimal=全局最优配对"
+    )
+    parser.add_argument(
+        "--group",
+        action="store_true",
+        help="多张凭证按金额之和归到一张发票（酒店按晚水单、多张行程单）"
+    )
+    parser.add_argument(
+        "--hardlink",
+        action="store_true",
+        help="复制模式下用硬链接代替复制（同一磁盘上不占额外空间，修改任一处另一处同步变化）"
+    )
+    parser.add_argument(
+        "--zip",
+        nargs="?",
+        const="",
+        metavar="PATH",
+        help="整理完成后打包为 ZIP（默认 <输出目录>.zip）；PDF/图片等已压缩格式直接存储，其余并行压缩"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="剖析各阶段（cProfile、火焰图折叠栈、内存分配），结果写到 <输出目录>_profile/"
+    )
 
     args = parser.parse_args()
 
+    if args.stats:
+        metrics.enable()
+
     # 如果是重新生成报表模式
     if args.report:
         regenerate_report(args)
         return
 
+    if args.resume or args.rollback:
+        recover(args)
+        return
+
+    if args.rebuild_view:
+        rebuild_view(args)
+        return
+
     # 获取 API Key（如果未配置会自动引导用户设置）
     api_key = args.api_key or get_api_key()
     if not api_key:
@@ -460,11 +645,13 @@ def main():
     print(f"输入目录: {input_dir}")
     print(f"输出目录: {output_dir}")
     print("=" * 50)
+    start_profile(args, output_dir)
 
     # 1. 扫描文件
     print("\n[步骤1] 扫描发票文件...")
     try:
-        files = scan_files(input_dir)
+        with profiling.stage("scan"):
+            files = scan_files(input_dir)
     except FileNotFoundError as e:
         print(f"错误: {e}")
         sys.exit(1)
@@ -475,19 +662,57 @@ def main():
 
     print(f"找到 {len(files)} 个文件")
 
+    index = None
+    hashes = {}
+    if args.incremental:
+        index = OutputIndex(output_dir)
+        files = index.filter_new(files, hashes)
+        print(f"输出目录已有 {len(index)} 个文件，本次新增 {len(files)} 个")
+        if not files:
+            print("没有新文件需要整理")
+            print_stats(args)
+            return
+
     # 2. 处理文件
     print("\n[步骤2] 识别发票内容...")
-    invoice_infos = process_files(files, api_key)
+    with profiling.stage("analyze"):
+        invoice_infos = process_files(files, api_key)
 
     # 3. 分类和配对
     print("\n[步骤3] 分类和配对文件...")
     copy_mode = getattr(args, 'copy', False)
-    organizer = FileOrganizer(output_dir, copy_mode=copy_mode)
-    categorized = organizer.organize(invoice_infos)
+    organizer = FileOrganizer(output_dir, copy_mode=copy_mode, pairing=args.pairing,
+                              group_multi=args.group, hardlink=args.hardlink, layout=args.layout)
+    try:
+        with profiling.stage("organize"):
+            if index is not None:
+                placed = organizer.organize(invoice_infos, existing=index.open_entries(), hashes=hashes)
+                index.load()
+            else:
+                categorized = organizer.organize(invoice_infos)
+    except JournalError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
 
     # 4. 生成报表
     print("\n[步骤4] 生成统计报表...")
-    report_path = generate_report(output_dir, categorized)
+    with profiling.stage("report"):
+        report_path = None
+        if index is not None:
+            # 只有新发票时追加到已有报表；已有发票被移动（路径变了）时重新生成
+            new_ids = {id(info) for info in invoice_infos}
+            relocated = any(info.is_invoice and id(info) not in new_ids
+                            for infos in placed.values() for info in infos)
+            if not relocated:
+                added = {category: [i for i in infos if id(i) in new_ids] for category, infos in placed.items()}
+                report_path = update_report(output_dir, added)
+                if report_path is not None and append_export(output_dir, added) is None:
+                    export_report(output_dir, index.categorized())
+            if report_path is None:
+                # 重新生成的报表包含输出目录中的全部文件
+                categorized = index.categorized()
+        if report_path is None:
+            report_path = generate_report(output_dir, categorized)
     print(f"报表已生成: {report_path}")
 
     # 5. 显示汇总
@@ -495,12 +720,16 @@ def main():
     print("处理完成！汇总如下：")
     print("=" * 50)
 
+    if index is not None:
+        totals = index.invoice_totals()
+    else:
+        totals = {category_name: (len([i for i in infos if i.is_invoice]),
+                                  sum(i.amount for i in infos if i.is_invoice))
+                  for category_name, infos in categorized.items()}
     total_amount = 0.0
     for category_name in ['打车票', '火车飞机票', '住宿费', '餐费', '其他']:
-        if category_name in categorized:
-            infos = categorized[category_name]
-            invoice_amount = sum(i.amount for i in infos if i.is_invoice)
-            invoice_count = len([i for i in infos if i.is_invoice])
+        if category_name in totals:
+            invoice_count, invoice_amount = totals[category_name]
             print(f"  {category_name}: {invoice_count} 张, ¥{invoice_amount:.2f}")
             total_amount += invoice_amount
 
@@ -509,6 +738,8 @@ def main():
     print("=" * 50)
     print(f"\n文件已整理到: {output_dir}")
     print(f"统计报表: {report_path}")
+    pack_results(args, output_dir)
+    print_stats(args)
 
 
 if __name__ == "__main__":
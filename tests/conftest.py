@@ -3,12 +3,16 @@ import os
 import sys
 import tempfile
 import pytest
+from dataclasses import replace
 from pathlib import Path
 
 # 添加项目根目录到 Python 路径
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+# Web 版测试不写入用户配置目录中的任务数据库
+os.environ.setdefault("TASK_STORE", "memory")
+
 
 @pytest.fixture
 def temp_dir():
@@ -17,6 +21,13 @@ def temp_dir():
         yield tmpdir
 
 
+@pytest.fixture
+def no_maintenance(monkeypatch):
+    """Web 测试客户端的请求不启动维护线程（否则会在测试过程中回收、清理其他测试的任务）"""
+    import web_app
+    monkeypatch.setattr(web_app, "start_maintenance", lambda process_tasks=True: None)
+
+
 @pytest.fixture
 def sample_invoice_info():
     """创建示例发票信息"""
@@ -57,6 +68,28 @@ def sample_voucher_info():
     )
 
 
+@pytest.fixture
+def write_input(temp_dir):
+    """
+    在临时目录中写入文件: write_input(相对路径, 内容, info=None)
+
+    传入 info 时返回 file_path 指向该文件的副本，否则返回文件路径
+    """
+    def write(rel: str, content: bytes, info=None):
+        path = Path(temp_dir) / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return str(path) if info is None else replace(info, file_path=str(path))
+    return write
+
+
+@pytest.fixture
+def sample_inputs(write_input, sample_invoice_info, sample_voucher_info):
+    """临时目录 in/ 下的一对凭证和发票"""
+    return [write_input("in/v.pdf", b"voucher", sample_voucher_info),
+            write_input("in/i.pdf", b"invoice", sample_invoice_info)]
+
+
 @pytest.fixture
 def mock_env(monkeypatch):
     """Mock 环境变量"""
@@ -0,0 +1,102 @@
+"""流式打包模块测试"""
+import io
+import os
+import zipfile
+
+import pytest
+
+
+def _make_tree(root):
+    os.makedirs(os.path.join(root, "打车票", "2024-01-15_滴滴出行_35.50元"))
+    os.makedirs(os.path.join(root, ".store", "ab"))
+    files = {
+        "打车票/2024-01-15_滴滴出行_35.50元/发票.pdf": os.urandom(300 * 1024),
+        "报销统计.xlsx": b"xlsx",
+        "空文件.txt": b"",
+    }
+    for name, data in files.items():
+        with open(os.path.join(root, name), "wb") as f:
+            f.write(data)
+    for name in (".index.jsonl", ".store/ab/abcd.pdf"):
+        with open(os.path.join(root, name), "wb") as f:
+            f.write(b"internal")
+    return files
+
+
+class TestZipStream:
+    """流式 ZIP 测试"""
+
+    def test_roundtrip_and_length(self, temp_dir):
+        """生成的 ZIP 可以正常解压，长度与预先计算的一致，跳过内部文件"""
+        from app.archive import ZipStream
+
+        files = _make_tree(temp_dir)
+        stream = ZipStream(temp_dir)
+        data = b"".join(stream)
+
+        assert len(data) == len(stream)
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            assert z.testzip() is None
+            assert sorted(z.namelist()) == sorted(files)
+            for name, content in files.items():
+                assert z.read(name) == content
+
+    def test_file_changed_while_streaming(self, temp_dir):
+        """打包过程中文件大小变化时报错，不会发出与 Content-Length 不符的数据"""
+        from app.archive import ArchiveError, ZipStream
+
+        _make_tree(temp_dir)
+        stream = ZipStream(temp_dir)
+        with open(os.path.join(temp_dir, "报销统计.xlsx"), "ab") as f:
+            f.write(b"more")
+        with pytest.raises(ArchiveError):
+            b"".join(stream)
+
+
+class TestCompression:
+    """按内容选择压缩方式"""
+
+    def test_method_by_content(self, temp_dir):
+        """PDF、xlsx 存储；CSV 压缩（大文件在线程池中）；压缩后不变小的保持存储"""
+        from app.archive import PARALLEL_MIN_SIZE, ZipStream
+
+        rows = "".join(f"打车票,taxi,滴滴出行,{i}.00,2024-01-15\n" for i in range(PARALLEL_MIN_SIZE // 20))
+        files = {
+            "发票.pdf": b"%PDF-1.4 " + b"0" * 4096,
+            "报销统计.xlsx": b"x" * 4096,
+            "报销明细.csv": rows.encode("utf-8"),
+            "小.csv": b"a,b\n" * 100,
+            "随机.txt": os.urandom(4096),
+        }
+        for name, data in files.items():
+            with open(os.path.join(temp_dir, name), "wb") as f:
+                f.write(data)
+
+        stream = ZipStream(temp_dir, workers=2)
+        data = b"".join(stream)
+        assert len(data) == len(stream)
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            methods = {info.filename: info.compress_type for info in z.infolist()}
+            for name, content in files.items():
+                assert z.read(name) == content
+        assert methods == {
+            "发票.pdf": zipfile.ZIP_STORED,
+            "报销统计.xlsx": zipfile.ZIP_STORED,
+            "报销明细.csv": zipfile.ZIP_DEFLATED,
+            "小.csv": zipfile.ZIP_DEFLATED,
+            "随机.txt": zipfile.ZIP_STORED,
+        }
+
+    def test_write_archive_reports_timings(self, temp_dir):
+        """写出到文件，返回每个条目的方式和耗时"""
+        from app.archive import write_archive
+
+        files = _make_tree(os.path.join(temp_dir, "out"))
+        dest = os.path.join(temp_dir, "out.zip")
+        entries = write_archive(os.path.join(temp_dir, "out"), dest)
+
+        assert sorted(e.arcname for e in entries) == sorted(files)
+        assert all(e.seconds >= 0 for e in entries)
+        assert not os.path.exists(dest + ".tmp")
+        with zipfile.ZipFile(dest) as z:
+            assert z.testzip() is None
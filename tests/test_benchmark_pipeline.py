@@ -0,0 +1,74 @@
+"""端到端基准测试工具测试"""
+
+
+class TestPercentile:
+    """percentile 函数测试"""
+
+    def test_interpolation(self):
+        from benchmarks.pipeline import percentile
+        samples = [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert percentile(samples, 50) == 3.0
+        assert percentile(samples, 100) == 5.0
+        assert percentile(samples, 95) == 4.8
+
+    def test_empty(self):
+        from benchmarks.pipeline import percentile
+        assert percentile([], 99) == 0.0
+
+
+class TestRunBenchmark:
+    """run_benchmark 测试"""
+
+    def test_replay_run_reports_all_stages(self, temp_dir, capsys):
+        """测试回放模式跑通全部阶段，结束后恢复性能指标的开关"""
+        from app import metrics
+        from benchmarks.corpus import generate_corpus
+        from benchmarks.pipeline import run_benchmark, STAGES
+
+        corpus = f"{temp_dir}/corpus"
+        generate_corpus(corpus, 12, seed=5, scanned_ratio=0)
+        result = run_benchmark(corpus)
+
+        assert result["totals"]["files"] == 12
+        assert list(result["stages"]) == STAGES
+        assert result["stages"]["preprocess"]["samples"] == 12
+        assert result["stages"]["zip"]["bytes_written"] > 0
+        assert result["quality"]["groups_expected"] > 0
+        assert not metrics.is_enabled()
+
+    def test_vision_renders_once(self, temp_dir, monkeypatch):
+        """测试视觉模式下分析阶段使用预处理渲染好的图片，不再渲染第二次"""
+        from benchmarks import pipeline
+        from benchmarks.corpus import generate_corpus
+
+        corpus = f"{temp_dir}/corpus"
+        generate_corpus(corpus, 4, seed=5, scanned_ratio=0)
+        rendered, analyzed = [], []
+
+        def render(file_path):
+            rendered.append(file_path)
+            return [{"type": "image_url", "image_url": {"url": file_path}}]
+
+        class FakeVision:
+            def analyze_images(self, image_contents, file_path):
+                analyzed.append(image_contents[0]["image_url"]["url"])
+                return pipeline._info_from_truth(None, file_path)
+
+        monkeypatch.setattr(pipeline, "file_to_image_content", render)
+        monkeypatch.setattr(pipeline, "get_vision_analyzer", lambda api_key=None: FakeVision())
+        pipeline.run_benchmark(corpus, mode="vision", analyzer="api")
+
+        assert len(rendered) == 4
+        assert analyzed == rendered
+
+    def test_compare_flags_regressions(self):
+        """测试对比结果计算变化百分比"""
+        from benchmarks.pipeline import compare_results
+
+        stage = {"seconds": 1.0, "p50": 0.1, "p95": 0.2, "p99": 0.3, "samples": 10}
+        baseline = {"stages": {"analyze": stage}, "totals": {"peak_rss_kb": 100}}
+        current = {"stages": {"analyze": dict(stage, seconds=1.5)}, "totals": {"peak_rss_kb": 100}}
+
+        rows = compare_results(baseline, current)
+        seconds = next(r for r in rows if r["metric"] == "seconds")
+        assert seconds["change_pct"] == 50.0
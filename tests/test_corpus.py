@@ -0,0 +1,42 @@
+"""合成数据集生成器测试"""
+from pathlib import Path
+
+
+class TestGenerateCorpus:
+    """generate_corpus 测试"""
+
+    def test_exact_count_and_ground_truth(self, temp_dir):
+        """测试生成数量精确且每个文件都有标注"""
+        from benchmarks.corpus import generate_corpus, load_ground_truth
+
+        summary = generate_corpus(temp_dir, 25, seed=7)
+        truth = load_ground_truth(temp_dir)
+
+        assert summary["count"] == 25
+        assert len(truth) == 25
+        for path, record in truth.items():
+            assert Path(path).is_file()
+            assert record["type"] in ("taxi", "train", "flight", "hotel", "meal")
+
+    def test_reproducible(self, temp_dir):
+        """测试相同种子生成相同数据集"""
+        from benchmarks.corpus import generate_corpus
+
+        first = Path(temp_dir) / "a"
+        second = Path(temp_dir) / "b"
+        generate_corpus(str(first), 15, seed=3, scanned_ratio=0.5)
+        generate_corpus(str(second), 15, seed=3, scanned_ratio=0.5)
+
+        assert (first / "ground_truth.jsonl").read_text() == (second / "ground_truth.jsonl").read_text()
+        for f in (first / "docs").rglob("*.*"):
+            assert f.read_bytes() == (second / f.relative_to(first)).read_bytes()
+
+    def test_vouchers_have_matching_invoice(self):
+        """测试凭证都能在同组中找到对应发票"""
+        from benchmarks.corpus import CorpusBuilder
+
+        docs = list(CorpusBuilder(seed=1).iter_documents(200))
+        invoices = {d["group_id"] for d in docs if d["truth"]["is_invoice"]}
+        vouchers = [d for d in docs if not d["truth"]["is_invoice"]]
+        assert vouchers
+        assert all(v["group_id"] in invoices for v in vouchers)
@@ -0,0 +1,214 @@
+"""输出目录索引和增量整理测试"""
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+
+class TestOutputIndex:
+    """OutputIndex 测试"""
+
+    def test_organize_writes_index(self, temp_dir, sample_inputs):
+        """整理后索引记录每个文件的 hash、位置和配对组"""
+        from app.index import OutputIndex, hash_file
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        voucher, invoice = sample_inputs
+        FileOrganizer(str(root / "out")).organize(sample_inputs, progress=lambda *a: None)
+
+        index = OutputIndex(str(root / "out"))
+        assert len(index) == 2
+        assert {e.path for e in index.entries.values()} == {
+            Path(voucher.file_path).relative_to(root / "out").as_posix(),
+            Path(invoice.file_path).relative_to(root / "out").as_posix(),
+        }
+        assert len(index.groups()) == 1
+        assert hash_file(invoice.file_path) in index
+        assert index.open_entries() == []
+
+        info = index.categorized()["打车票"][0]
+        assert info.order_number == "DD202401150001"
+        assert Path(info.file_path).exists()
+
+    def test_identical_files_indexed_separately(self, temp_dir, write_input, sample_invoice_info):
+        """内容相同的两个文件各有一条记录，报表中都在；sync() 不会把它们当成移动过"""
+        from app.index import OutputIndex
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        out = str(root / "out")
+        infos = [write_input(f"in/{day}.pdf", b"same",
+                             replace(sample_invoice_info, order_number="", date=day, service_date=day))
+                 for day in ["2024-01-15", "2024-02-20"]]
+        FileOrganizer(out, copy_mode=True).organize(infos, progress=lambda *a: None)
+
+        index = OutputIndex(out)
+        assert len(index) == 2 and len(index.by_hash) == 1
+        assert len(index.categorized()["打车票"]) == 2
+
+        paths = {e.path for e in index.entries.values()}
+        result = index.sync([(info.file_path, "打车票") for info in infos])
+        assert (len(result.entries), result.moved, result.removed, result.unknown) == (2, 0, 0, [])
+        assert {e.path for e in index.entries.values()} == paths
+
+    def test_invoice_totals(self, temp_dir, sample_inputs):
+        """按分类统计发票张数和金额，凭证不计入"""
+        from app.index import OutputIndex
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        invoice = sample_inputs[1]
+        FileOrganizer(str(root / "out")).organize(sample_inputs, progress=lambda *a: None)
+
+        assert OutputIndex(str(root / "out")).invoice_totals() == {"打车票": (1, invoice.amount)}
+
+    def test_filter_new_skips_known_and_duplicate_files(self, temp_dir, write_input, sample_invoice_info):
+        """已在索引中的文件和重复内容的文件被跳过"""
+        from app.index import OutputIndex
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        old = write_input("in/old.pdf", b"old", sample_invoice_info)
+        FileOrganizer(str(root / "out"), copy_mode=True).organize([old], progress=lambda *a: None)
+
+        files = [write_input("in2/old_again.pdf", b"old"),
+                 write_input("in2/new.pdf", b"new"),
+                 write_input("in2/new_dup.pdf", b"new")]
+        hashes = {}
+        assert OutputIndex(str(root / "out")).filter_new(files, hashes) == [files[1]]
+        assert list(hashes) == [files[1]]
+
+
+class TestIncrementalOrganize:
+    """增量整理测试"""
+
+    def test_new_invoice_pairs_with_existing_voucher(self, temp_dir, write_input, sample_invoice_info,
+                                                     sample_voucher_info):
+        """新发票和输出目录中未配对的凭证配对，其他未配对文件留在原处"""
+        from app.index import OutputIndex
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        out = str(root / "out")
+        voucher = write_input("in/v.pdf", b"voucher", sample_voucher_info)
+        meal = write_input("in/m.pdf", b"meal", replace(
+            sample_invoice_info, type="meal", subtype="海底捞", merchant="海底捞", order_number="", amount=300.0,
+            date="2024-03-01", service_date="2024-03-01"))
+        FileOrganizer(out).organize([voucher, meal], progress=lambda *a: None)
+        old_voucher_path, meal_path = voucher.file_path, meal.file_path
+        assert len(OutputIndex(out).open_entries()) == 2
+
+        invoice = write_input("in2/i.pdf", b"invoice", sample_invoice_info)
+        index = OutputIndex(out)
+        placed = FileOrganizer(out).organize([invoice], progress=lambda *a: None,
+                                             existing=index.open_entries())
+
+        index = OutputIndex(out)
+        assert len(index) == 3
+        assert len(index.open_entries()) == 1
+        assert Path(meal_path).exists()
+        assert not Path(old_voucher_path).exists()
+        assert sum(len(infos) for infos in placed.values()) == 2
+        paired = [g for g in index.groups().values() if len(g) == 2][0]
+        assert {e.info["is_invoice"] for e in paired} == {True, False}
+
+    def test_rollback_restores_index(self, temp_dir, write_input, sample_invoice_info, sample_voucher_info):
+        """回滚增量整理后文件和索引都恢复到整理前"""
+        from app.index import OutputIndex
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        out = str(root / "out")
+        voucher = write_input("in/v.pdf", b"voucher", sample_voucher_info)
+        FileOrganizer(out).organize([voucher], progress=lambda *a: None)
+        voucher_path = voucher.file_path
+        before = (Path(out) / ".index.jsonl").read_bytes()
+
+        invoice = write_input("in2/i.pdf", b"invoice", sample_invoice_info)
+        organizer = FileOrganizer(out, copy_mode=True)
+        organizer.organize([invoice], progress=lambda *a: None, existing=OutputIndex(out).open_entries())
+        assert not Path(voucher_path).exists()
+
+        organizer.rollback()
+        assert Path(voucher_path).exists()
+        assert (Path(out) / ".index.jsonl").read_bytes() == before
+        assert Path(root / "in2" / "i.pdf").exists()
+
+
+class TestReportFromIndex:
+    """重新生成报表时使用索引"""
+
+    def _organize(self, root: Path, infos) -> str:
+        from app.organizer import FileOrganizer
+
+        out = str(root / "out")
+        FileOrganizer(out).organize(infos, progress=lambda *a: None)
+        return out
+
+    def test_scan_uses_index(self, temp_dir, sample_inputs, sample_invoice_info, monkeypatch):
+        """索引中的文件不解析文件名，保留发票号和订单号"""
+        import reimbursement
+
+        out = self._organize(Path(temp_dir), sample_inputs)
+        monkeypatch.setattr(reimbursement, "parse_filename", lambda *a: pytest.fail("不应解析文件名"))
+        categorized = reimbursement.scan_organized_dir(out)
+
+        infos = categorized["打车票"]
+        assert len(infos) == 2
+        assert {i.invoice_number for i in infos} == {sample_invoice_info.invoice_number, ""}
+        assert all(i.order_number == "DD202401150001" for i in infos)
+
+    def test_manual_move_detected_by_hash(self, temp_dir, sample_inputs, sample_invoice_info):
+        """手动移到其他分类的文件按 hash 找回，分类跟随目录"""
+        import reimbursement
+        from app.index import OutputIndex
+
+        out = self._organize(Path(temp_dir), sample_inputs)
+        invoice_entry = [e for e in OutputIndex(out).entries.values() if e.info["is_invoice"]][0]
+        moved_to = Path(out) / "其他" / "手动" / "发票.pdf"
+        moved_to.parent.mkdir(parents=True)
+        (Path(out) / invoice_entry.path).rename(moved_to)
+
+        categorized = reimbursement.scan_organized_dir(out)
+        assert categorized["其他"][0].invoice_number == sample_invoice_info.invoice_number
+
+        index = OutputIndex(out)
+        assert invoice_entry.path not in index.entries
+        assert index.entries["其他/手动/发票.pdf"].category == "其他"
+
+    def test_unknown_files_parsed_and_indexed(self, temp_dir, write_input):
+        """索引中没有的文件从文件名解析，并加入索引"""
+        import reimbursement
+        from app.index import OutputIndex
+
+        out = Path(temp_dir)
+        write_input("餐费/2024-01-15_海底捞_200.00元/2024-01-15_发票_海底捞_200.00元.pdf", b"meal")
+
+        categorized = reimbursement.scan_organized_dir(str(out))
+        assert categorized["餐费"][0].amount == 200.0
+        assert len(OutputIndex(str(out))) == 1
+
+    def test_ai_confirmed_once_when_needed(self, temp_dir, write_input, sample_invoice_info, monkeypatch):
+        """只有文件名里没有金额时才确认是否使用 AI，且只问一次"""
+        import reimbursement
+
+        out = Path(temp_dir)
+        write_input("餐费/2024-01-15_海底捞_200.00元/发票.pdf", b"meal")
+        asked = []
+        categorized = reimbursement.scan_organized_dir(str(out), use_ai=True, confirm_ai=lambda: asked.append(1))
+        assert categorized["餐费"][0].amount == 200.0
+        assert asked == []
+
+        write_input("餐费/无金额/a.pdf", b"a")
+        write_input("餐费/无金额/b.pdf", b"b")
+        analyzed = []
+
+        def fake_analyze(path, category, api_key):
+            analyzed.append(path)
+            return replace(sample_invoice_info, amount=1.0, file_path=path)
+
+        monkeypatch.setattr(reimbursement, "analyze_file_with_ai", fake_analyze)
+        reimbursement.scan_organized_dir(str(out), use_ai=True, confirm_ai=lambda: not asked.append(1))
+        assert asked == [1]
+        assert len(analyzed) == 2
@@ -0,0 +1,110 @@
+"""整理计划与日志测试"""
+import json
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def infos(sample_inputs, write_input, sample_invoice_info):
+    """一对凭证+发票和一张独立发票"""
+    meal = replace(sample_invoice_info, type="meal", merchant="海底捞", order_number="", amount=200.0,
+                   invoice_number="9")
+    return sample_inputs + [write_input("in/meal.pdf", b"meal", meal)]
+
+
+class TestOrganizePlan:
+    """plan() 测试"""
+
+    def test_plan_has_no_side_effects(self, temp_dir, infos):
+        """计划阶段不创建目录、不移动文件"""
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        organizer = FileOrganizer(str(root / "out"))
+        plan = organizer.plan(infos)
+
+        assert len(plan.moves) == 3
+        assert all(Path(m.src).exists() for m in plan.moves)
+        assert not any(folder.exists() for folder in plan.folders)
+        assert not (root / "out" / ".organize_journal.jsonl").exists()
+
+    def test_plan_resolves_duplicate_names(self, temp_dir, write_input, sample_invoice_info):
+        """计划内重名的文件加序号"""
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        infos = [write_input(f"dup_{i}.pdf", b"x", replace(sample_invoice_info, order_number=""))
+                 for i in range(3)]
+        plan = FileOrganizer(str(root / "out")).plan(infos)
+
+        targets = [m.dst for m in plan.moves]
+        assert len(set(targets)) == 3
+
+
+class TestJournal:
+    """execute() / resume() / rollback() 测试"""
+
+    def test_execute_writes_committed_journal(self, temp_dir, infos):
+        """执行完成后日志以 commit 结尾"""
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        organizer = FileOrganizer(str(root / "out"))
+        organizer.execute(organizer.plan(infos), progress=lambda *a: None)
+
+        records = [json.loads(line) for line in (root / "out" / ".organize_journal.jsonl").read_text().splitlines()]
+        assert records[0]["type"] == "plan"
+        assert [r["type"] for r in records[1:]] == ["done", "done", "done", "commit"]
+        assert all(Path(info.file_path).exists() for info in infos)
+
+    def test_resume_after_crash(self, temp_dir, infos):
+        """中途失败后 resume 放置剩余文件，未完成时不允许开始新的整理"""
+        from app.journal import JournalError
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        organizer = FileOrganizer(str(root / "out"), workers=1)
+        plan = organizer.plan(infos)
+
+        def crash(done, total, result):
+            if done == 2:
+                raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            organizer.execute(plan, progress=crash)
+        with pytest.raises(JournalError):
+            organizer.execute(organizer.plan([]), progress=lambda *a: None)
+
+        assert organizer.resume(progress=lambda *a: None) == 1
+        assert all(m.dst.exists() for m in plan.moves)
+        assert not any(Path(m.src).exists() for m in plan.moves)
+
+    def test_rollback_move(self, temp_dir, infos):
+        """回滚把移动的文件移回原处并删除空目录"""
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        sources = [info.file_path for info in infos]
+        organizer = FileOrganizer(str(root / "out"))
+        plan = organizer.plan(infos)
+        organizer.execute(plan, progress=lambda *a: None)
+
+        assert organizer.rollback() == 3
+        assert all(Path(src).exists() for src in sources)
+        assert not any(folder.exists() for folder in plan.folders)
+        assert organizer.rollback() == 0
+
+    def test_rollback_copy(self, temp_dir, infos):
+        """复制模式回滚删除复制出的文件"""
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        organizer = FileOrganizer(str(root / "out"), copy_mode=True)
+        plan = organizer.plan(infos)
+        organizer.execute(plan, progress=lambda *a: None)
+
+        assert organizer.rollback() == 3
+        assert all(Path(m.src).exists() for m in plan.moves)
+        assert not any(m.dst.exists() for m in plan.moves)
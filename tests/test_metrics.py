@@ -0,0 +1,191 @@
+"""性能指标模块测试"""
+import pytest
+
+
+@pytest.fixture
+def enabled_metrics():
+    """开启指标收集，测试结束后恢复"""
+    from app import metrics
+    was_enabled = metrics.is_enabled()
+    metrics.enable()
+    metrics.reset()
+    yield metrics
+    metrics.reset()
+    if not was_enabled:
+        metrics.disable()
+
+
+class TestHistogram:
+    """Histogram 测试"""
+
+    def test_count_sum_and_bounds(self):
+        from app.metrics import Histogram
+        h = Histogram(buckets=(1.0, 2.0, 5.0))
+        for value in (0.5, 1.5, 1.5, 4.0):
+            h.observe(value)
+        assert h.count == 4
+        assert h.sum == 7.5
+        assert h.min == 0.5
+        assert h.max == 4.0
+        assert h.to_dict()["buckets"] == [[1.0, 1], [2.0, 3], [5.0, 4]]
+
+    def test_percentile_within_observed_range(self):
+        from app.metrics import Histogram
+        h = Histogram()
+        for i in range(1, 101):
+            h.observe(i / 1000)
+        assert 0.001 <= h.percentile(50) <= 0.1
+        assert h.percentile(99) <= 0.1
+        assert h.percentile(50) <= h.percentile(95) <= h.percentile(99)
+
+
+class TestMetrics:
+    """模块级接口测试"""
+
+    def test_disabled_records_nothing(self):
+        """测试关闭时不记录任何指标"""
+        from app import metrics
+        was_enabled = metrics.is_enabled()
+        metrics.disable()
+        metrics.reset()
+        try:
+            with metrics.timer("ocr.render"):
+                pass
+            metrics.inc("api_requests", status=200)
+            snap = metrics.snapshot()
+            assert snap["histograms"] == {}
+            assert snap["counters"] == {}
+        finally:
+            if was_enabled:
+                metrics.enable()
+
+    def test_timer_records_stage(self, enabled_metrics):
+        with enabled_metrics.timer("ocr.render"):
+            pass
+        with enabled_metrics.timer("ocr.render"):
+            pass
+        stages = enabled_metrics.snapshot()["histograms"][enabled_metrics.STAGE_HISTOGRAM]
+        assert stages[0]["labels"] == {"stage": "ocr.render"}
+        assert stages[0]["count"] == 2
+
+    def test_counter_labels(self, enabled_metrics):
+        enabled_metrics.inc("api_requests", model="vision", status=200)
+        enabled_metrics.inc("api_requests", model="vision", status=200)
+        enabled_metrics.inc("api_requests", model="vision", status=429)
+        series = enabled_metrics.snapshot()["counters"]["api_requests"]
+        values = {item["labels"]["status"]: item["value"] for item in series}
+        assert values == {"200": 2, "429": 1}
+
+    def test_format_summary(self, enabled_metrics):
+        with enabled_metrics.timer("report.save"):
+            pass
+        enabled_metrics.inc("files_placed", mode="copy")
+        summary = enabled_metrics.format_summary()
+        assert "report.save" in summary
+        assert "files_placed{mode=copy}" in summary
+
+    def test_organizer_records_pairing(self, enabled_metrics, temp_dir, sample_invoice_info):
+        """测试整理流程记录配对和文件操作耗时"""
+        import os
+        from app.organizer import FileOrganizer
+
+        src = os.path.join(temp_dir, "in.pdf")
+        with open(src, "wb") as f:
+            f.write(b"%PDF")
+        sample_invoice_info.file_path = src
+        FileOrganizer(os.path.join(temp_dir, "out"), copy_mode=True).organize([sample_invoice_info])
+
+        stages = {h["labels"]["stage"] for h in enabled_metrics.snapshot()["histograms"]["stage_seconds"]}
+        assert {"organizer.pairing", "organizer.file_io"} <= stages
+
+
+class TestPrometheus:
+    """Prometheus 文本格式测试"""
+
+    def test_counters_and_derived_series(self, enabled_metrics):
+        enabled_metrics.inc("api_requests", model="text", status=200)
+        enabled_metrics.inc("api_requests", model="text", status=503)
+        enabled_metrics.inc("cache_requests", cache="result", result="hit")
+        enabled_metrics.inc("cache_requests", cache="result", result="hit")
+        enabled_metrics.inc("cache_requests", cache="result", result="hit")
+        enabled_metrics.inc("cache_requests", cache="result", result="miss")
+        text = enabled_metrics.render_prometheus()
+
+        assert "# TYPE reimbursement_api_requests_total counter" in text
+        assert 'reimbursement_api_requests_total{model="text",status="200"} 1' in text
+        assert 'reimbursement_api_errors_total{model="text",status="503"} 1' in text
+        assert 'reimbursement_cache_hit_ratio{cache="result"} 0.75' in text
+
+    def test_histogram_buckets_are_cumulative(self, enabled_metrics):
+        enabled_metrics.observe("stage_seconds", 0.003, stage="ocr.render")
+        enabled_metrics.observe("stage_seconds", 2.0, stage="ocr.render")
+        lines = enabled_metrics.render_prometheus().splitlines()
+
+        assert 'reimbursement_stage_seconds_bucket{le="0.005",stage="ocr.render"} 1' in lines
+        assert 'reimbursement_stage_seconds_bucket{le="+Inf",stage="ocr.render"} 2' in lines
+        assert 'reimbursement_stage_seconds_count{stage="ocr.render"} 2' in lines
+
+    def test_extra_gauges_and_label_escaping(self, enabled_metrics):
+        text = enabled_metrics.render_prometheus({
+            "queue_depth": 3,
+            "tasks": [({"status": 'a"b'}, 2)],
+        })
+        assert "reimbursement_queue_depth 3" in text
+        assert 'reimbursement_tasks{status="a\\"b"} 2' in text
+
+    def test_web_metrics_endpoint(self, enabled_metrics, no_maintenance):
+        """测试 Web 应用的 /metrics 接口"""
+        from web_app import app
+
+        response = app.test_client().get("/metrics")
+        assert response.status_code == 200
+        assert response.content_type.startswith("text/plain; version=0.0.4")
+        body = response.get_data(as_text=True)
+        assert "reimbursement_queue_depth 0" in body
+        assert "reimbursement_ocr_pool_size 1" in body
+
+    def test_web_metrics_with_external_worker(self, enabled_metrics, no_maintenance, monkeypatch):
+        """任务由 worker 进程处理时，Web 进程不导出本进程的工作线程 / OCR 指标"""
+        import web_app
+
+        monkeypatch.setattr(web_app, "EXTERNAL_WORKER", True)
+        body = web_app.app.test_client().get("/metrics").get_data(as_text=True)
+        assert "reimbursement_queue_depth 0" in body
+        assert "reimbursement_workers_busy" not in body
+        assert "reimbursement_ocr_pool_size" not in body
+
+    def test_ocr_pool_utilisation_counts_slots(self, enabled_metrics, monkeypatch):
+        """OCR 占用率按 CPU 名额计算，同一步骤的渲染和 OCR 计量不重复计入"""
+        from app import tasks
+        from app.scheduler import JobScheduler
+
+        scheduler = JobScheduler(workers=2, cpu_slots=2)
+        monkeypatch.setattr(tasks, "scheduler", scheduler)
+        assert tasks.processing_gauges()["ocr_pool_utilisation"] == 0
+        with scheduler.cpu_slot():
+            enabled_metrics.add_gauge("ocr_inflight", 1, kind="render")
+            enabled_metrics.add_gauge("ocr_inflight", 1, kind="ocr")
+            assert tasks.processing_gauges()["ocr_pool_utilisation"] == 0.5
+        assert tasks.processing_gauges()["ocr_pool_utilisation"] == 0
+
+    def test_temp_disk_measured_per_maintenance_pass(self, enabled_metrics, no_maintenance, tmp_path):
+        """临时文件大小在维护时统计，抓取 /metrics 时不遍历目录"""
+        from app import tasks
+        from web_app import app
+
+        temp_dir = tmp_path / "upload"
+        temp_dir.mkdir()
+        (temp_dir / "a.pdf").write_bytes(b"x" * 10)
+        task_id = "disk-usage"
+        tasks.task_manager.add(task_id, {"status": "completed", "temp_dir": str(temp_dir)})
+        try:
+            tasks.measure_temp_disk()
+            assert tasks.temp_disk_bytes()["input"] >= 10
+            (temp_dir / "b.pdf").write_bytes(b"x" * 5)
+            before = tasks.temp_disk_bytes()["input"]
+            body = app.test_client().get("/metrics").get_data(as_text=True)
+            assert f'reimbursement_temp_disk_bytes{{kind="input"}} {before}' in body
+            tasks.measure_temp_disk()
+            assert tasks.temp_disk_bytes()["input"] == before + 5
+        finally:
+            tasks.task_manager.remove(task_id)
@@ -0,0 +1,107 @@
+"""模拟 API 服务测试"""
+import json
+import random
+import pytest
+
+
+def _post(client, payload, auth=True):
+    headers = {"Authorization": "Bearer sk-test"} if auth else {}
+    return client.post("/v1/chat/completions", json=payload, headers=headers)
+
+
+def _text_payload(text, **extra):
+    payload = {
+        "model": "mock-text",
+        "messages": [
+            {"role": "system", "content": "prompt"},
+            {"role": "user", "content": f"请分析以下发票内容：\n\n{text}"},
+        ],
+    }
+    payload.update(extra)
+    return payload
+
+
+class TestParseLatency:
+    """延迟分布解析测试"""
+
+    def test_fixed(self):
+        from benchmarks.mock_api import parse_latency
+        assert parse_latency("fixed:0.25", random.Random(1))() == 0.25
+
+    def test_uniform_in_range(self):
+        from benchmarks.mock_api import parse_latency
+        sample = parse_latency("uniform:0.1,0.2", random.Random(1))
+        assert all(0.1 <= sample() <= 0.2 for _ in range(100))
+
+    def test_invalid_spec_raises(self):
+        from benchmarks.mock_api import parse_latency
+        with pytest.raises(ValueError):
+            parse_latency("gamma:1,2", random.Random(1))
+
+
+class TestChatCompletions:
+    """/v1/chat/completions 测试"""
+
+    def test_invoice_json_derived_from_text(self):
+        """测试返回的 JSON 来自请求中的 OCR 文字"""
+        from benchmarks.mock_api import create_app, MockConfig
+        from app.analyzer import _extract_json_from_response
+
+        client = create_app(MockConfig()).test_client()
+        text = "滴滴出行 电子发票 发票号码：12345678 价税合计：¥35.50 订单号：DD2024 乘车日期：2024-01-15"
+        response = _post(client, _text_payload(text))
+
+        assert response.status_code == 200
+        content = response.get_json()["choices"][0]["message"]["content"]
+        result = _extract_json_from_response(content)
+        assert result["type"] == "taxi"
+        assert result["amount"] == 35.50
+        assert result["order_number"] == "DD2024"
+        assert result["service_date"] == "2024-01-15"
+        assert result["is_invoice"] is True
+
+    def test_vision_request_is_deterministic(self):
+        """测试同一张图片总是得到相同结果"""
+        from benchmarks.mock_api import create_app, MockConfig
+
+        client = create_app(MockConfig()).test_client()
+        payload = {"messages": [{"role": "user", "content": [
+            {"type": "text", "text": "请分析这张发票/凭证图片："},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}},
+        ]}]}
+        first = _post(client, payload).get_json()["choices"][0]["message"]["content"]
+        second = _post(client, payload).get_json()["choices"][0]["message"]["content"]
+        assert first == second
+        assert json.loads(first)["amount"] > 0
+
+    def test_missing_auth_returns_401(self):
+        from benchmarks.mock_api import create_app, MockConfig
+        client = create_app(MockConfig()).test_client()
+        assert _post(client, _text_payload("x"), auth=False).status_code == 401
+
+    def test_rate_limit_injection(self):
+        """测试 429 注入带 Retry-After"""
+        from benchmarks.mock_api import create_app, MockConfig
+        client = create_app(MockConfig(rate_429=1.0, retry_after=7)).test_client()
+        response = _post(client, _text_payload("金额：10元"))
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "7"
+
+    def test_server_error_injection(self):
+        from benchmarks.mock_api import create_app, MockConfig
+        client = create_app(MockConfig(rate_5xx=1.0)).test_client()
+        assert _post(client, _text_payload("金额：10元")).status_code in (500, 502, 503)
+
+    def test_streaming_response(self):
+        """测试流式输出拼接后是完整的 JSON"""
+        from benchmarks.mock_api import create_app, MockConfig
+        client = create_app(MockConfig(stream_chunk=5)).test_client()
+        response = _post(client, _text_payload("餐厅 金额：88.00元", stream=True))
+
+        lines = [l for l in response.get_data(as_text=True).split("\n\n") if l]
+        assert lines[-1] == "data: [DONE]"
+        content = "".join(
+            json.loads(l[len("data: "):])["choices"][0]["delta"].get("content", "")
+            for l in lines[:-1]
+        )
+        assert json.loads(content)["amount"] == 88.0
@@ -0,0 +1,54 @@
+"""文件名分配模块测试"""
+from pathlib import Path
+
+
+class TestNameAllocator:
+    """NameAllocator 测试"""
+
+    def test_existing_files_not_reused(self, temp_dir):
+        """输出目录中已有的文件名加序号"""
+        from app.naming import NameAllocator
+
+        folder = Path(temp_dir) / "餐费" / "2024-01-15_海底捞_200.00元"
+        folder.mkdir(parents=True)
+        (folder / "发票.pdf").write_bytes(b"old")
+        (folder / "发票_1.pdf").write_bytes(b"old")
+
+        allocator = NameAllocator(temp_dir)
+        assert allocator.allocate(folder, "发票.pdf") == folder / "发票_2.pdf"
+        assert allocator.allocate(folder, "凭证.pdf") == folder / "凭证.pdf"
+
+    def test_repeated_names_get_increasing_counters(self, temp_dir):
+        """同名文件依次分配 _1, _2, _3"""
+        from app.naming import NameAllocator
+
+        folder = Path(temp_dir) / "打车票"
+        allocator = NameAllocator(temp_dir)
+        names = [allocator.allocate(folder, "a.pdf").name for _ in range(4)]
+        assert names == ["a.pdf", "a_1.pdf", "a_2.pdf", "a_3.pdf"]
+
+    def test_case_insensitive(self, temp_dir):
+        """大小写不同视为重名"""
+        from app.naming import NameAllocator
+
+        folder = Path(temp_dir)
+        (folder / "Receipt.PDF").write_bytes(b"x")
+        allocator = NameAllocator(temp_dir)
+        assert allocator.allocate(folder, "receipt.pdf") == folder / "receipt_1.pdf"
+
+    def test_organize_does_not_overwrite(self, temp_dir, sample_invoice_info):
+        """两张生成相同文件名的发票都被保留"""
+        from dataclasses import replace
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        infos = []
+        for i in range(2):
+            path = root / f"in_{i}.pdf"
+            path.write_bytes(f"content-{i}".encode())
+            infos.append(replace(sample_invoice_info, file_path=str(path), order_number=""))
+
+        organizer = FileOrganizer(str(root / "out"), copy_mode=True)
+        organizer.organize(infos, progress=lambda *a: None)
+        contents = sorted(Path(info.file_path).read_bytes() for info in infos)
+        assert contents == [b"content-0", b"content-1"]
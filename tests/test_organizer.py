@@ -38,19 +38,6 @@ class TestFileOrganizer:
         # 测试移除多余空格
         assert organizer._sanitize_filename("test  file") == "test file"
 
-    def test_normalize_merchant(self, temp_dir):
-        """测试商家名称标准化"""
-        from app.organizer import FileOrganizer
-        organizer = FileOrganizer(temp_dir)
-
-        # 测试移除后缀
-        assert organizer._normalize_merchant("滴滴出行科技有限公司") == "滴滴出行"
-        assert organizer._normalize_merchant("如家（北京）酒店") == "如家北京酒店"
-
-        # 测试空值处理
-        assert organizer._normalize_merchant("") == ""
-        assert organizer._normalize_merchant(None) == ""
-
 
 class TestPairVouchersAndInvoices:
     """配对凭证和发票测试"""
@@ -101,48 +88,6 @@ class TestPairVouchersAndInvoices:
         assert pairs[0][0].is_invoice is True
 
 
-class TestCalculateMatchScore:
-    """匹配分数计算测试"""
-
-    def test_order_number_match_high_score(self, temp_dir, sample_invoice_info, sample_voucher_info):
-        """测试订单号匹配得高分"""
-        from app.organizer import FileOrganizer
-
-        organizer = FileOrganizer(temp_dir, copy_mode=True)
-
-        sample_invoice_info.order_number = "ORDER123"
-        sample_voucher_info.order_number = "ORDER123"
-
-        score = organizer._calculate_match_score(sample_voucher_info, sample_invoice_info)
-        assert score >= 10  # 订单号匹配应该得到高分
-
-    def test_amount_match_adds_score(self, temp_dir, sample_invoice_info, sample_voucher_info):
-        """测试金额匹配增加分数"""
-        from app.organizer import FileOrganizer
-
-        organizer = FileOrganizer(temp_dir, copy_mode=True)
-
-        sample_invoice_info.order_number = ""
-        sample_voucher_info.order_number = ""
-        sample_invoice_info.amount = 100.0
-        sample_voucher_info.amount = 100.0
-
-        score = organizer._calculate_match_score(sample_voucher_info, sample_invoice_info)
-        assert score >= 3  # 金额完全匹配应该得到分数
-
-    def test_type_match_adds_score(self, temp_dir, sample_invoice_info, sample_voucher_info):
-        """测试类型匹配增加分数"""
-        from app.organizer import FileOrganizer
-
-        organizer = FileOrganizer(temp_dir, copy_mode=True)
-
-        sample_invoice_info.type = "taxi"
-        sample_voucher_info.type = "taxi"
-
-        score = organizer._calculate_match_score(sample_voucher_info, sample_invoice_info)
-        assert score >= 1  # 类型匹配应该增加分数
-
-
 class TestGenerateFilename:
     """文件名生成测试"""
 
@@ -0,0 +1,259 @@
+"""配对引擎测试"""
+import random
+
+
+def _info(is_invoice, **fields):
+    from app.analyzer import InvoiceInfo
+    values = dict(type="taxi", subtype="滴滴出行", amount=35.5, date="2024-01-15", service_date="",
+                  merchant="", invoice_number="", description="", raw_text="", file_path="",
+                  order_number="")
+    values.update(fields)
+    return InvoiceInfo(is_invoice=is_invoice, **values)
+
+
+def _random_info(rng):
+    """取值范围很小的随机文档，尽量制造同分、边界金额、空字段和无效日期"""
+    return _info(
+        rng.random() < 0.5,
+        type=rng.choice(["taxi", "hotel", "meal"]),
+        subtype=rng.choice(["滴滴出行", "滴滴出行科技有限公司", "高德", "", None]),
+        amount=rng.choice([0.0, -1.0, 10.0, 10.1, 10.5, 9.9, 99.0, 100.0, 101.0, 104.9, 105.3,
+                           round(rng.uniform(5, 200), 2)]),
+        date=rng.choice(["2024-01-01", "2024-01-02", "2024-1-3", "2024-01-05", "", "bad"]),
+        service_date=rng.choice(["", "2024-01-01", "2024-01-02", "2024-01-04"]),
+        merchant=rng.choice(["A公司", "A", "B", "", None]),
+        order_number=rng.choice(["", "", "", "o1", "o2"]),
+    )
+
+
+def _ids(groups):
+    return [[id(info) for info in group] for group in groups]
+
+
+class TestMatchScore:
+    """匹配分数计算测试"""
+
+    @staticmethod
+    def _score(voucher, invoice):
+        from app.pairing import DocKey, match_score
+        return match_score(DocKey.from_info(voucher), DocKey.from_info(invoice))
+
+    def test_normalize_merchant(self):
+        """测试商家名称标准化"""
+        from app.pairing import normalize_merchant
+
+        # 测试移除后缀
+        assert normalize_merchant("滴滴出行科技有限公司") == "滴滴出行"
+        assert normalize_merchant("如家（北京）酒店") == "如家北京酒店"
+
+        # 测试空值处理
+        assert normalize_merchant("") == ""
+        assert normalize_merchant(None) == ""
+
+    def test_order_number_match_high_score(self, sample_invoice_info, sample_voucher_info):
+        """测试订单号匹配得高分"""
+        sample_invoice_info.order_number = "ORDER123"
+        sample_voucher_info.order_number = "ORDER123"
+        assert self._score(sample_voucher_info, sample_invoice_info) >= 10
+
+    def test_amount_match_adds_score(self, sample_invoice_info, sample_voucher_info):
+        """测试金额匹配增加分数"""
+        sample_invoice_info.order_number = ""
+        sample_voucher_info.order_number = ""
+        sample_invoice_info.amount = 100.0
+        sample_voucher_info.amount = 100.0
+        assert self._score(sample_voucher_info, sample_invoice_info) >= 3
+
+    def test_type_match_adds_score(self, sample_invoice_info, sample_voucher_info):
+        """测试类型匹配增加分数"""
+        sample_invoice_info.type = "taxi"
+        sample_voucher_info.type = "taxi"
+        assert self._score(sample_voucher_info, sample_invoice_info) >= 1
+
+
+class TestPairingEngine:
+    """pair_documents 测试"""
+
+    def test_same_result_as_brute_force(self):
+        """测试随机数据上与逐一比较的贪心配对结果完全一致"""
+        from app.pairing import pair_documents
+        from benchmarks.pairing import brute_force_pairs
+
+        for seed in range(300):
+            rng = random.Random(seed)
+            infos = [_random_info(rng) for _ in range(rng.randint(1, 40))]
+            assert _ids(pair_documents(infos)) == _ids(brute_force_pairs(infos)), seed
+
+    def test_same_result_on_corpus(self):
+        """测试合成数据集上与逐一比较结果一致"""
+        from app.pairing import pair_documents
+        from benchmarks.pairing import brute_force_pairs, build_documents
+
+        infos, _ = build_documents(600, seed=7, noise=0.5)
+        expected = brute_force_pairs(infos)
+        assert _ids(pair_documents(infos)) == _ids(expected)
+
+    def test_order_number_wins(self):
+        """测试订单号相同的发票优先于其他条件都匹配的发票"""
+        from app.pairing import pair_documents
+        voucher = _info(False, order_number="A1")
+        exact = _info(True)
+        by_order = _info(True, subtype="其他", amount=999.0, date="2023-01-01", order_number="A1")
+        groups = pair_documents([voucher, exact, by_order])
+        assert groups[0] == [voucher, by_order]
+        assert groups[1] == [exact]
+
+    def test_tie_goes_to_earlier_invoice(self):
+        from app.pairing import pair_documents
+        first, second = _info(True), _info(True)
+        voucher = _info(False)
+        groups = pair_documents([voucher, first, second])
+        assert groups[0][1] is first
+        assert groups[1] == [second]
+
+    def test_low_score_not_paired(self):
+        """测试只有类型相同（1 分）时不配对"""
+        from app.pairing import pair_documents
+        voucher = _info(False, subtype="甲", merchant="甲", amount=10.0, date="2024-01-01")
+        invoice = _info(True, subtype="乙", merchant="乙", amount=500.0, date="2024-06-01")
+        assert pair_documents([voucher, invoice]) == [[voucher], [invoice]]
+
+
+class TestOptimalPairing:
+    """全局最优配对测试"""
+
+    def test_early_voucher_does_not_steal_better_match(self):
+        """测试先处理的凭证不会抢走后面凭证更合适的发票"""
+        from app.pairing import pair_documents
+        # 凭证 A 与发票 X 只差 2%（1 分），与发票 Y 完全一致；凭证 B 与 Y 完全一致，与 X 无关
+        x = _info(True, amount=102.0, date="2024-01-10", file_path="x.pdf")
+        y = _info(True, amount=100.0, date="2024-01-10", file_path="y.pdf")
+        a = _info(False, amount=100.0, date="2024-01-10", file_path="a.pdf")
+        b = _info(False, amount=100.0, date="2024-01-10", order_number="Y1", file_path="b.pdf")
+        y.order_number = "Y1"
+
+        greedy = pair_documents([a, b, x, y])
+        assert greedy[0] == [a, y]
+
+        optimal = pair_documents([a, b, x, y], mode="optimal")
+        assert [a, x] in optimal and [b, y] in optimal
+
+    def test_result_independent_of_file_order(self):
+        from app.pairing import pair_documents
+        from benchmarks.pairing import build_documents
+
+        infos, _ = build_documents(400, seed=3, noise=0.6)
+        shuffled = infos[:]
+        random.Random(1).shuffle(shuffled)
+
+        def pairs(groups):
+            return sorted(tuple(sorted(i.file_path for i in g)) for g in groups)
+
+        assert pairs(pair_documents(infos, mode="optimal")) == pairs(pair_documents(shuffled, mode="optimal"))
+
+    def test_hungarian_is_optimal(self):
+        """测试匈牙利算法与枚举结果一致"""
+        import itertools
+        from app.pairing import _hungarian
+
+        for seed in range(100):
+            rng = random.Random(seed)
+            rows, cols = rng.randint(1, 4), rng.randint(4, 5)
+            weights = [[rng.choice([0, 0, 2, 3, 5, 10, 13]) for _ in range(cols)] for _ in range(rows)]
+            assignment = _hungarian(weights)
+            total = sum(weights[r][c] for r, c in enumerate(assignment) if c >= 0)
+            best = max(sum(weights[r][p[r]] for r in range(rows))
+                       for p in itertools.permutations(range(cols), rows))
+            assert total == best
+
+    def test_unknown_mode_raises(self, temp_dir):
+        import pytest
+        from app.organizer import FileOrganizer
+        with pytest.raises(ValueError):
+            FileOrganizer(temp_dir, pairing="fastest")
+
+
+class TestGroupManyToOne:
+    """多对一分组测试"""
+
+    def _hotel(self):
+        invoice = _info(True, type="hotel", subtype="如家酒店", merchant="如家酒店管理有限公司",
+                        amount=1000.0, date="2024-03-05", service_date="2024-03-01", file_path="inv.pdf")
+        folios = [
+            _info(False, type="hotel", subtype="如家酒店", merchant="如家酒店管理有限公司", amount=amount,
+                  date=f"2024-03-0{day}", service_date=f"2024-03-0{day}", file_path=f"folio{day}.pdf")
+            for day, amount in ((1, 300.0), (2, 320.5), (3, 379.5))
+        ]
+        return invoice, folios
+
+    def test_nightly_folios_grouped_with_invoice(self):
+        """测试按晚出具的水单按金额之和归到发票"""
+        from app.pairing import pair_documents
+        invoice, folios = self._hotel()
+        groups = pair_documents(folios + [invoice], group_multi=True)
+        assert groups == [folios + [invoice]]
+
+    def test_disabled_by_default(self):
+        from app.pairing import pair_documents
+        invoice, folios = self._hotel()
+        groups = pair_documents(folios + [invoice])
+        assert all(len(g) <= 2 for g in groups)
+        assert sum(len(g) for g in groups) == 4
+
+    def test_unrelated_vouchers_not_grouped(self):
+        """测试其他商家、超出日期范围或订单号不同的凭证不参与分组"""
+        from app.pairing import pair_documents
+        invoice, folios = self._hotel()
+        folios[1].subtype = folios[1].merchant = "汉庭酒店"
+        groups = pair_documents(folios + [invoice], group_multi=True)
+        assert all(len(g) <= 2 for g in groups)
+
+        invoice, folios = self._hotel()
+        invoice.order_number = "H1"
+        folios[0].order_number = "H2"
+        groups = pair_documents(folios + [invoice], group_multi=True)
+        assert all(len(g) <= 2 for g in groups)
+
+    def test_firm_pairs_kept(self):
+        """测试金额和日期都对得上的配对不会被拆开"""
+        from app.pairing import group_many_to_one
+        invoice, folios = self._hotel()
+        exact = _info(False, type="hotel", subtype="如家酒店", amount=1000.0, date="2024-03-01",
+                      file_path="exact.pdf")
+        groups = group_many_to_one([[exact, invoice], [folios[0]], [folios[1]], [folios[2]]])
+        assert groups[0] == [exact, invoice]
+
+    def test_subset_sum_requires_two_items(self):
+        from app.pairing import _subset_sum
+        assert _subset_sum([500, 300, 200], 500, 500) == [1, 2]
+        assert _subset_sum([500, 700], 500, 500) is None
+
+    def test_tiny_invoice_amounts(self):
+        """测试金额在误差范围内的小额（或 0 元）发票不会出错"""
+        from app.pairing import _subset_sum, pair_documents
+        assert _subset_sum([2, 3], -4, 6) == [0, 1]
+        assert _subset_sum([2, 3], -5, 0) is None
+
+        for amount in (0.01, 0.0):
+            invoice = _info(True, type="hotel", subtype="如家酒店", amount=amount, date="2024-03-01")
+            vouchers = [_info(False, type="hotel", subtype="如家酒店", amount=value, date="2024-03-01",
+                              file_path=f"{value}.pdf") for value in (0.02, 0.03)]
+            groups = pair_documents(vouchers + [invoice], group_multi=True)
+            assert sum(len(g) for g in groups) == 3
+
+    def test_organizer_places_group_in_one_folder(self, temp_dir):
+        """测试整理时多对一分组放在同一个文件夹"""
+        import os
+        from pathlib import Path
+        from app.organizer import FileOrganizer
+
+        invoice, folios = self._hotel()
+        for info in folios + [invoice]:
+            info.file_path = os.path.join(temp_dir, info.file_path)
+            Path(info.file_path).write_bytes(b"%PDF")
+
+        output = os.path.join(temp_dir, "out")
+        categorized = FileOrganizer(output, copy_mode=True, group_multi=True).organize(folios + [invoice])
+        folders = {Path(info.file_path).parent for info in categorized["住宿费"]}
+        assert len(folders) == 1
+        assert folders.pop().name == "2024-03-01_如家酒店_1000.00元"
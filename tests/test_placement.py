@@ -0,0 +1,106 @@
+"""文件放置模块测试"""
+import os
+from pathlib import Path
+
+
+class TestPlacementEngine:
+    """测试 PlacementEngine"""
+
+    def _make_files(self, root: Path, count: int):
+        src_dir = Path(root) / "src"
+        src_dir.mkdir()
+        files = []
+        for i in range(count):
+            path = src_dir / f"doc_{i}.pdf"
+            path.write_bytes(f"content-{i}".encode() * (i + 1))
+            files.append(path)
+        return files
+
+    def test_copy_preserves_content_and_order(self, temp_dir):
+        """复制后内容一致，结果顺序与任务顺序一致"""
+        from app.placement import PlacementEngine
+
+        files = self._make_files(temp_dir, 20)
+        out = Path(temp_dir) / "out"
+        out.mkdir()
+        jobs = [(str(f), out / f"new_{i}.pdf") for i, f in enumerate(files)]
+        results = PlacementEngine(copy_mode=True, workers=4).place_all(jobs)
+
+        assert [r.dst for r in results] == [dst for _, dst in jobs]
+        for (src, dst), result in zip(jobs, results):
+            assert Path(src).exists()
+            assert dst.read_bytes() == Path(src).read_bytes()
+            assert result.method in {"reflink", "copy_file_range", "sendfile", "copyfile"}
+
+    def test_move(self, temp_dir):
+        """移动后源文件不存在"""
+        from app.placement import PlacementEngine
+
+        files = self._make_files(temp_dir, 5)
+        contents = [f.read_bytes() for f in files]
+        out = Path(temp_dir) / "out"
+        out.mkdir()
+        jobs = [(str(f), out / f.name) for f in files]
+        results = PlacementEngine(copy_mode=False, workers=3).place_all(jobs)
+
+        for f, content, result in zip(files, contents, results):
+            assert not f.exists()
+            assert result.dst.read_bytes() == content
+
+    def test_existing_target_not_overwritten(self, temp_dir):
+        """目标已存在时加序号，不覆盖已有文件"""
+        from app.placement import PlacementEngine
+
+        files = self._make_files(temp_dir, 3)
+        out = Path(temp_dir) / "out"
+        out.mkdir()
+        (out / "same.pdf").write_bytes(b"existing")
+        jobs = [(str(f), out / "same.pdf") for f in files]
+        results = PlacementEngine(copy_mode=True, workers=3).place_all(jobs)
+
+        assert (out / "same.pdf").read_bytes() == b"existing"
+        assert sorted(r.dst.name for r in results) == ["same_1.pdf", "same_2.pdf", "same_3.pdf"]
+        assert sorted(r.dst.read_bytes() for r in results) == sorted(f.read_bytes() for f in files)
+
+    def test_progress_callback(self, temp_dir):
+        """每个文件调用一次进度回调"""
+        from app.placement import PlacementEngine
+
+        files = self._make_files(temp_dir, 6)
+        out = Path(temp_dir) / "out"
+        out.mkdir()
+        calls = []
+        PlacementEngine(copy_mode=True, workers=2).place_all(
+            [(str(f), out / f.name) for f in files],
+            lambda done, total, result: calls.append((done, total, result.dst.name)),
+        )
+
+        assert [c[0] for c in calls] == list(range(1, 7))
+        assert all(c[1] == 6 for c in calls)
+        assert sorted(c[2] for c in calls) == sorted(f.name for f in files)
+
+    def test_hardlink(self, temp_dir):
+        """开启硬链接时同一文件系统上共享 inode"""
+        from app.placement import PlacementEngine
+
+        files = self._make_files(temp_dir, 1)
+        out = Path(temp_dir) / "out"
+        out.mkdir()
+        result = PlacementEngine(copy_mode=True, hardlink=True).place(str(files[0]), out / "link.pdf")
+
+        assert result.method == "hardlink"
+        assert os.stat(files[0]).st_ino == os.stat(out / "link.pdf").st_ino
+
+    def test_fallback_to_plain_copy(self, temp_dir):
+        """内核复制方式都不可用时退回普通复制"""
+        from app.placement import PlacementEngine
+
+        files = self._make_files(temp_dir, 2)
+        out = Path(temp_dir) / "out"
+        out.mkdir()
+        engine = PlacementEngine(copy_mode=True)
+        engine._disabled.update({"reflink", "copy_file_range", "sendfile"})
+        results = engine.place_all([(str(f), out / f.name) for f in files])
+
+        assert [r.method for r in results] == ["copyfile", "copyfile"]
+        assert all(r.dst.read_bytes() == Path(f).read_bytes() for f, r in zip(files, results))
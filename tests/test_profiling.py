@@ -0,0 +1,63 @@
+"""性能剖析模块测试"""
+import os
+
+
+def _busy(n=50000):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+
+class TestProfiling:
+    """profiling 测试"""
+
+    def test_profile_dir_is_sibling_of_output(self, temp_dir):
+        from app.profiling import profile_dir_for
+        output_dir = os.path.join(temp_dir, "报销结果")
+        assert profile_dir_for(output_dir + os.sep) == output_dir + "_profile"
+
+    def test_stage_is_noop_when_inactive(self):
+        from app import profiling
+        assert not profiling.is_active()
+        with profiling.stage("scan"):
+            pass
+        assert profiling.stop() is None
+
+    def test_stage_artifacts(self, temp_dir):
+        """测试每个阶段写出 .prof / .folded / tracemalloc 文件"""
+        import pstats
+        from app import profiling
+
+        profile_dir = os.path.join(temp_dir, "out_profile")
+        profiling.start(profile_dir, interval=0.001)
+        try:
+            with profiling.stage("analyze"):
+                data = [bytes(1024) for _ in range(200)]
+                _busy()
+            with profiling.stage("report"):
+                with profiling.stage("nested"):
+                    _busy(1000)
+        finally:
+            assert profiling.stop() == profile_dir
+
+        files = set(os.listdir(profile_dir))
+        assert {"01_analyze.prof", "01_analyze.folded", "01_analyze.tracemalloc.txt",
+                "02_report.prof", "all.folded", "summary.txt"} <= files
+        assert not any(name.startswith("03_") for name in files)
+
+        stats = pstats.Stats(os.path.join(profile_dir, "01_analyze.prof"))
+        assert any(func[2] == "_busy" for func in stats.stats)
+
+        with open(os.path.join(profile_dir, "all.folded"), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert lines
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            assert int(count) > 0
+            assert stack.split(";")[0] in ("analyze", "report")
+
+        with open(os.path.join(profile_dir, "summary.txt"), encoding="utf-8") as f:
+            summary = f.read()
+        assert "analyze" in summary and "report" in summary
+        assert len(data) == 200
@@ -0,0 +1,193 @@
+"""报表生成模块测试"""
+from dataclasses import replace
+
+from openpyxl import load_workbook
+
+STYLE_ATTRS = ("font", "fill", "alignment", "number_format", "protection")
+
+
+def _categorized(sample_invoice_info, sample_voucher_info):
+    taxi = [replace(sample_invoice_info, amount=10.0 + i, date=f"2024-01-{20 - i:02d}",
+                    invoice_number=str(i), file_path=f"/tmp/taxi_{i}.pdf") for i in range(5)]
+    meal = [replace(sample_invoice_info, type="meal", amount=88.8, date="2024-02-01",
+                    description="午餐", file_path="/tmp/meal.pdf")]
+    return {"打车票": taxi + [sample_voucher_info], "餐费": meal, "待确认": [sample_voucher_info]}
+
+
+class TestStreamingReport:
+    """流式报表测试"""
+
+    def test_same_layout_as_regular_report(self, temp_dir, sample_invoice_info, sample_voucher_info):
+        """与普通报表的工作表、单元格值和样式一致"""
+        import os
+        from app.report import ReportGenerator, StreamingReportGenerator
+
+        categorized = _categorized(sample_invoice_info, sample_voucher_info)
+        regular_dir, streaming_dir = os.path.join(temp_dir, "a"), os.path.join(temp_dir, "b")
+        os.makedirs(regular_dir)
+        os.makedirs(streaming_dir)
+        expected = load_workbook(ReportGenerator(regular_dir).generate(categorized))
+        actual = load_workbook(StreamingReportGenerator(streaming_dir).generate(categorized))
+
+        assert actual.sheetnames == expected.sheetnames == ["汇总", "打车票", "餐费"]
+        for name in expected.sheetnames:
+            ws_expected, ws_actual = expected[name], actual[name]
+            assert ws_actual.max_row == ws_expected.max_row
+            assert ws_actual.merged_cells.ranges == ws_expected.merged_cells.ranges
+            for row_expected, row_actual in zip(ws_expected.iter_rows(), ws_actual.iter_rows()):
+                for cell_expected, cell_actual in zip(row_expected, row_actual):
+                    assert cell_actual.value == cell_expected.value, cell_expected.coordinate
+                    for attr in STYLE_ATTRS:
+                        assert repr(getattr(cell_actual, attr)) == repr(getattr(cell_expected, attr)), \
+                            (cell_expected.coordinate, attr)
+            for col in "ABCDEFG":
+                assert ws_actual.column_dimensions[col].width == ws_expected.column_dimensions[col].width
+                assert ws_actual.column_dimensions[col].hidden == ws_expected.column_dimensions[col].hidden
+
+    def test_rows_sorted_by_date_with_formulas(self, temp_dir, sample_invoice_info, sample_voucher_info):
+        """明细按日期排序，合计和汇总使用公式"""
+        from app.report import generate_report
+
+        wb = load_workbook(generate_report(temp_dir, _categorized(sample_invoice_info, sample_voucher_info)))
+        taxi = wb["打车票"]
+        dates = [taxi.cell(row=r, column=2).value for r in range(2, 7)]
+        assert dates == sorted(dates)
+        assert taxi["D7"].value == "=SUM(D2:D6)"
+        assert wb["汇总"]["B4"].value == "=COUNTA('打车票'!A2:A6)"
+        assert wb["汇总"]["C4"].value == "='打车票'!D7"
+
+
+class TestReportUpdater:
+    """报表增量更新测试"""
+
+    def test_append_matches_full_report(self, temp_dir, sample_invoice_info, sample_voucher_info):
+        """追加后的内容与重新生成的完整报表一致，新行按日期插入"""
+        import os
+        from app.report import generate_report
+        from app.report_update import update_report
+
+        categorized = _categorized(sample_invoice_info, sample_voucher_info)
+        added = {"打车票": [replace(sample_invoice_info, amount=50.0, date=date, invoice_number=date,
+                                 file_path=f"/tmp/new_{date}.pdf") for date in ("2024-01-30", "2024-01-01")]}
+        generate_report(temp_dir, categorized)
+        assert update_report(temp_dir, added) is not None
+
+        full_dir = os.path.join(temp_dir, "full")
+        os.makedirs(full_dir)
+        merged = dict(categorized, 打车票=categorized["打车票"] + added["打车票"])
+        expected = load_workbook(generate_report(full_dir, merged))
+        actual = load_workbook(os.path.join(temp_dir, "报销统计.xlsx"))
+
+        taxi = actual["打车票"]
+        dates = [taxi.cell(row=r, column=2).value for r in range(2, 9)]
+        assert dates == sorted(dates) and dates[0] == "2024-01-01" and dates[-1] == "2024-01-30"
+        assert [taxi.cell(row=r, column=1).value for r in range(2, 9)] == list(range(1, 8))
+        assert taxi["D9"].value == "=SUM(D2:D8)"
+        assert actual["汇总"]["B4"].value == "=COUNTA('打车票'!A2:A8)"
+        assert actual["汇总"]["C4"].value == "='打车票'!D9"
+        for name in expected.sheetnames:
+            for row_expected, row_actual in zip(expected[name].iter_rows(min_row=2),
+                                                actual[name].iter_rows(min_row=2)):
+                for cell_expected, cell_actual in zip(row_expected, row_actual):
+                    assert cell_actual.value == cell_expected.value, (name, cell_expected.coordinate)
+                    assert cell_actual.style == cell_expected.style, (name, cell_expected.coordinate)
+
+    def test_untouched_sheets_unchanged(self, temp_dir, sample_invoice_info, sample_voucher_info):
+        """没有新发票的工作表逐字节不变"""
+        import zipfile
+        from app.report import generate_report
+        from app.report_update import update_report
+
+        path = generate_report(temp_dir, _categorized(sample_invoice_info, sample_voucher_info))
+        with zipfile.ZipFile(path) as z:
+            before = {name: z.read(name) for name in z.namelist()}
+        update_report(temp_dir, {"餐费": [replace(sample_invoice_info, type="meal", date="2024-02-02")]})
+        with zipfile.ZipFile(path) as z:
+            after = {name: z.read(name) for name in z.namelist()}
+
+        assert after.keys() == before.keys()
+        changed = {name for name in before if before[name] != after[name]}
+        assert changed == {"xl/worksheets/sheet1.xml", "xl/worksheets/sheet3.xml"}  # 汇总、餐费
+
+    def test_new_category_needs_full_report(self, temp_dir, sample_invoice_info, sample_voucher_info):
+        """需要新工作表或报表不存在时返回 None，报表不变"""
+        from app.report import generate_report
+        from app.report_update import update_report
+
+        new = {"住宿费": [replace(sample_invoice_info, type="hotel")]}
+        assert update_report(temp_dir, new) is None
+        path = generate_report(temp_dir, _categorized(sample_invoice_info, sample_voucher_info))
+        with open(path, "rb") as f:
+            before = f.read()
+        assert update_report(temp_dir, new) is None
+        with open(path, "rb") as f:
+            assert f.read() == before
+
+
+class TestExport:
+    """CSV / Parquet 明细导出测试"""
+
+    def test_csv_matches_excel_rows(self, temp_dir, sample_invoice_info, sample_voucher_info):
+        """CSV 包含全部明细（含凭证），发票行与 Excel 明细表一致"""
+        import csv
+        import os
+        from app.report import ReportRow, generate_report
+
+        wb = load_workbook(generate_report(temp_dir, _categorized(sample_invoice_info, sample_voucher_info)))
+        with open(os.path.join(temp_dir, "报销明细.csv"), encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        assert list(rows[0].keys()) == list(ReportRow._fields)
+        assert len(rows) == 8
+        taxi = [r for r in rows if r["category"] == "打车票" and r["is_invoice"] == "True"]
+        sheet = wb["打车票"]
+        assert [(r["date"], float(r["amount"]), r["file_path"]) for r in taxi] == [
+            (sheet.cell(row=i, column=2).value, sheet.cell(row=i, column=4).value, sheet.cell(row=i, column=7).value)
+            for i in range(2, 7)]
+
+    def test_parquet_schema(self, temp_dir, sample_invoice_info, sample_voucher_info):
+        """Parquet 使用固定的列和类型"""
+        import pytest
+        pq = pytest.importorskip("pyarrow.parquet")
+        from app.report import ReportRow, export_report
+
+        exported = export_report(temp_dir, _categorized(sample_invoice_info, sample_voucher_info))
+        table = pq.read_table(exported["parquet"])
+        assert table.column_names == list(ReportRow._fields)
+        assert str(table.schema.field("amount").type) == "double"
+        assert str(table.schema.field("is_invoice").type) == "bool"
+        assert table.num_rows == 8
+
+    def test_append_export(self, temp_dir, sample_invoice_info, sample_voucher_info):
+        """增量整理时新明细追加到已有的 CSV 末尾，已有行不变"""
+        import csv
+        import os
+        from app.report import append_export, export_report
+
+        added = {"餐费": [replace(sample_invoice_info, type="meal", date="2024-03-01", file_path="/tmp/new.pdf")]}
+        assert append_export(temp_dir, added, formats=("csv",)) is None
+
+        export_report(temp_dir, _categorized(sample_invoice_info, sample_voucher_info), formats=("csv",))
+        path = os.path.join(temp_dir, "报销明细.csv")
+        with open(path, encoding="utf-8") as f:
+            before = f.read()
+        assert append_export(temp_dir, added, formats=("csv",)) == {"csv": path}
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        assert text.startswith(before)
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == 9
+        assert (rows[-1]["category"], rows[-1]["date"], rows[-1]["file_path"]) == ("餐费", "2024-03-01", "/tmp/new.pdf")
+
+    def test_parquet_skipped_without_pyarrow(self, temp_dir, sample_invoice_info, sample_voucher_info,
+                                             monkeypatch):
+        """没有安装 pyarrow 时只导出 CSV"""
+        import os
+        import sys
+        from app.report import export_report
+
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+        exported = export_report(temp_dir, _categorized(sample_invoice_info, sample_voucher_info))
+        assert set(exported) == {"csv"}
+        assert not os.path.exists(os.path.join(temp_dir, "报销明细.parquet"))
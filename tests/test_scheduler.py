@@ -0,0 +1,175 @@
+"""任务调度模块测试"""
+import threading
+import time
+
+import pytest
+
+
+class TestJobScheduler:
+    """有界队列 + 固定工作线程"""
+
+    def test_fifo_with_positions(self):
+        """单个工作线程按提交顺序执行，排队位置随之前移"""
+        from app.scheduler import JobScheduler
+
+        scheduler = JobScheduler(workers=1, max_queue=10)
+        gate = threading.Event()
+        done = []
+
+        def job(name):
+            gate.wait(5)
+            done.append(name)
+
+        assert scheduler.submit("a", job, "a") == 1
+        time.sleep(0.05)  # a 已被取走
+        assert scheduler.submit("b", job, "b") == 1
+        assert scheduler.submit("c", job, "c") == 2
+        assert scheduler.position("a") is None
+        assert scheduler.position("c") == 2
+
+        gate.set()
+        scheduler.shutdown()
+        assert done == ["a", "b", "c"]
+
+    def test_queue_full(self):
+        """队列满时拒绝并给出重试等待时间"""
+        from app.scheduler import JobScheduler, QueueFullError
+
+        scheduler = JobScheduler(workers=1, max_queue=1)
+        gate = threading.Event()
+        scheduler.submit("running", gate.wait, 5)
+        time.sleep(0.05)
+        scheduler.submit("queued", gate.wait, 5)
+        assert scheduler.is_full()
+        with pytest.raises(QueueFullError) as exc_info:
+            scheduler.submit("rejected", gate.wait, 5)
+        assert exc_info.value.retry_after >= 1
+
+        assert scheduler.cancel("queued")
+        assert not scheduler.is_full()
+        gate.set()
+        scheduler.shutdown()
+
+    def test_stage_concurrency(self):
+        """CPU 阶段同时只有 cpu_slots 个，I/O 阶段不受 CPU 阶段影响"""
+        from app.scheduler import JobScheduler
+
+        scheduler = JobScheduler(workers=4, max_queue=10, cpu_slots=1, io_slots=4)
+        lock = threading.Lock()
+        active = {"cpu": 0, "io": 0}
+        peak = {"cpu": 0, "io": 0}
+
+        def stage(kind, seconds):
+            with lock:
+                active[kind] += 1
+                peak[kind] = max(peak[kind], active[kind])
+            time.sleep(seconds)
+            with lock:
+                active[kind] -= 1
+
+        def job():
+            with scheduler.cpu_slot():
+                stage("cpu", 0.02)
+            with scheduler.io_slot():
+                stage("io", 0.2)
+
+        for i in range(4):
+            scheduler.submit(str(i), job)
+        scheduler.shutdown()
+        assert peak["cpu"] == 1
+        assert peak["io"] > 1
+
+
+class TestFairScheduling:
+    """多用户公平调度（以文件为单位）"""
+
+    @staticmethod
+    def _steps(log, name, count, gate=None):
+        if gate is not None:
+            gate.wait(5)
+        for _ in range(count):
+            log.append(name)
+            yield
+
+    def test_round_robin_between_clients(self):
+        """两个大任务按文件轮流执行"""
+        from app.scheduler import JobScheduler
+
+        scheduler = JobScheduler(workers=1, max_queue=10, small_task=0)
+        gate = threading.Event()
+        log = []
+        scheduler.submit("block", gate.wait, 5, client="x")
+        time.sleep(0.05)
+        scheduler.submit("a", self._steps, log, "a", 6, client="A", cost=6)
+        scheduler.submit("b", self._steps, log, "b", 6, client="B", cost=6)
+        gate.set()
+        scheduler.shutdown()
+        assert log == ["a", "b"] * 6
+
+    def test_small_task_not_starved(self):
+        """大任务执行中提交的小任务先完成"""
+        from app.scheduler import JobScheduler
+
+        scheduler = JobScheduler(workers=1, max_queue=10, small_task=5)
+        log = []
+        gate = threading.Event()
+        scheduler.submit("bulk", self._steps, log, "bulk", 50, gate, client="A", cost=50)
+        time.sleep(0.05)
+        scheduler.submit("small", self._steps, log, "small", 3, client="B", cost=3)
+        gate.set()
+        scheduler.shutdown()
+        assert log.count("bulk") == 50
+        assert log.index("small") <= 1
+        assert log[:5].count("small") == 3
+
+    def test_bulk_progresses_among_many_small_tasks(self):
+        """其他用户不断提交小任务时，大任务仍按轮转得到执行"""
+        from app.scheduler import JobScheduler
+
+        scheduler = JobScheduler(workers=4, max_queue=100, client_limit=2, small_task=10)
+        lock = threading.Lock()
+        log = []
+        gate = threading.Event()
+
+        def steps(name, count):
+            gate.wait(5)
+            for _ in range(count):
+                time.sleep(0.001)
+                with lock:
+                    log.append(name)
+                yield
+
+        scheduler.submit("bulk", steps, "bulk", 200, client="A", cost=200)
+        for i in range(20):
+            scheduler.submit(f"b{i}", steps, "B", 10, client="B", cost=10)
+            scheduler.submit(f"c{i}", steps, "C", 10, client="C", cost=10)
+        gate.set()
+        scheduler.shutdown()
+
+        assert len(log) == 600
+        # 大任务同时只有一步在执行（其他用户各 2 步），约占五分之一；没有额度限制时几乎为 0
+        assert log[:400].count("bulk") >= 40
+
+    def test_client_limit(self):
+        """同一用户同时执行的步骤数不超过上限"""
+        from app.scheduler import JobScheduler
+
+        scheduler = JobScheduler(workers=3, max_queue=10, client_limit=1)
+        lock = threading.Lock()
+        active = {"A": 0}
+        peak = {"A": 0}
+
+        def job():
+            for _ in range(3):
+                with lock:
+                    active["A"] += 1
+                    peak["A"] = max(peak["A"], active["A"])
+                time.sleep(0.01)
+                with lock:
+                    active["A"] -= 1
+                yield
+
+        for i in range(3):
+            scheduler.submit(str(i), job, client="A", cost=3)
+        scheduler.shutdown()
+        assert peak["A"] == 1
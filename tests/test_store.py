@@ -0,0 +1,92 @@
+"""内容寻址存储和链接布局测试"""
+import os
+from dataclasses import replace
+from pathlib import Path
+
+
+class TestLinkLayout:
+    """symlink / hardlink 布局测试"""
+
+    def test_symlink_layout(self, temp_dir, sample_inputs):
+        """原始文件存入 .store，分类目录中是指向它的符号链接"""
+        from app.organizer import FileOrganizer
+        from app.store import ContentStore
+
+        root = Path(temp_dir)
+        infos = sample_inputs
+        FileOrganizer(str(root / "out"), copy_mode=True, layout="symlink").organize(infos, progress=lambda *a: None)
+
+        assert len(list(ContentStore(str(root / "out")).objects())) == 2
+        for info in infos:
+            assert os.path.islink(info.file_path)
+            assert not os.path.isabs(os.readlink(info.file_path))
+            assert Path(info.file_path).read_bytes() in (b"voucher", b"invoice")
+        assert (root / "in" / "v.pdf").exists()
+
+    def test_hardlink_layout_dedupes_content(self, temp_dir, write_input, sample_invoice_info):
+        """相同内容只存一份"""
+        from app.organizer import FileOrganizer
+        from app.store import ContentStore
+
+        root = Path(temp_dir)
+        infos = [write_input(f"dup_{i}.pdf", b"same",
+                             replace(sample_invoice_info, order_number="", date=day, service_date=day))
+                 for i, day in enumerate(["2024-01-15", "2024-02-20"])]
+        FileOrganizer(str(root / "out"), layout="hardlink").organize(infos, progress=lambda *a: None)
+
+        objects = list(ContentStore(str(root / "out")).objects())
+        assert len(objects) == 1
+        assert all(os.path.samefile(info.file_path, objects[0]) for info in infos)
+        assert not any((root / f"dup_{i}.pdf").exists() for i in range(2))
+
+    def test_rebuild_view(self, temp_dir, sample_inputs):
+        """换规则重建视图只重建链接"""
+        from app.index import OutputIndex
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        out = str(root / "out")
+        infos = sample_inputs
+        FileOrganizer(out, layout="symlink").organize(infos, progress=lambda *a: None)
+        old_paths = {info.file_path for info in infos}
+
+        categorized = FileOrganizer(out, pairing="optimal", layout="symlink").rebuild_view(progress=lambda *a: None)
+
+        new_paths = {info.file_path for infos in categorized.values() for info in infos}
+        assert len(new_paths) == 2
+        assert all(os.path.islink(p) for p in new_paths)
+        assert {e.path for e in OutputIndex(out).entries.values()} == {
+            Path(p).relative_to(out).as_posix() for p in new_paths}
+        assert old_paths == new_paths or not any(os.path.lexists(p) for p in old_paths - new_paths)
+
+    def test_rebuild_view_with_identical_files(self, temp_dir, write_input, sample_invoice_info):
+        """内容相同的文件重建视图后各有一个链接，原来的链接都被删除"""
+        from app.index import OutputIndex
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        out = root / "out"
+        infos = [write_input(f"{day}.pdf", b"same",
+                             replace(sample_invoice_info, order_number="", date=day, service_date=day))
+                 for day in ["2024-01-15", "2024-02-20"]]
+        FileOrganizer(str(out), layout="symlink").organize(infos, progress=lambda *a: None)
+
+        FileOrganizer(str(out), group_multi=True, layout="symlink").rebuild_view(progress=lambda *a: None)
+
+        links = {p.relative_to(out).as_posix() for p in out.rglob("*") if p.is_symlink()}
+        assert len(links) == 2
+        assert links == set(OutputIndex(str(out)).entries)
+
+    def test_rollback_symlink_move(self, temp_dir, sample_inputs):
+        """移动模式回滚时把内容复制回原处"""
+        from app.organizer import FileOrganizer
+
+        root = Path(temp_dir)
+        infos = sample_inputs
+        organizer = FileOrganizer(str(root / "out"), layout="symlink")
+        organizer.organize(infos, progress=lambda *a: None)
+        assert not (root / "in" / "v.pdf").exists()
+
+        organizer.rollback()
+        assert (root / "in" / "v.pdf").read_bytes() == b"voucher"
+        assert not any(os.path.lexists(info.file_path) for info in infos)
@@ -0,0 +1,137 @@
+"""任务存储模块测试"""
+import os
+
+import pytest
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, temp_dir):
+    """两种任务存储各跑一遍"""
+    from app.task_store import open_task_store
+    return open_task_store(request.param, os.path.join(temp_dir, "tasks.db"))
+
+
+class TestTaskStore:
+    """任务、进度和产物"""
+
+    def test_create_update_delete(self, store):
+        """get() 返回副本，update() 合并字段，删除后连同进度一起消失"""
+        store.create("t1", {'status': 'queued', 'total': 3, 'created_at': ''})
+        task = store.get("t1")
+        task['total'] = 99
+        assert store.get("t1")['total'] == 3
+
+        assert store.update("t1", status='processing', current=1)
+        assert store.get("t1")['status'] == 'processing'
+        assert store.get("t1")['current'] == 1
+        assert not store.update("missing", status='error')
+
+        store.record_file("t1", 1, {'amount': 1.5})
+        store.set_artifact("t1", "report", "/tmp/报销统计.xlsx")
+        assert store.files("t1") == {1: {'amount': 1.5}}
+        assert store.artifacts("t1") == {"report": "/tmp/报销统计.xlsx"}
+
+        store.delete("t1")
+        assert store.get("t1") is None
+        assert store.files("t1") == {} and store.artifacts("t1") == {}
+
+    def test_counts_oldest_and_expired(self, store):
+        """按状态计数、最旧任务、到期任务"""
+        import time
+
+        for idx, status in enumerate(['completed', 'processing', 'completed']):
+            store.create(f"t{idx}", {'status': status})
+            time.sleep(0.01)
+        store.update("t2", expires_at=time.time() - 1)
+        store.update("t1", expires_at=time.time() + 60)
+
+        assert store.count() == 3
+        assert store.status_counts() == {'completed': 2, 'processing': 1}
+        assert store.oldest() == "t0"
+        assert [task_id for task_id, _ in store.expired()] == ["t2"]
+
+
+    def test_incomplete_backend_rejected(self):
+        """没有实现全部接口的存储在创建时就报错"""
+        from app.task_store import MemoryTaskStore, TaskStore
+
+        class PartialStore(TaskStore):
+            get = MemoryTaskStore.get
+
+        with pytest.raises(TypeError):
+            PartialStore()
+
+
+class TestLease:
+    """租约和接管"""
+
+    def test_claim_and_reclaim(self, store):
+        """租约有效时其他进程不能领取；过期后由 reclaim() 接管"""
+        store.create("t1", {'status': 'processing'})
+        store.create("t2", {'status': 'completed'})
+
+        assert store.claim("t1", "a", lease=60)
+        assert not store.claim("t1", "b", lease=60)
+        assert store.reclaim("b", lease=60) == []
+
+        assert store.claim("t1", "a", lease=-1)  # 租约已过期
+        assert store.renew("b", lease=60) == 0
+        assert store.reclaim("b", lease=60) == ["t1"]  # 已完成的任务不接管
+        assert not store.claim("t1", "a", lease=60)
+        assert store.renew("b", lease=60) == 1
+
+    def test_reclaim_limit_and_position(self, store):
+        """按登记顺序领取，最多 limit 个；排队位置按登记顺序"""
+        import time
+
+        for task_id in ("t1", "t2", "t3"):
+            store.create(task_id, {'status': 'queued'})
+            time.sleep(0.01)
+        assert [store.position(task_id) for task_id in ("t1", "t2", "t3")] == [1, 2, 3]
+        store.update("t1", status='processing')
+        assert store.position("t1") is None and store.position("t3") == 2
+
+        assert store.reclaim("a", lease=60, limit=2) == ["t1", "t2"]
+        assert store.reclaim("b", lease=60, limit=2) == ["t3"]
+
+    def test_create_with_owner(self, store):
+        """登记时指定所有者：登记后立即持有租约，其他进程接管不到"""
+        store.create("t1", {'status': 'queued'}, owner="a", lease=60)
+        store.create("t2", {'status': 'queued'})
+        assert store.reclaim("b", lease=60) == ["t2"]
+        assert store.renew("a", lease=60) == 1
+
+    def test_release(self, store):
+        """释放后其他进程立即可以接管"""
+        store.create("t1", {'status': 'queued'})
+        store.claim("t1", "a", lease=60)
+        store.release("a")
+        assert store.reclaim("b", lease=60) == ["t1"]
+
+
+class TestSqliteTaskStore:
+    """SQLite 任务存储"""
+
+    def test_shared_between_instances(self, temp_dir):
+        """WAL 模式；另一个实例（进程）看到同样的任务，重新打开后任务仍在"""
+        from app.task_store import SqliteTaskStore
+
+        path = os.path.join(temp_dir, "tasks.db")
+        first, second = SqliteTaskStore(path), SqliteTaskStore(path)
+        first.create("t1", {'status': 'queued', 'summary': {'打车票': {'count': 1}}})
+        assert second.get("t1")['summary'] == {'打车票': {'count': 1}}
+        assert second._connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+        second.update("t1", status='completed')
+        assert SqliteTaskStore(path).get("t1")['status'] == 'completed'
+
+    def test_status_queries_use_indexes(self, temp_dir):
+        """按状态和到期时间的查询走索引"""
+        from app.task_store import SqliteTaskStore
+
+        db = SqliteTaskStore(os.path.join(temp_dir, "tasks.db"))._connection()
+        plan = db.execute("EXPLAIN QUERY PLAN SELECT id FROM tasks WHERE status = 'processing' "
+                          "AND lease_until <= 0").fetchall()
+        assert "tasks_status_lease" in str(plan)
+        plan = db.execute("EXPLAIN QUERY PLAN SELECT id FROM tasks WHERE expires_at <= 0").fetchall()
+        assert "tasks_expires" in str(plan)
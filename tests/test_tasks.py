@@ -0,0 +1,171 @@
+"""Web 版任务处理测试"""
+import os
+import threading
+import time
+from dataclasses import replace
+
+import pytest
+
+
+@pytest.fixture
+def fake_processing(temp_dir, sample_invoice_info, monkeypatch):
+    """两个待识别的 PDF；识别结果固定，记录识别了哪些文件"""
+    import app.config
+    from app import tasks
+    from app.scheduler import JobScheduler
+
+    input_dir, output_dir = os.path.join(temp_dir, "in"), os.path.join(temp_dir, "out")
+    os.makedirs(input_dir)
+    os.makedirs(output_dir)
+    for name in ("a.pdf", "b.pdf"):
+        with open(os.path.join(input_dir, name), "wb") as f:
+            f.write(b"%PDF-1.4 " + name.encode())
+
+    analyzed = []
+
+    def fake_analyze(text, file_path, api_key):
+        analyzed.append(os.path.basename(file_path))
+        return replace(sample_invoice_info, file_path=file_path, invoice_number=os.path.basename(file_path))
+
+    monkeypatch.setattr(app.config, "DEEPSEEK_API_KEY", "test_key")
+    monkeypatch.setattr(tasks, "extract_text_from_file", lambda path: "")
+    monkeypatch.setattr(tasks, "analyze_invoice", fake_analyze)
+    monkeypatch.setattr(tasks, "scheduler", JobScheduler(workers=1))
+    task = {'status': 'queued', 'temp_dir': input_dir, 'output_dir': output_dir,
+            'total': 2, 'current': 0, 'use_vision': False, 'created_at': ''}
+    return task, analyzed
+
+
+class TestResume:
+    """中断的任务由其他进程（或重启后的进程）接管"""
+
+    def test_reclaimed_task_skips_recorded_files(self, fake_processing, sample_invoice_info):
+        """租约过期的任务重新排队，已记录进度的文件不再识别"""
+        from app import tasks
+
+        task, analyzed = fake_processing
+        tasks.task_manager.add("resume", dict(task, status='processing', current=1))
+        record = replace(sample_invoice_info, file_path=os.path.join(task['temp_dir'], "a.pdf"),
+                         invoice_number="a.pdf").to_dict()
+        record.pop("raw_text")
+        tasks.task_manager.store.record_file("resume", 1, record)
+        try:
+            tasks.resume_tasks()
+            tasks.scheduler.shutdown(wait=True)
+
+            result = tasks.task_manager.get("resume")
+            assert result['status'] == 'completed'
+            assert analyzed == ["b.pdf"]
+            assert result['summary']['打车票']['count'] == 2
+        finally:
+            tasks.task_manager.remove("resume")
+
+    def _interrupted_while_organizing(self, task, sample_invoice_info, crash_at):
+        """识别都已完成、整理中断的任务（crash_at 为 None 时整理已完成但没标记完成）"""
+        from app import tasks
+        from app.organizer import FileOrganizer
+
+        infos = [replace(sample_invoice_info, file_path=os.path.join(task['temp_dir'], name), invoice_number=name)
+                 for name in ("a.pdf", "b.pdf")]
+        tasks.task_manager.add("organizing", dict(task, status='organizing', current=2))
+        for idx, info in enumerate(infos, 1):
+            record = info.to_dict()
+            record.pop("raw_text")
+            tasks.task_manager.store.record_file("organizing", idx, record)
+
+        def crash(done, total, result):
+            if done == crash_at:
+                raise KeyboardInterrupt
+
+        organizer = FileOrganizer(task['output_dir'], copy_mode=True, workers=1)
+        try:
+            organizer.execute(organizer.plan(infos), progress=crash)
+        except KeyboardInterrupt:
+            pass
+
+    def _placed_files(self, output_dir):
+        return sorted(name for _, _, names in os.walk(output_dir) for name in names if not name.startswith("."))
+
+    def test_reclaimed_while_organizing(self, fake_processing, sample_invoice_info):
+        """整理到一半中断：接管后继续整理，不报错，也不重复复制"""
+        from app import tasks
+
+        task, analyzed = fake_processing
+        self._interrupted_while_organizing(task, sample_invoice_info, crash_at=1)
+        try:
+            tasks.resume_tasks()
+            tasks.scheduler.shutdown(wait=True)
+
+            result = tasks.task_manager.get("organizing")
+            assert result['status'] == 'completed', result.get('error')
+            assert analyzed == []
+            assert result['summary']['打车票']['count'] == 2
+            assert len(self._placed_files(task['output_dir'])) == 2
+        finally:
+            tasks.task_manager.remove("organizing")
+
+    def test_reclaimed_after_organize_committed(self, fake_processing, sample_invoice_info):
+        """整理已完成但没来得及标记完成：接管后不再整理一遍"""
+        from app import tasks
+
+        task, _ = fake_processing
+        self._interrupted_while_organizing(task, sample_invoice_info, crash_at=None)
+        before = self._placed_files(task['output_dir'])
+        try:
+            tasks.resume_tasks()
+            tasks.scheduler.shutdown(wait=True)
+
+            result = tasks.task_manager.get("organizing")
+            assert result['status'] == 'completed'
+            assert result['summary']['打车票']['count'] == 2
+            assert self._placed_files(task['output_dir']) == before and len(before) == 2
+        finally:
+            tasks.task_manager.remove("organizing")
+
+
+class TestWorker:
+    """独立的任务处理进程"""
+
+    def test_worker_processes_queued_task(self, fake_processing):
+        """worker 领取排队的任务并处理完成，退出时释放租约"""
+        from app import tasks
+
+        task, analyzed = fake_processing
+        tasks.task_manager.add("queued", task)
+        stop = threading.Event()
+        worker = threading.Thread(target=tasks.run_worker, args=(stop, 0.01))
+        worker.start()
+        try:
+            deadline = time.time() + 10
+            while tasks.task_manager.get("queued")['status'] != 'completed' and time.time() < deadline:
+                time.sleep(0.01)
+            assert tasks.task_manager.get("queued")['status'] == 'completed'
+            assert sorted(analyzed) == ["a.pdf", "b.pdf"]
+        finally:
+            stop.set()
+            worker.join()
+            tasks.task_manager.remove("queued")
+
+    def test_worker_metrics_endpoint(self):
+        """worker 进程在自己的地址上提供识别相关的指标"""
+        from urllib.request import urlopen
+
+        import worker
+        from app import metrics
+
+        was_enabled = metrics.is_enabled()
+        metrics.enable()
+        metrics.reset()
+        metrics.inc("files_processed", result="ok")
+        server = worker.serve_metrics("127.0.0.1", 0)
+        try:
+            with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as response:
+                body = response.read().decode("utf-8")
+        finally:
+            server.shutdown()
+            metrics.reset()
+            if not was_enabled:
+                metrics.disable()
+        assert 'reimbursement_files_processed_total{result="ok"} 1' in body
+        assert "reimbursement_workers_busy 0" in body
+        assert "reimbursement_ocr_pool_size 1" in body
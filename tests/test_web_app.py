@@ -0,0 +1,164 @@
+"""Web 版下载测试"""
+import io
+import os
+import threading
+import zipfile
+from dataclasses import replace
+
+import pytest
+
+pytestmark = pytest.mark.usefixtures("no_maintenance")
+
+
+def _completed_task(output_dir, sample_invoice_info):
+    from app.index import OutputIndex, hash_file
+
+    info = replace(sample_invoice_info, file_path=os.path.join(output_dir, "打车票", "发票.pdf"))
+    os.makedirs(os.path.dirname(info.file_path))
+    with open(info.file_path, "wb") as f:
+        f.write(b"%PDF-1.4 test")
+    index = OutputIndex(output_dir)
+    index.record(info, hash_file(info.file_path), "g1", "打车票")
+    index.save()
+    return {
+        'status': 'completed',
+        'output_dir': output_dir,
+        'zip_filename': '报销结果_test.zip',
+        'created_at': '',
+    }
+
+
+class TestLazyDownload:
+    """报表和 ZIP 在第一次下载时生成"""
+
+    def test_report_built_on_first_download(self, temp_dir, sample_invoice_info):
+        """完成时没有报表，下载后 ZIP 中包含报表和整理后的文件"""
+        from web_app import app, task_manager
+
+        task = _completed_task(temp_dir, sample_invoice_info)
+        task_manager.add("lazy", task)
+        try:
+            assert not os.path.exists(os.path.join(temp_dir, "报销统计.xlsx"))
+            response = app.test_client().get("/download/lazy")
+            assert response.status_code == 200
+            assert response.content_length == len(response.get_data())
+            with zipfile.ZipFile(io.BytesIO(response.get_data())) as z:
+                names = set(z.namelist())
+            assert {"报销统计.xlsx", "打车票/发票.pdf"} <= names
+
+            # 第二次下载使用缓存
+            report_path = task_manager.store.artifacts("lazy")["report"]
+            report_mtime = os.stat(report_path).st_mtime_ns
+            assert app.test_client().get("/download/lazy").status_code == 200
+            assert os.stat(report_path).st_mtime_ns == report_mtime
+        finally:
+            task_manager.remove("lazy")
+
+    def test_artifact_lock_released(self, temp_dir, sample_invoice_info):
+        """下载结束后不保留该任务的报表生成锁"""
+        import gc
+
+        import web_app
+
+        task = _completed_task(temp_dir, sample_invoice_info)
+        web_app.task_manager.add("locks", task)
+        try:
+            assert web_app.app.test_client().get("/download/locks").status_code == 200
+            gc.collect()
+            assert "locks" not in web_app._artifact_locks
+        finally:
+            web_app.task_manager.remove("locks")
+
+
+class TestQueueLimit:
+    """排队已满时返回 429"""
+
+    def test_upload_rejected_when_full(self, monkeypatch):
+        """返回 429 和 Retry-After，不登记任务"""
+        import web_app
+        from app.scheduler import JobScheduler
+
+        monkeypatch.setattr(web_app, "scheduler", JobScheduler(workers=1, max_queue=0))
+        before = web_app.task_manager.store.count()
+        response = web_app.app.test_client().post(
+            "/upload", data={"files[]": (io.BytesIO(b"%PDF-1.4"), "发票.pdf")},
+            content_type="multipart/form-data")
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert response.get_json()["retry_after"] >= 1
+        assert web_app.task_manager.store.count() == before
+
+    def test_upload_claims_task(self, monkeypatch):
+        """本进程处理的任务登记时已被领取，其他进程的维护线程不会重复领取"""
+        import web_app
+        from app.scheduler import JobScheduler
+
+        gate = threading.Event()
+        scheduler = JobScheduler(workers=1)
+        scheduler.submit("block", gate.wait, 5)  # 占住工作线程，任务留在队列中
+        monkeypatch.setattr(web_app, "scheduler", scheduler)
+        response = web_app.app.test_client().post(
+            "/upload", data={"files[]": (io.BytesIO(b"%PDF-1.4"), "发票.pdf")},
+            content_type="multipart/form-data")
+        task_id = response.get_json()["task_id"]
+        try:
+            assert task_id not in web_app.task_manager.store.reclaim("other-process", 60)
+        finally:
+            scheduler.cancel(task_id)
+            gate.set()
+            web_app.task_manager.discard(task_id)
+
+
+class TestExternalWorker:
+    """任务由独立的 worker 进程处理"""
+
+    def test_upload_only_registers_task(self, monkeypatch):
+        """Web 进程只登记任务，不加入本进程的调度器；排队位置按登记顺序"""
+        import web_app
+        from app.scheduler import JobScheduler
+
+        monkeypatch.setattr(web_app, "EXTERNAL_WORKER", True)
+        monkeypatch.setattr(web_app, "scheduler", JobScheduler(workers=1))
+        client = web_app.app.test_client()
+        response = client.post("/upload", data={"files[]": (io.BytesIO(b"%PDF-1.4"), "发票.pdf")},
+                               content_type="multipart/form-data")
+        task_id = response.get_json()["task_id"]
+        try:
+            assert response.status_code == 200
+            assert web_app.scheduler.pending == 0
+            position = response.get_json()["queue_position"]
+            assert position >= 1
+            status = client.get(f"/status/{task_id}").get_json()
+            assert status["status"] == "queued" and status["queue_position"] == position
+        finally:
+            web_app.task_manager.discard(task_id)
+
+    def test_retry_after_from_store(self, monkeypatch):
+        """排队已满时按最近完成任务的耗时和正在处理的任务数估计重试等待时间"""
+        import time
+
+        import web_app
+
+        monkeypatch.setattr(web_app, "EXTERNAL_WORKER", True)
+        monkeypatch.setattr(web_app, "WEB_QUEUE_SIZE", 1)
+        now = time.time()
+        tasks = {
+            "done1": {'status': 'completed', 'started_at': now - 100, 'finished_at': now - 40},
+            "done2": {'status': 'completed', 'started_at': now - 60, 'finished_at': now - 20},
+            "busy1": {'status': 'processing'},
+            "busy2": {'status': 'processing'},
+            "waiting": {'status': 'queued'},
+        }
+        for task_id, data in tasks.items():
+            web_app.task_manager.add(task_id, data)
+        try:
+            response = web_app.app.test_client().post(
+                "/upload", data={"files[]": (io.BytesIO(b"%PDF-1.4"), "发票.pdf")},
+                content_type="multipart/form-data")
+            assert response.status_code == 429
+            # 平均 50 秒，两个任务同时在处理
+            assert response.headers["Retry-After"] == "25"
+        finally:
+            for task_id in tasks:
+                web_app.task_manager.remove(task_id)
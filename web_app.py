@@ -9,18 +9,22 @@ import sys
 import uuid
 import shutil
 import tempfile
-import zipfile
 import threading
-import time
-import atexit
-from pathlib import Path
+import weakref
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, after_this_request
+from urllib.parse import quote
+from flask import Flask, Response, render_template, request, jsonify
 
 # 导入核心模块
 from app import INVOICE_CATEGORIES, is_configured, setup_wizard
-from app import extract_text_from_file, is_supported_file
-from app import analyze_invoice, analyze_invoice_vision, InvoiceInfo, FileOrganizer, generate_report
+from app import generate_report
+from app import metrics
+from app.archive import ArchiveError, ZipStream
+from app.config import TASK_WORKER, WEB_QUEUE_SIZE
+from app.index import OutputIndex
+from app.scheduler import QueueFullError
+from app.tasks import (cleanup_task, process_task, processing_gauges, scheduler, start_maintenance, store_retry_after,
+                       task_manager, temp_disk_bytes, worker_id)
 
 # 确定模板和静态文件夹路径（支持打包环境）
 if getattr(sys, 'frozen', False):
@@ -35,79 +39,17 @@ else:
 
 app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
 
+# 服务端常驻运行，始终收集性能指标
+metrics.enable()
+
 # 配置
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB 总上传限制
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'bmp', 'tiff', 'webp', 'pdf'}
 
-# 任务管理器配置
-MAX_TASKS = 100  # 最大任务数
-
-
-class TaskManager:
-    """任务管理器 - 管理任务生命周期，防止内存泄漏"""
-
-    def __init__(self, max_tasks: int = MAX_TASKS):
-        self.tasks = {}
-        self.lock = threading.Lock()
-        self.max_tasks = max_tasks
-
-    def add(self, task_id: str, task_data: dict) -> None:
-        """添加任务，如果超过限制则清理最旧的任务"""
-        with self.lock:
-            # 如果超过最大任务数，清理最旧的任务
-            while len(self.tasks) >= self.max_tasks:
-                self._cleanup_oldest()
-            self.tasks[task_id] = task_data
-
-    def get(self, task_id: str) -> dict:
-        """获取任务"""
-        return self.tasks.get(task_id)
-
-    def __contains__(self, task_id: str) -> bool:
-        """检查任务是否存在"""
-        return task_id in self.tasks
-
-    def __getitem__(self, task_id: str) -> dict:
-        """获取任务（字典风格访问）"""
-        return self.tasks[task_id]
-
-    def remove(self, task_id: str) -> None:
-        """移除任务"""
-        with self.lock:
-            if task_id in self.tasks:
-                del self.tasks[task_id]
-
-    def items(self):
-        """返回任务项"""
-        return list(self.tasks.items())
-
-    def clear(self):
-        """清空所有任务"""
-        self.tasks.clear()
-
-    def _cleanup_oldest(self) -> None:
-        """清理最旧的任务（内部方法，调用前应持有锁）"""
-        if not self.tasks:
-            return
-        # 按创建时间排序，清理最旧的
-        oldest_id = min(
-            self.tasks.keys(),
-            key=lambda k: self.tasks[k].get('created_at', '')
-        )
-        task = self.tasks[oldest_id]
-        # 清理文件
-        if 'temp_dir' in task and os.path.exists(task['temp_dir']):
-            shutil.rmtree(task['temp_dir'], ignore_errors=True)
-        if 'output_dir' in task and os.path.exists(task['output_dir']):
-            shutil.rmtree(task['output_dir'], ignore_errors=True)
-        if 'zip_path' in task and os.path.exists(task['zip_path']):
-            os.remove(task['zip_path'])
-        del self.tasks[oldest_id]
-        print(f"[清理] 任务数超限，已清理最旧任务 {oldest_id}")
-
-
-# 任务管理器实例
-task_manager = TaskManager()
+# 任务由独立的 worker.py 进程处理时，Web 进程只登记任务（见 app/tasks.py）
+EXTERNAL_WORKER = TASK_WORKER == 'external'
+if EXTERNAL_WORKER and not task_manager.store.persistent:
+    raise RuntimeError("TASK_WORKER=external 需要与 worker 进程共用的任务存储（TASK_STORE=sqlite）")
 
 
 def allowed_file(filename):
@@ -115,170 +57,45 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def cleanup_task(task_id, delay=1800):
-    """延迟清理任务数据（默认30分钟后）"""
-    def do_cleanup():
-        time.sleep(delay)
-        with task_manager.lock:
-            if task_id in task_manager:
-                task = task_manager[task_id]
-                # 删除临时目录
-                if 'temp_dir' in task and os.path.exists(task['temp_dir']):
-                    shutil.rmtree(task['temp_dir'], ignore_errors=True)
-                if 'output_dir' in task and os.path.exists(task['output_dir']):
-                    shutil.rmtree(task['output_dir'], ignore_errors=True)
-                if 'zip_path' in task and os.path.exists(task['zip_path']):
-                    os.remove(task['zip_path'])
-                # 直接操作内部 dict，避免 remove() 重复加锁导致死锁
-                del task_manager.tasks[task_id]
-                print(f"[清理] 已删除任务 {task_id} 的临时文件")
-
-    thread = threading.Thread(target=do_cleanup, daemon=True)
-    thread.start()
-
-
-def cleanup_all_tasks():
-    """服务器关闭时清理所有任务"""
-    with task_manager.lock:
-        for task_id, task in task_manager.items():
-            if 'temp_dir' in task and os.path.exists(task['temp_dir']):
-                shutil.rmtree(task['temp_dir'], ignore_errors=True)
-            if 'output_dir' in task and os.path.exists(task['output_dir']):
-                shutil.rmtree(task['output_dir'], ignore_errors=True)
-            if 'zip_path' in task and os.path.exists(task['zip_path']):
-                os.remove(task['zip_path'])
-        task_manager.clear()
-        print("[清理] 已清理所有临时文件")
-
-
-# 注册退出时清理
-atexit.register(cleanup_all_tasks)
-
-
-def process_task(task_id):
-    """后台处理上传的文件"""
-    from app.config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL
-    task = task_manager.get(task_id)
-    if not task:
-        return
-    temp_dir = task['temp_dir']
-    output_dir = task['output_dir']
+@app.before_request
+def ensure_maintenance():
+    """每个进程第一次收到请求时启动维护线程；任务由 worker 进程处理时只清理过期任务"""
+    start_maintenance(process_tasks=not EXTERNAL_WORKER)
 
-    # 自动检测是否使用视觉模型：硅基流动支持视觉模型，DeepSeek 需要用本地 OCR
-    is_siliconflow = 'siliconflow' in DEEPSEEK_BASE_URL.lower()
-    use_vision = task.get('use_vision', is_siliconflow)
 
-    print(f"[处理] API: {DEEPSEEK_BASE_URL}, 使用视觉模型: {use_vision}")
+def queue_is_full() -> bool:
+    """排队的任务是否已达上限"""
+    if EXTERNAL_WORKER:
+        return task_manager.store.status_counts().get('queued', 0) >= WEB_QUEUE_SIZE
+    return scheduler.is_full()
 
-    try:
-        # 获取 API Key
-        api_key = DEEPSEEK_API_KEY
-        if not api_key:
-            task['status'] = 'error'
-            task['error'] = '服务器未配置 API Key，请联系管理员'
-            return
-
-        # 扫描文件
-        files = []
-        for f in Path(temp_dir).rglob("*"):
-            if f.is_file() and is_supported_file(str(f)):
-                files.append(str(f))
-
-        if not files:
-            task['status'] = 'error'
-            task['error'] = '未找到有效的发票文件'
-            return
-
-        task['total'] = len(files)
-        task['status'] = 'processing'
-
-        # 处理每个文件
-        invoice_infos = []
-        for idx, file_path in enumerate(files, 1):
-            task['current'] = idx
-            task['current_file'] = Path(file_path).name
-
-            try:
-                if use_vision:
-                    # 使用视觉模型直接分析图片（推荐，无需本地OCR）
-                    info = analyze_invoice_vision(file_path, api_key)
-                else:
-                    # 使用本地 OCR + API 文本分析
-                    ocr_text = extract_text_from_file(file_path)
-                    info = analyze_invoice(ocr_text, file_path, api_key)
-                invoice_infos.append(info)
-            except Exception as e:
-                # 创建错误记录
-                invoice_infos.append(InvoiceInfo(
-                    type="other",
-                    subtype="处理失败",
-                    amount=0.0,
-                    date="",
-                    service_date="",
-                    merchant="",
-                    invoice_number="",
-                    is_invoice=False,
-                    description=f"处理失败: {str(e)}",
-                    raw_text="",
-                    file_path=file_path,
-                    order_number=""
-                ))
-
-        # 分类和整理
-        task['status'] = 'organizing'
-        organizer = FileOrganizer(output_dir, copy_mode=True)
-        categorized = organizer.organize(invoice_infos)
-
-        # 生成报表
-        task['status'] = 'generating_report'
-        report_path = generate_report(output_dir, categorized)
-
-        # 计算汇总
-        summary = {}
-        total_amount = 0.0
-        for category_name in ['打车票', '火车飞机票', '住宿费', '餐费', '其他']:
-            if category_name in categorized:
-                infos = categorized[category_name]
-                invoice_amount = sum(i.amount for i in infos if i.is_invoice)
-                invoice_count = len([i for i in infos if i.is_invoice])
-                summary[category_name] = {
-                    'count': invoice_count,
-                    'amount': invoice_amount
-                }
-                total_amount += invoice_amount
-
-        task['summary'] = summary
-        task['total_amount'] = total_amount
-
-        # 打包为 ZIP
-        task['status'] = 'packing'
-        zip_filename = f"报销结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        zip_path = os.path.join(tempfile.gettempdir(), f"{task_id}_{zip_filename}")
-
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(output_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, output_dir)
-                    zipf.write(file_path, arcname)
-
-        task['zip_path'] = zip_path
-        task['zip_filename'] = zip_filename
-        task['status'] = 'completed'
-
-        # 立即清理输入文件（保护隐私）
-        shutil.rmtree(temp_dir, ignore_errors=True)
 
-        # 启动延迟清理（30分钟后清理输出和ZIP）
-        cleanup_task(task_id, delay=1800)
+def retry_after() -> int:
+    """队列满时建议的重试等待秒数；任务由 worker 进程处理时按任务存储中的记录估计"""
+    if EXTERNAL_WORKER:
+        return store_retry_after()
+    return scheduler.retry_after()
 
-    except Exception as e:
-        task['status'] = 'error'
-        task['error'] = str(e)
-        import traceback
-        traceback.print_exc()
-        # 异常时也启动延迟清理
-        cleanup_task(task_id, delay=300)  # 5分钟后清理
+
+# 报表生成锁（进程内，没有请求在用时自动释放）；报表路径记录在任务存储中，其他进程直接使用
+_artifact_locks = weakref.WeakValueDictionary()
+_artifact_locks_guard = threading.Lock()
+
+
+def build_artifacts(task_id: str, task: dict) -> str:
+    """第一次下载时按输出目录索引生成报表，之后的下载直接使用缓存，返回报表路径"""
+    with _artifact_locks_guard:
+        lock = _artifact_locks.get(task_id)
+        if lock is None:
+            lock = _artifact_locks[task_id] = threading.Lock()
+    with lock:
+        report_path = task_manager.store.artifacts(task_id).get('report')
+        if not report_path or not os.path.exists(report_path):
+            with metrics.timer("web.report"):
+                categorized = OutputIndex(task['output_dir']).categorized()
+                report_path = generate_report(task['output_dir'], categorized)
+            task_manager.store.set_artifact(task_id, 'report', report_path)
+        return report_path
 
 
 @app.route('/')
@@ -329,6 +146,10 @@ def upload():
     """处理文件上传"""
     # API Key 可选 - 没有时使用本地分析模式
 
+    # 排队已满时在保存文件之前就拒绝
+    if queue_is_full():
+        return queue_full_response(retry_after())
+
     # 检查是否是原生路径上传（桌面应用）
     if request.is_json:
         data = request.get_json()
@@ -377,23 +198,51 @@ def upload():
         shutil.rmtree(output_dir, ignore_errors=True)
         return jsonify({'error': '没有有效的文件（仅支持 jpg/png/pdf）'}), 400
 
-    # 初始化任务状态
+    return enqueue_task(task_id, temp_dir, output_dir, saved_count)
+
+
+def queue_full_response(retry_after: int):
+    """排队已满：HTTP 429，Retry-After 提示多久后重试"""
+    response = jsonify({'error': f'当前排队任务已满，请 {retry_after} 秒后重试', 'retry_after': retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def enqueue_task(task_id, temp_dir, output_dir, file_count):
+    """登记任务并加入处理队列（按客户端地址公平调度）；任务由 worker 进程处理时只登记"""
+    # 由本进程处理时登记的同时领取（本进程退出后租约过期，其他进程接管）；
+    # 由 worker 进程处理时不设所有者，等待 worker 领取
+    owner = None if EXTERNAL_WORKER else worker_id()
     task_manager.add(task_id, {
         'status': 'queued',
         'temp_dir': temp_dir,
         'output_dir': output_dir,
-        'total': saved_count,
+        'total': file_count,
         'current': 0,
+        'client': request.remote_addr or '',
         'created_at': datetime.now().isoformat()
-    })
+    }, owner=owner)
+    if EXTERNAL_WORKER:
+        return jsonify({
+            'task_id': task_id,
+            'file_count': file_count,
+            'queue_position': task_manager.store.position(task_id)
+        })
 
-    # 启动后台处理
-    thread = threading.Thread(target=process_task, args=(task_id,), daemon=True)
-    thread.start()
+    try:
+        position = scheduler.submit(task_id, process_task, task_id,
+                                    client=request.remote_addr or '', cost=file_count)
+    except QueueFullError as e:
+        task_manager.remove(task_id)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return queue_full_response(e.retry_after)
 
     return jsonify({
         'task_id': task_id,
-        'file_count': saved_count
+        'file_count': file_count,
+        'queue_position': position
     })
 
 
@@ -432,34 +281,16 @@ def upload_from_paths(file_paths):
         shutil.rmtree(output_dir, ignore_errors=True)
         return jsonify({'error': '没有有效的文件（仅支持 jpg/png/pdf）'}), 400
 
-    # 初始化任务状态
-    task_manager.add(task_id, {
-        'status': 'queued',
-        'temp_dir': temp_dir,
-        'output_dir': output_dir,
-        'total': saved_count,
-        'current': 0,
-        'created_at': datetime.now().isoformat()
-    })
-
-    # 启动后台处理
-    thread = threading.Thread(target=process_task, args=(task_id,), daemon=True)
-    thread.start()
-
-    return jsonify({
-        'task_id': task_id,
-        'file_count': saved_count
-    })
+    return enqueue_task(task_id, temp_dir, output_dir, saved_count)
 
 
 @app.route('/status/<task_id>')
 def status(task_id):
     """查询任务状态"""
-    if task_id not in task_manager:
+    task = task_manager.get(task_id)
+    if task is None:
         return jsonify({'error': '任务不存在或已过期'}), 404
 
-    task = task_manager[task_id]
-
     response = {
         'status': task['status'],
         'total': task.get('total', 0),
@@ -467,6 +298,10 @@ def status(task_id):
         'current_file': task.get('current_file', '')
     }
 
+    if task['status'] == 'queued':
+        # 本进程调度器中的位置；任务在其他进程（或等待 worker 领取）时按登记顺序估计
+        response['queue_position'] = scheduler.position(task_id) or task_manager.store.position(task_id)
+
     if task['status'] == 'completed':
         response['summary'] = task.get('summary', {})
         response['total_amount'] = task.get('total_amount', 0)
@@ -477,46 +312,62 @@ def status(task_id):
     return jsonify(response)
 
 
+# 处理中的任务状态
+ACTIVE_STATUSES = {'processing', 'organizing'}
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Prometheus 指标（文本格式）
+
+    任务由 worker 进程处理时，识别相关的指标（各阶段耗时、API 请求、处理的文件数、工作线程和 OCR 占用）
+    在各 worker 的指标地址上（WORKER_METRICS_PORT），这里只有任务数、排队数和临时文件。
+    临时文件的大小由维护线程每轮统计一次，抓取时不遍历目录
+    """
+    status_counts = task_manager.store.status_counts()
+    temp_bytes = temp_disk_bytes()
+
+    gauges = {
+        'tasks_active': sum(n for status, n in status_counts.items() if status in ACTIVE_STATUSES),
+        'tasks': [({'status': status}, n) for status, n in sorted(status_counts.items())],
+        'temp_disk_bytes': [({'kind': kind}, n) for kind, n in temp_bytes.items()],
+    }
+    if EXTERNAL_WORKER:
+        gauges['queue_depth'] = status_counts.get('queued', 0)
+    else:
+        gauges.update(processing_gauges())
+    text = metrics.render_prometheus(gauges)
+    return Response(text, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/download/<task_id>')
 def download(task_id):
     """下载处理结果"""
-    if task_id not in task_manager:
+    task = task_manager.get(task_id)
+    if task is None:
         return jsonify({'error': '任务不存在或已过期'}), 404
 
-    task = task_manager[task_id]
-
     if task['status'] != 'completed':
         return jsonify({'error': '任务尚未完成'}), 400
 
-    zip_path = task.get('zip_path')
-    if not zip_path or not os.path.exists(zip_path):
+    if not os.path.exists(task['output_dir']):
         return jsonify({'error': '文件已被清理'}), 404
+    build_artifacts(task_id, task)
+    try:
+        stream = ZipStream(task['output_dir'])
+    except ArchiveError as e:
+        return jsonify({'error': str(e)}), 500
+
+    # 边读边发送，不生成临时压缩包
+    filename = task.get('zip_filename', '报销结果.zip')
+    response = Response(iter(stream), mimetype='application/zip')
+    response.content_length = len(stream)
+    response.headers['Content-Disposition'] = f"attachment; filename=result.zip; filename*=UTF-8''{quote(filename)}"
 
-    # 下载后立即清理
-    @after_this_request
-    def cleanup(response):
-        # 启动快速清理（下载后1分钟清理）
-        def quick_cleanup():
-            time.sleep(60)
-            with task_manager.lock:
-                if task_id in task_manager:
-                    t = task_manager[task_id]
-                    if 'output_dir' in t and os.path.exists(t['output_dir']):
-                        shutil.rmtree(t['output_dir'], ignore_errors=True)
-                    if 'zip_path' in t and os.path.exists(t['zip_path']):
-                        os.remove(t['zip_path'])
-                    # 直接操作内部 dict，避免 remove() 重复加锁导致死锁
-                    del task_manager.tasks[task_id]
-                    print(f"[清理] 下载后已删除任务 {task_id}")
-        threading.Thread(target=quick_cleanup, daemon=True).start()
-        return response
-
-    return send_file(
-        zip_path,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=task.get('zip_filename', '报销结果.zip')
-    )
+    # 发送完成后快速清理（1分钟后清理，期间可以重新下载）
+    response.call_on_close(lambda: cleanup_task(task_id, delay=60))
+    return response
 
 
 def main():
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+报销助手 - Web 版任务处理进程
+
+从任务存储（TASK_DB）中领取 Web 版登记的任务，做 OCR / AI 识别 / 分类整理，
+Web 进程只负责上传、查询状态和下载，OCR 不再拖慢网页请求。
+可以启动多个（或在多台机器上启动，TASK_DB 和临时目录需要在共享存储上），各自领取任务。
+识别相关的 Prometheus 指标由每个 worker 在 WORKER_METRICS_HOST:WORKER_METRICS_PORT/metrics 提供。
+
+使用方法:
+    TASK_WORKER=external python main.py --web   # Web 进程只登记任务
+    python worker.py                            # 任务处理进程
+"""
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app import is_configured, metrics
+from app.config import WORKER_METRICS_HOST, WORKER_METRICS_PORT
+from app.tasks import processing_gauges, run_worker, task_manager
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics：本进程的 Prometheus 指标"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus(processing_gauges()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(host: str = WORKER_METRICS_HOST, port: int = WORKER_METRICS_PORT) -> ThreadingHTTPServer:
+    """在后台线程中提供指标接口，返回服务器（port 为 0 时由系统分配端口）"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="worker-metrics", daemon=True).start()
+    return server
+
+
+def main():
+    """启动任务处理进程，收到 SIGINT / SIGTERM 后退出"""
+    if not task_manager.store.persistent:
+        print("任务处理进程需要与 Web 进程共用的任务存储，请设置 TASK_STORE=sqlite")
+        sys.exit(1)
+    if not is_configured():
+        print("未配置 API Key，请先运行 python main.py --web 完成配置")
+        sys.exit(1)
+
+    # 常驻运行，始终收集性能指标
+    metrics.enable()
+    if WORKER_METRICS_PORT:
+        server = serve_metrics()
+        print(f"指标地址: http://{WORKER_METRICS_HOST}:{server.server_address[1]}/metrics")
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    print("\n" + "=" * 50)
+    print("报销助手 - 任务处理进程")
+    print("=" * 50)
+    print("按 Ctrl+C 停止")
+    print("=" * 50 + "\n")
+
+    run_worker(stop)
+
+
+if __name__ == '__main__':
+    main()